@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import subprocess
+import sys
+import time
+import urllib.request
+from concurrent.futures import ProcessPoolExecutor
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+sys.path.insert(0, SRC_DIR)
+
+
+def start_fake_jira(args):
+    # Run the server in its own process, so it does not compete with
+    # the client for the GIL or show up in its memory use.
+    server = subprocess.Popen(
+        [
+            sys.executable,
+            os.path.join(SRC_DIR, "fake_jira.py"),
+            "--issues",
+            str(args.issues),
+            "--latency",
+            str(args.latency),
+            "--max-page-size",
+            str(args.max_page_size),
+            "--long-changelog-ratio",
+            str(args.long_changelog_ratio),
+        ],
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    url = server.stdout.readline().split()[-1]
+    return server, url
+
+
+def request_counts(url):
+    with urllib.request.urlopen(f"{url}/_stats") as response:
+        return json.load(response)
+
+
+def run_case(url, concurrency, page_size):
+    # Runs in a fresh process, so ru_maxrss is the peak of this case only
+    import jira_link
+
+    cfg = {
+        "jira_url": url,
+        "email": "bench@example.com",
+        "api_token": "token",
+        "jira_filter": "fake filter",
+        "mock_jira_data": None,
+        "concurrency": concurrency,
+        "page_size": page_size,
+    }
+    started = time.perf_counter()
+    dataframe = jira_link.get_tickets(cfg)
+    elapsed = time.perf_counter() - started
+    return {
+        "seconds": elapsed,
+        "issues": int(dataframe["ticket_id"].nunique()),
+        "transitions": len(dataframe),
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark jira_link against a local fake Jira"
+    )
+    parser.add_argument("--issues", type=int, default=5000)
+    parser.add_argument("--latency", type=float, default=0.05, help="in seconds")
+    parser.add_argument("--max-page-size", type=int, default=100)
+    parser.add_argument("--long-changelog-ratio", type=float, default=0.01)
+    parser.add_argument(
+        "--concurrency",
+        type=str,
+        default="1,4,8",
+        help="Comma-separated concurrency levels to compare",
+    )
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--output", type=str, help="Append results as JSON lines")
+    args = parser.parse_args()
+
+    server, url = start_fake_jira(args)
+    results = []
+    try:
+        for concurrency in [int(c) for c in args.concurrency.split(",")]:
+            before = request_counts(url)
+            with ProcessPoolExecutor(
+                max_workers=1, mp_context=multiprocessing.get_context("spawn")
+            ) as pool:
+                result = pool.submit(
+                    run_case, url, concurrency, args.page_size
+                ).result()
+            after = request_counts(url)
+            result.update(
+                {
+                    "benchmark": "jira_link",
+                    "concurrency": concurrency,
+                    "latency": args.latency,
+                    "max_page_size": args.max_page_size,
+                    "issues_per_second": result["issues"] / result["seconds"],
+                    "requests": {
+                        endpoint: count - before.get(endpoint, 0)
+                        for endpoint, count in after.items()
+                    },
+                }
+            )
+            results.append(result)
+    finally:
+        server.terminate()
+        server.wait()
+
+    print(
+        f"{'concurrency':>11} {'issues':>7} {'transitions':>11} {'seconds':>8} "
+        f"{'issues/s':>9} {'requests':>8} {'peak MB':>8}"
+    )
+    for result in results:
+        print(
+            f"{result['concurrency']:>11} {result['issues']:>7} "
+            f"{result['transitions']:>11} {result['seconds']:>8.2f} "
+            f"{result['issues_per_second']:>9.0f} "
+            f"{sum(result['requests'].values()):>8} {result['peak_rss_mb']:>8.0f}"
+        )
+
+    if args.output:
+        with open(args.output, "a") as f:
+            for result in results:
+                f.write(json.dumps(dict(result, timestamp=time.time())) + "\n")
+
+
+if __name__ == "__main__":
+    main()
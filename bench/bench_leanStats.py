@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+sys.path.insert(0, SRC_DIR)
+
+# The board the generated data moves through (see generate_transitions)
+BOARD_CFG = {
+    "todo_names": ["Backlog", "To Do"],
+    "wip_names": ["In Progress", "Review"],
+    "done_names": ["Done"],
+    "ignore_names": [""],
+    "timezone": "UTC",
+}
+
+
+def pipeline_stages(file_path, cfg):
+    # The stages of a plain leanStats run, as (name, function of the
+    # previous stage's result).
+    import leanStats
+
+    return [
+        ("read_transitions", lambda _: leanStats.read_transitions(file_path, cfg)),
+        (
+            "extract_ticket_timestamps",
+            lambda data: leanStats.extract_ticket_timestamps(data, cfg),
+        ),
+        ("calculate_cycletime", leanStats.calculate_cycletime),
+        (
+            "compute_metrics_per_ticket",
+            lambda tickets: leanStats.compute_metrics_per_ticket(tickets),
+        ),
+        (
+            "compute_metrics_per_week",
+            lambda tickets: leanStats.compute_metrics_per_week(tickets),
+        ),
+    ]
+
+
+def run_pipeline(file_path, cfg, repeat):
+    """Time each stage, then run once more to measure its memory.
+
+    Runs in a fresh process for each input size. The timings are the
+    best of `repeat` runs; memory is the peak traced by tracemalloc
+    during the stage, which is measured separately since tracing slows
+    things down.
+    """
+    stages = pipeline_stages(file_path, cfg)
+    results = {name: {"stage": name, "seconds": float("inf")} for name, _ in stages}
+
+    for _ in range(repeat):
+        result = None
+        for name, stage in stages:
+            started = time.perf_counter()
+            result = stage(result)
+            elapsed = time.perf_counter() - started
+            results[name]["seconds"] = min(results[name]["seconds"], elapsed)
+            results[name]["rows_out"] = len(result)
+
+    tracemalloc.start()
+    result = None
+    for name, stage in stages:
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        result = stage(result)
+        results[name]["peak_mb"] = (tracemalloc.get_traced_memory()[1] - before) / 2**20
+    tracemalloc.stop()
+
+    peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return [dict(r, peak_rss_mb=peak_rss_mb) for r in results.values()]
+
+
+def parse_size(value):
+    # 10k, 1M and 10000 are all fine
+    multipliers = {"k": 10**3, "m": 10**6}
+    value = value.strip().lower()
+    if value[-1] in multipliers:
+        return int(float(value[:-1]) * multipliers[value[-1]])
+    return int(value)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Time and memory-profile each stage of leanStats"
+    )
+    parser.add_argument(
+        "--sizes",
+        type=str,
+        default="10k,100k,1M",
+        help="Comma-separated numbers of transitions, e.g. 10k,100k,1M,10M",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--data-dir",
+        type=str,
+        help="Keep the generated input here, and reuse it on later runs",
+    )
+    parser.add_argument("--output", type=str, help="Append results as JSON lines")
+    args = parser.parse_args()
+
+    from generate_transitions import write_transitions
+
+    sizes = [parse_size(size) for size in args.sizes.split(",")]
+    tmp_dir = None
+    if args.data_dir:
+        os.makedirs(args.data_dir, exist_ok=True)
+        data_dir = args.data_dir
+    else:
+        tmp_dir = tempfile.TemporaryDirectory()
+        data_dir = tmp_dir.name
+
+    results = []
+    try:
+        for size in sizes:
+            file_path = os.path.join(data_dir, f"transitions-{size}-{args.seed}.csv")
+            if not os.path.isfile(file_path):
+                write_transitions(file_path, size, seed=args.seed)
+            with ProcessPoolExecutor(
+                max_workers=1, mp_context=multiprocessing.get_context("spawn")
+            ) as pool:
+                stages = pool.submit(
+                    run_pipeline, file_path, BOARD_CFG, args.repeat
+                ).result()
+            for stage in stages:
+                stage.update({"benchmark": "leanStats", "size": size})
+            results.extend(stages)
+    finally:
+        if tmp_dir:
+            tmp_dir.cleanup()
+
+    print(
+        f"{'size':>9} {'stage':<27} {'rows out':>9} {'seconds':>8} "
+        f"{'rows/s':>10} {'peak MB':>8}"
+    )
+    for result in results:
+        print(
+            f"{result['size']:>9} {result['stage']:<27} {result['rows_out']:>9} "
+            f"{result['seconds']:>8.3f} {result['size'] / result['seconds']:>10.0f} "
+            f"{result['peak_mb']:>8.1f}"
+        )
+
+    if args.output:
+        with open(args.output, "a") as f:
+            for result in results:
+                f.write(json.dumps(dict(result, timestamp=time.time())) + "\n")
+
+
+if __name__ == "__main__":
+    main()
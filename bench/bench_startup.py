@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+
+
+def commands(tmp_dir):
+    # (name, command line) of the runs to time, with a bare Python and
+    # a pandas import to compare against
+    mock_data = os.path.join(tmp_dir, "mock.csv")
+    with open(mock_data, "w") as f:
+        f.write("ticket_id,from_status,to_status,changed_at\n")
+        f.write("A-1,To Do,In Progress,2024-01-02 10:00:00\n")
+    mock_config = os.path.join(tmp_dir, "mock.config")
+    with open(mock_config, "w") as f:
+        f.write(f"[JIRA]\nMOCK_JIRA_DATA = {mock_data}\n")
+    bad_config = os.path.join(tmp_dir, "bad.config")
+    with open(bad_config, "w") as f:
+        f.write("[METRICS]\nWINDOWS = 7, 0\n")
+
+    leanstats = [sys.executable, os.path.join(SRC_DIR, "stats_cli.py")]
+    jira_link = [sys.executable, os.path.join(SRC_DIR, "jira_link.py")]
+    forecast = [sys.executable, os.path.join(SRC_DIR, "forecast.py")]
+    flow = [sys.executable, os.path.join(SRC_DIR, "flow_metrics.py")]
+    return [
+        ("python", [sys.executable, "-c", "pass"]),
+        ("import pandas", [sys.executable, "-c", "import pandas"]),
+        ("leanStats --help", leanstats + ["--help"]),
+        ("leanStats missing config", leanstats + ["-c", "missing.config"]),
+        ("leanStats bad config", leanstats + ["-c", bad_config]),
+        ("jira_link --help", jira_link + ["--help"]),
+        ("jira_link mock data", jira_link + ["-c", mock_config]),
+        ("forecast --help", forecast + ["--help"]),
+        ("flow_metrics --help", flow + ["--help"]),
+    ]
+
+
+def time_command(command, repeat):
+    # Wall clock seconds of each of `repeat` runs
+    seconds = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        seconds.append(time.perf_counter() - started)
+    return seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Time how long the command line tools take to start"
+    )
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--output", type=str, help="Append results as JSON lines")
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for name, command in commands(tmp_dir):
+            seconds = time_command(command, args.repeat)
+            results.append(
+                {
+                    "benchmark": "startup",
+                    "command": name,
+                    "best": min(seconds),
+                    "median": statistics.median(seconds),
+                }
+            )
+
+    print(f"{'command':<26} {'best':>8} {'median':>8}")
+    for result in results:
+        print(
+            f"{result['command']:<26} {result['best']:>8.3f} {result['median']:>8.3f}"
+        )
+
+    if args.output:
+        with open(args.output, "a") as f:
+            for result in results:
+                f.write(json.dumps(dict(result, timestamp=time.time())) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+import sqlite3
+
+import pandas as pd
+
+TRANSITION_COLUMNS = ["ticket_id", "from_status", "to_status", "changed_at"]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS transitions (
+    ticket_id   TEXT NOT NULL,
+    from_status TEXT,
+    to_status   TEXT NOT NULL,
+    changed_at  TEXT NOT NULL,
+    PRIMARY KEY (ticket_id, to_status, changed_at)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS sync_state (
+    source    TEXT PRIMARY KEY,
+    last_sync TEXT NOT NULL
+);
+"""
+
+
+def open_store(path):
+    connection = sqlite3.connect(path)
+    connection.executescript(SCHEMA)
+    return connection
+
+
+def add_transitions(connection, dataframe):
+    # Transitions we already have are skipped, so overlapping fetches
+    # never produce duplicates. Returns the number of new transitions.
+    rows = dataframe[TRANSITION_COLUMNS].itertuples(index=False, name=None)
+    with connection:
+        before = connection.total_changes
+        connection.executemany(
+            "INSERT OR IGNORE INTO transitions VALUES (?, ?, ?, ?)", rows
+        )
+        return connection.total_changes - before
+
+
+def load_transitions(connection):
+    return pd.read_sql_query(
+        "SELECT ticket_id, from_status, to_status, changed_at FROM transitions "
+        "ORDER BY ticket_id, changed_at",
+        connection,
+    )
+
+
+def get_last_sync(connection, source):
+    row = connection.execute(
+        "SELECT last_sync FROM sync_state WHERE source = ?", (source,)
+    ).fetchone()
+    return pd.Timestamp(row[0]) if row else None
+
+
+def set_last_sync(connection, source, timestamp):
+    with connection:
+        connection.execute(
+            "INSERT OR REPLACE INTO sync_state VALUES (?, ?)",
+            (source, timestamp.isoformat()),
+        )
@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+
+import argparse
+import datetime
+import json
+import random
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+# The workflow synthetic issues move through, and the statuses they
+# can fall back to from each step (rework).
+WORKFLOW = ["Backlog", "To Do", "In Progress", "Review", "Done"]
+REWORK = {"Review": "In Progress", "Done": "In Progress"}
+
+# Jira only embeds this many changelog entries in search results
+EMBEDDED_CHANGELOG_LIMIT = 100
+
+UPDATED_SINCE_PATTERN = re.compile(r'updated\s*>=\s*"([^"]+)"', re.IGNORECASE)
+
+
+class FakeJira:
+    """Synthetic Jira data, generated on demand from a seed.
+
+    Issue number i always gets the same changelog, so very large
+    volumes can be served without holding them in memory.
+    """
+
+    def __init__(
+        self,
+        issues=1000,
+        project="FAKE",
+        filter_name="fake filter",
+        seed=0,
+        rework_ratio=0.2,
+        long_changelog_ratio=0.01,
+        long_changelog_length=250,
+        start=datetime.datetime(2023, 1, 2, 9, 0),
+    ):
+        self.issues = issues
+        self.project = project
+        self.filter_name = filter_name
+        self.seed = seed
+        self.rework_ratio = rework_ratio
+        self.long_changelog_ratio = long_changelog_ratio
+        self.long_changelog_length = long_changelog_length
+        self.start = start
+        self.updated_since_cache = {}
+
+    def key(self, index):
+        return f"{self.project}-{index + 1}"
+
+    def histories(self, index):
+        rng = random.Random(self.seed * 1_000_003 + index)
+        created = self.start + datetime.timedelta(minutes=37 * index)
+        histories = []
+
+        def add(items):
+            nonlocal created
+            created += datetime.timedelta(minutes=rng.randint(1, 3 * 24 * 60))
+            histories.append(
+                {
+                    "id": str(len(histories) + 1),
+                    "created": created.strftime("%Y-%m-%dT%H:%M:%S.")
+                    + f"{created.microsecond // 1000:03d}+0200",
+                    "items": items,
+                }
+            )
+
+        def move(from_status, to_status):
+            add(
+                [
+                    {
+                        "field": "status",
+                        "fieldtype": "jira",
+                        "fromString": from_status,
+                        "toString": to_status,
+                    }
+                ]
+            )
+
+        for from_status, to_status in zip(WORKFLOW, WORKFLOW[1:]):
+            move(from_status, to_status)
+            while to_status in REWORK and rng.random() < self.rework_ratio:
+                move(to_status, REWORK[to_status])
+                move(REWORK[to_status], to_status)
+
+        # Some issues get a long history of other field changes
+        if rng.random() < self.long_changelog_ratio:
+            while len(histories) < self.long_changelog_length:
+                add([{"field": "assignee", "fromString": None, "toString": "x"}])
+            move("Done", "In Progress")
+            move("In Progress", "Done")
+        return histories
+
+    def issue(self, index, base_url):
+        histories = self.histories(index)
+        return {
+            "id": str(10000 + index),
+            "key": self.key(index),
+            "self": f"{base_url}/rest/api/2/issue/{10000 + index}",
+            "fields": {
+                "summary": f"Synthetic issue {index + 1}",
+                "issuetype": {"name": "Task"},
+                "status": {"name": histories[-1]["items"][-1]["toString"]},
+            },
+            "changelog": {
+                "startAt": 0,
+                "maxResults": min(len(histories), EMBEDDED_CHANGELOG_LIMIT),
+                "total": len(histories),
+                "histories": histories[:EMBEDDED_CHANGELOG_LIMIT],
+            },
+        }
+
+    def matching(self, jql):
+        # Issue numbers matching a search. Only the 'updated >= "..."'
+        # clause of the JQL is understood; everything else matches.
+        match = UPDATED_SINCE_PATTERN.search(jql)
+        if not match:
+            return range(self.issues)
+        if match.group(1) not in self.updated_since_cache:
+            since = datetime.datetime.strptime(match.group(1), "%Y-%m-%d %H:%M")
+            self.updated_since_cache[match.group(1)] = [
+                index for index in range(self.issues) if self.updated(index) >= since
+            ]
+        return self.updated_since_cache[match.group(1)]
+
+    def updated(self, index):
+        created = self.histories(index)[-1]["created"]
+        return datetime.datetime.strptime(created[:19], "%Y-%m-%dT%H:%M:%S")
+
+    def index(self, key):
+        project, _, number = key.rpartition("-")
+        if project != self.project or not number.isdigit():
+            return None
+        index = int(number) - 1
+        return index if 0 <= index < self.issues else None
+
+
+class FakeJiraServer(ThreadingHTTPServer):
+    """HTTP stand-in for the Jira REST endpoints jira_link uses.
+
+    Serves serverInfo, fields, favourite filters, search (with
+    changelogs) and the paged issue changelog. Every request is delayed by `latency`
+    seconds, and every `throttle_every`th request is answered with a
+    429, to exercise retries. Counts requests per endpoint, which can be
+    read back from /_stats.
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        jira,
+        host="127.0.0.1",
+        port=0,
+        latency=0.0,
+        max_page_size=100,
+        throttle_every=0,
+    ):
+        super().__init__((host, port), FakeJiraHandler)
+        self.jira = jira
+        self.latency = latency
+        self.max_page_size = max_page_size
+        self.throttle_every = throttle_every
+        self.requests = {}
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def request_count(self):
+        return sum(self.requests.values())
+
+    def count(self, endpoint):
+        with self.lock:
+            self.requests[endpoint] = self.requests.get(endpoint, 0) + 1
+            return self.request_count
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return self
+
+
+class FakeJiraHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, body, status=200, headers=None):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        path = re.sub(r"^/rest/api/(2|latest)/", "", url.path)
+
+        if url.path == "/_stats":
+            # Not part of Jira: request counts, for benchmarks and tests
+            with self.server.lock:
+                self.send_json(dict(self.server.requests))
+            return
+
+        endpoint = re.sub(r"^issue/[^/]+/", "issue/{key}/", path)
+        count = self.server.count(endpoint)
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        if self.server.throttle_every and count % self.server.throttle_every == 0:
+            self.send_json(
+                {"errorMessages": ["Rate limit exceeded"]},
+                status=429,
+                headers={"Retry-After": "0"},
+            )
+            return
+
+        if path == "serverInfo":
+            self.send_json(
+                {
+                    "baseUrl": self.server.url,
+                    "version": "9.4.0",
+                    "versionNumbers": [9, 4, 0],
+                    "deploymentType": "Server",
+                    "serverTitle": "Fake Jira",
+                }
+            )
+        elif path == "field":
+            self.send_json(
+                [
+                    {"id": "summary", "name": "Summary"},
+                    {"id": "status", "name": "Status"},
+                ]
+            )
+        elif path == "filter/favourite":
+            self.send_json(
+                [
+                    {
+                        "self": f"{self.server.url}/rest/api/2/filter/10000",
+                        "id": "10000",
+                        "name": self.server.jira.filter_name,
+                        "jql": f"project = {self.server.jira.project} ORDER BY key",
+                    }
+                ]
+            )
+        elif path == "search":
+            self.search(params)
+        elif re.fullmatch(r"issue/[^/]+/changelog", path):
+            self.changelog(path.split("/")[1], params)
+        else:
+            self.send_json({"errorMessages": [f"No such endpoint: {path}"]}, 404)
+
+    def page_bounds(self, params):
+        start_at = int(params.get("startAt", 0))
+        max_results = min(int(params.get("maxResults", 50)), self.server.max_page_size)
+        return start_at, max_results
+
+    def search(self, params):
+        jira = self.server.jira
+        start_at, max_results = self.page_bounds(params)
+        matching = jira.matching(params.get("jql", ""))
+        page = matching[start_at : start_at + max_results]
+        self.send_json(
+            {
+                "expand": "schema,names",
+                "startAt": start_at,
+                "maxResults": max_results,
+                "total": len(matching),
+                "issues": [jira.issue(index, self.server.url) for index in page],
+            }
+        )
+
+    def changelog(self, key, params):
+        jira = self.server.jira
+        index = jira.index(key)
+        if index is None:
+            self.send_json({"errorMessages": [f"Issue {key} not found"]}, 404)
+            return
+        start_at, max_results = self.page_bounds(params)
+        histories = jira.histories(index)
+        values = histories[start_at : start_at + max_results]
+        self.send_json(
+            {
+                "self": f"{self.server.url}/rest/api/2/issue/{key}/changelog",
+                "startAt": start_at,
+                "maxResults": max_results,
+                "total": len(histories),
+                "isLast": start_at + len(values) >= len(histories),
+                "values": values,
+            }
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve synthetic Jira data")
+    parser.add_argument("--port", type=int, default=0, help="0 picks a free port")
+    parser.add_argument("--issues", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--latency", type=float, default=0.0, help="in seconds")
+    parser.add_argument("--max-page-size", type=int, default=100)
+    parser.add_argument("--throttle-every", type=int, default=0)
+    parser.add_argument("--long-changelog-ratio", type=float, default=0.01)
+    args = parser.parse_args()
+
+    server = FakeJiraServer(
+        FakeJira(
+            issues=args.issues,
+            seed=args.seed,
+            long_changelog_ratio=args.long_changelog_ratio,
+        ),
+        port=args.port,
+        latency=args.latency,
+        max_page_size=args.max_page_size,
+        throttle_every=args.throttle_every,
+    )
+    print(f"Serving fake Jira on {server.url}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+
+import argparse
+import configparser
+import os
+import re
+import sys
+
+from metrics_output import OUTPUT_FORMATS, output_path, write_metrics
+from stats_common import LANE_DONE, LANE_TODO, LANE_WIP, LANES, input_files
+from stats_config import parse_date, read_config
+
+# numpy, pandas and leanStats are only imported where they are used,
+# so --help and mistakes in the arguments or the config are reported
+# without waiting for them to load.
+
+# Lanes shown in the cumulative flow, in the order work moves through
+FLOW_LANES = [LANE_TODO, LANE_WIP, LANE_DONE]
+
+
+def status_intervals(data, cfg, now=None):
+    """Each stay of a ticket in a status, with how long it lasted.
+
+    The transitions are sorted by ticket and time once; a stay ends
+    when the next transition of the same ticket starts, which is the
+    next row. Tickets still in a to do or WIP status have been there
+    until `now` (by default the last transition in the data). The
+    last stay of a ticket in a done or ignored status has no end, and
+    no dwell time.
+    """
+    import numpy as np
+    import pandas as pd
+
+    from leanStats import check_statuses_defined, classify_statuses
+
+    data = data[data["changed_at"].notna()]
+    lanes = classify_statuses(data["to_status"], cfg)
+    check_statuses_defined(data, cfg, lanes)
+
+    tickets = data["ticket_id"].astype("category")
+    codes = tickets.cat.codes.to_numpy()
+    entered_at = data["changed_at"].to_numpy(dtype="datetime64[ns]")
+    order = np.lexsort((entered_at, codes))
+    codes, entered_at, lanes = codes[order], entered_at[order], lanes[order]
+
+    # A stay ends where the next one of the same ticket starts
+    same_ticket = codes[1:] == codes[:-1]
+    left_at = np.full(len(order), np.datetime64("NaT"), dtype="datetime64[ns]")
+    left_at[:-1][same_ticket] = entered_at[1:][same_ticket]
+
+    if now is None:
+        now = entered_at.max() if len(entered_at) else np.datetime64("NaT")
+    ongoing = np.isnat(left_at) & ((lanes == LANE_TODO) | (lanes == LANE_WIP))
+    ended_at = np.where(ongoing, np.datetime64(now, "ns"), left_at)
+
+    return pd.DataFrame(
+        {
+            "ticket_id": pd.Categorical.from_codes(codes, tickets.cat.categories),
+            "status": data["to_status"].astype("category").array[order],
+            "lane": lanes,
+            "entered_at": entered_at,
+            "left_at": left_at,
+            "days": (ended_at - entered_at) / np.timedelta64(1, "D"),
+        }
+    )
+
+
+def time_in_status(intervals, active_names):
+    """Days each ticket spent per lane and status, and its flow efficiency.
+
+    Flow efficiency is the share of the time in WIP spent in one of
+    the `active_names` statuses (the rest is waiting), in percent.
+    """
+    import numpy as np
+    import pandas as pd
+
+    days = intervals["days"].fillna(0)
+    ticket_ids = intervals["ticket_id"]
+    active_statuses = {name.upper() for name in active_names}
+    status_names = intervals["status"].cat.categories
+    status_active = np.array([str(s).upper() in active_statuses for s in status_names])
+    active = (intervals["lane"].to_numpy() == LANE_WIP) & status_active[
+        intervals["status"].cat.codes.to_numpy()
+    ]
+
+    per_lane = (
+        days.groupby([ticket_ids, intervals["lane"]], observed=True)
+        .sum()
+        .unstack(fill_value=0)
+        .reindex(columns=[LANE_TODO, LANE_WIP], fill_value=0)
+    )
+    result = pd.DataFrame(
+        {
+            "todo_days": per_lane[LANE_TODO],
+            "wip_days": per_lane[LANE_WIP],
+            "active_days": days.where(active, 0)
+            .groupby(ticket_ids, observed=True)
+            .sum(),
+        }
+    )
+    result["waiting_days"] = result["wip_days"] - result["active_days"]
+    result["flow_efficiency"] = (
+        100 * result["active_days"] / result["wip_days"].where(result["wip_days"] > 0)
+    )
+
+    # Time in done statuses only counts for reopened tickets, so those
+    # are left out
+    in_flow = np.isin(intervals["lane"], [LANE_TODO, LANE_WIP])
+    per_status = (
+        days[in_flow]
+        .groupby([ticket_ids[in_flow], intervals["status"][in_flow]], observed=True)
+        .sum()
+        .unstack(fill_value=0)
+        .reindex(result.index, fill_value=0)
+    )
+    per_status.columns = [f"{status}_days" for status in per_status.columns]
+    return result.join(per_status).round(2).reset_index()
+
+
+def cumulative_flow(intervals):
+    """Number of tickets in each lane at the end of each day.
+
+    Every stay adds one to its lane on the day it starts and takes one
+    off on the day it ends; the daily counts are the running sum of
+    those events.
+    """
+    import numpy as np
+    import pandas as pd
+
+    flow = intervals[np.isin(intervals["lane"], FLOW_LANES)]
+    columns = ["date"] + [LANES[lane].lower() for lane in FLOW_LANES]
+    if flow.empty:
+        return pd.DataFrame(columns=columns)
+
+    entered = flow["entered_at"].to_numpy().astype("datetime64[D]")
+    left = flow["left_at"].to_numpy().astype("datetime64[D]")
+    first = entered.min()
+    span = np.nanmax(np.concatenate([entered, left])) - first
+    days = int(span / np.timedelta64(1, "D")) + 1
+    row = np.searchsorted(FLOW_LANES, flow["lane"].to_numpy())
+    ended = ~np.isnat(left)
+
+    events = np.bincount(
+        row * (days + 1) + (entered - first).astype(int),
+        minlength=len(FLOW_LANES) * (days + 1),
+    ) - np.bincount(
+        row[ended] * (days + 1) + (left[ended] - first).astype(int),
+        minlength=len(FLOW_LANES) * (days + 1),
+    )
+    occupancy = np.cumsum(events.reshape(len(FLOW_LANES), days + 1), axis=1)
+
+    result = pd.DataFrame(occupancy[:, :days].T, columns=columns[1:])
+    result.insert(0, "date", pd.date_range(first, periods=days, freq="D"))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Time in status, flow efficiency and cumulative flow"
+    )
+    parser.add_argument("-c", "--config-file", type=str, required=True)
+    parser.add_argument(
+        "--now",
+        type=str,
+        help="Count time in unfinished statuses up to this time (default the last transition)",
+    )
+    parser.add_argument(
+        "--output-format",
+        help="Write the metrics as a table, csv, jsonl or parquet.",
+        type=str,
+        choices=OUTPUT_FORMATS,
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        help="Write to PREFIX.time_in_status.<format> and PREFIX.cumulative_flow.<format>.",
+        type=str,
+        metavar="PREFIX",
+    )
+    args = parser.parse_args()
+
+    if not os.path.isfile(args.config_file):
+        print(f"The file '{args.config_file}' does not exist or is not readable.")
+        sys.exit(1)
+    config = configparser.ConfigParser()
+    config.read(args.config_file)
+
+    file_path = config.get("SYSTEM", "input_csv_file", fallback=None)
+    try:
+        cfg = read_config(config, output_format=args.output_format, output=args.output)
+        # Statuses where work happens; by default all WIP statuses
+        active_names = re.split(
+            r"\s*,\s*",
+            config.get("BOARD", "ACTIVE", fallback=",".join(cfg["wip_names"])),
+        )
+        if args.now is not None:
+            parse_date(args.now)
+        file_paths = input_files(file_path)
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    # Everything is checked, so now it is worth loading pandas
+    import pandas as pd
+
+    from leanStats import read_input_files
+
+    now = pd.Timestamp(args.now) if args.now else None
+    try:
+        intervals = status_intervals(
+            read_input_files(file_paths, cfg, cfg["jobs"]), cfg, now
+        )
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    for table, dataframe in [
+        ("time_in_status", time_in_status(intervals, active_names)),
+        ("cumulative_flow", cumulative_flow(intervals)),
+    ]:
+        path = output_path(cfg["output"], table, cfg["output_format"])
+        if table == "cumulative_flow" and path is None:
+            sys.stdout.write("\n")
+        write_metrics(dataframe, cfg["output_format"], path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+
+import argparse
+import configparser
+import math
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+from stats_common import input_files
+from stats_config import parse_date, parse_jobs, parse_percentiles, read_config
+
+# numpy, pandas and leanStats are only imported where they are used,
+# so --help and mistakes in the arguments or the config are reported
+# without waiting for them to load.
+
+# Trials are simulated in batches of this many, each from its own
+# random stream, so the results for a seed do not depend on how many
+# processes the batches are spread over.
+TRIALS_PER_BATCH = 50_000
+
+# Give up on trials which take longer than this to finish
+MAX_DAYS = 100 * 365
+
+# Days drawn at a time for the unfinished trials of a batch. Large
+# targets take more blocks rather than bigger ones, which keeps memory
+# at a few hundred MB.
+MAX_BLOCK_DAYS = 200
+
+
+def daily_throughput(tickets, history_days=None):
+    """Number of tickets finished on each day, zero days included.
+
+    The history runs up to the day the last ticket finished, going
+    back `history_days` days, or to the first finished ticket.
+    """
+    import numpy as np
+    import pandas as pd
+
+    days = tickets["timestamp_end"].dropna().dt.normalize()
+    if days.empty:
+        return np.zeros(0, dtype=np.int64)
+    last = days.max()
+    first = days.min()
+    if history_days:
+        first = max(first, last - pd.Timedelta(days=history_days - 1))
+    offsets = (days[days >= first] - first).dt.days.to_numpy()
+    return np.bincount(offsets, minlength=(last - first).days + 1)
+
+
+def check_throughput(throughput):
+    if len(throughput) == 0 or not throughput.any():
+        raise ValueError("No tickets were finished in the history to forecast from")
+
+
+def completion_days(throughput, items, trials, rng):
+    # Days each trial takes to finish `items` items, drawing each day's
+    # throughput from the history. Days are drawn for all unfinished
+    # trials at once, a block at a time.
+    import numpy as np
+
+    block = min(MAX_BLOCK_DAYS, max(8, math.ceil(1.5 * items / throughput.mean())))
+    done = np.zeros(trials, dtype=np.int64)
+    days = np.zeros(trials, dtype=np.int64)
+    active = np.arange(trials)
+    elapsed = 0
+    while active.size:
+        if elapsed >= MAX_DAYS:
+            raise ValueError(
+                f"Trials did not finish {items} items within {MAX_DAYS} days"
+            )
+        draws = throughput[rng.integers(0, len(throughput), (active.size, block))]
+        totals = done[active, None] + np.cumsum(draws, axis=1)
+        finished = totals[:, -1] >= items
+        days[active[finished]] = (
+            elapsed + np.argmax(totals[finished] >= items, axis=1) + 1
+        )
+        done[active] = totals[:, -1]
+        active = active[~finished]
+        elapsed += block
+    return days
+
+
+def items_done(throughput, days, trials, rng):
+    # Items each trial finishes in `days` days. Only the number of
+    # times each distinct throughput is drawn matters, which is one
+    # multinomial draw per trial.
+    import numpy as np
+
+    values, counts = np.unique(throughput, return_counts=True)
+    draws = rng.multinomial(days, counts / counts.sum(), size=trials)
+    return draws @ values
+
+
+def simulate_batch(simulate_trials, seed, trials, throughput, target):
+    import numpy as np
+
+    return simulate_trials(throughput, target, trials, np.random.default_rng(seed))
+
+
+def simulate(simulate_trials, throughput, target, trials, seed, jobs=1):
+    # Run the trials in batches, in a pool of `jobs` processes if there
+    # is more than one batch
+    import numpy as np
+
+    sizes = [TRIALS_PER_BATCH] * (trials // TRIALS_PER_BATCH)
+    if trials % TRIALS_PER_BATCH:
+        sizes.append(trials % TRIALS_PER_BATCH)
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    args = (repeat(simulate_trials), seeds, sizes, repeat(throughput), repeat(target))
+    if jobs == 1 or len(sizes) < 2:
+        results = list(map(simulate_batch, *args))
+    else:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            results = list(pool.map(simulate_batch, *args))
+    return np.concatenate(results)
+
+
+def forecast_completion(
+    throughput, items, start, trials=100_000, seed=0, percentiles=(50, 85, 95), jobs=1
+):
+    """When will `items` items be done, starting on `start`?
+
+    For each percentile, the date by which that share of the trials
+    had finished all items.
+    """
+    import numpy as np
+    import pandas as pd
+
+    check_throughput(throughput)
+    days = simulate(completion_days, throughput, items, trials, seed, jobs)
+    # The first simulated day is the start date itself
+    needed = np.quantile(days, [p / 100 for p in percentiles], method="higher")
+    return pd.DataFrame(
+        {
+            "percentile": percentiles,
+            "days": needed,
+            "date": pd.Timestamp(start).normalize()
+            + pd.to_timedelta(needed - 1, unit="D"),
+        }
+    )
+
+
+def forecast_items(
+    throughput, start, until, trials=100_000, seed=0, percentiles=(50, 85, 95), jobs=1
+):
+    """How many items will be done from `start` up to and including `until`?
+
+    For each percentile, the number of items which that share of the
+    trials at least finished.
+    """
+    import numpy as np
+    import pandas as pd
+
+    check_throughput(throughput)
+    days = (pd.Timestamp(until).normalize() - pd.Timestamp(start).normalize()).days + 1
+    if days < 1:
+        raise ValueError("The forecast must end on or after the day it starts")
+    done = simulate(items_done, throughput, days, trials, seed, jobs)
+    return pd.DataFrame(
+        {
+            "percentile": percentiles,
+            "items": np.quantile(
+                done, [1 - p / 100 for p in percentiles], method="lower"
+            ),
+        }
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Forecast delivery from the throughput history"
+    )
+    parser.add_argument("-c", "--config-file", type=str, required=True)
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--items", type=int, help="When will this many items be done?")
+    target.add_argument(
+        "--until", type=str, help="How many items will be done by this date?"
+    )
+    parser.add_argument(
+        "--start", type=str, help="First day of the forecast (default today)"
+    )
+    parser.add_argument(
+        "--history-days",
+        type=int,
+        help="Only sample throughput from this many days before the last finished ticket",
+    )
+    parser.add_argument("--trials", type=int, help="Number of simulations")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "-p", "--percentiles", type=str, help="Comma-separated, e.g. 50,85,95"
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=str,
+        help="Processes to read the input and simulate in (0 is one per CPU)",
+    )
+    args = parser.parse_args()
+
+    if not os.path.isfile(args.config_file):
+        print(f"The file '{args.config_file}' does not exist or is not readable.")
+        sys.exit(1)
+    config = configparser.ConfigParser()
+    config.read(args.config_file)
+
+    file_path = config.get("SYSTEM", "input_csv_file", fallback=None)
+    try:
+        cfg = read_config(config)
+        percentiles = parse_percentiles(
+            args.percentiles
+            or config.get("FORECAST", "PERCENTILES", fallback="50, 85, 95")
+        )
+        trials = (
+            args.trials
+            if args.trials is not None
+            else config.getint("FORECAST", "TRIALS", fallback=100_000)
+        )
+        if trials < 1:
+            raise ValueError(f"Trials must be at least 1: {trials}")
+        history_days = args.history_days or config.getint(
+            "FORECAST", "HISTORY_DAYS", fallback=0
+        )
+        jobs = parse_jobs(args.jobs or config.get("SYSTEM", "jobs", fallback="1"))
+        if args.items is not None and args.items < 1:
+            raise ValueError(f"--items must be at least 1: {args.items}")
+        for date in [args.start, args.until]:
+            if date is not None:
+                parse_date(date)
+        file_paths = input_files(file_path)
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    # Everything is checked, so now it is worth loading pandas
+    import pandas as pd
+
+    from leanStats import extract_ticket_timestamps, read_input_files
+
+    start = pd.Timestamp(args.start) if args.start else pd.Timestamp.today()
+    try:
+        tickets = extract_ticket_timestamps(
+            read_input_files(file_paths, cfg, jobs), cfg
+        )
+        throughput = daily_throughput(tickets, history_days)
+        if args.items is not None:
+            result = forecast_completion(
+                throughput, args.items, start, trials, args.seed, percentiles, jobs
+            )
+        else:
+            result = forecast_items(
+                throughput, start, args.until, trials, args.seed, percentiles, jobs
+            )
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    print(
+        f"{trials} trials from {start:%Y-%m-%d}, sampling {len(throughput)} days "
+        f"of throughput ({throughput.sum()} tickets)"
+    )
+    print(result.to_string(index=False, formatters={"percentile": "{:g}".format}))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+
+import argparse
+import sys
+
+import numpy as np
+import pandas as pd
+
+# Board used by config/sample.config
+DEFAULT_STATUSES = ["Backlog", "To Do", "In Progress", "Review", "Done"]
+
+OUTPUT_COLUMNS = [
+    "issue_type",
+    "ticket_id",
+    "from_status",
+    "to_status",
+    "changed_at",
+    "project_key",
+]
+ISSUE_TYPES = np.array(["Story", "Task", "Bug"])
+
+SECONDS_PER_DAY = 24 * 3600
+
+
+def expected_transitions(statuses, rework_ratio):
+    # Mean number of transitions per finished ticket. Each rework loop
+    # adds two transitions, and the number of loops is geometric.
+    return len(statuses) - 1 + 2 * rework_ratio / (1 - rework_ratio)
+
+
+def generate_transitions(
+    tickets,
+    seed=0,
+    statuses=DEFAULT_STATUSES,
+    rework_ratio=0.2,
+    unfinished_ratio=0.1,
+    projects=1,
+    start="2023-01-01",
+    days=365,
+    mean_hours_in_status=36.0,
+    first_ticket=0,
+):
+    """Synthetic status transitions for `tickets` tickets.
+
+    Every ticket walks through `statuses` in order. Before its final
+    transition it goes back and forth between the last two statuses
+    before the end a geometric number of times (rework), and a share
+    of the tickets stop somewhere along the way (still in progress).
+    Tickets are created uniformly over `days` days from `start`, and
+    the time spent in a status is lognormally distributed.
+
+    Rows are grouped by ticket and in time order within a ticket, like
+    the output of jira_link. `first_ticket` numbers the tickets, so a
+    large log can be generated in several calls.
+    """
+    if len(statuses) < 3:
+        raise ValueError("At least three statuses are needed")
+    if not 0 <= rework_ratio < 1:
+        raise ValueError("The rework ratio must be in [0, 1)")
+
+    rng = np.random.default_rng([seed, first_ticket])
+    statuses = np.asarray(statuses, dtype=object)
+    last = len(statuses) - 1
+    rework_to = last - 2
+
+    # Number of transitions per ticket, then where unfinished tickets stop
+    loops = rng.geometric(1 - rework_ratio, tickets) - 1
+    lengths = last + 2 * loops
+    unfinished = rng.random(tickets) < unfinished_ratio
+    lengths[unfinished] = np.maximum(
+        1, np.ceil(rng.random(unfinished.sum()) * (lengths[unfinished] - 1))
+    )
+
+    # Position of each transition within its ticket
+    ticket = np.repeat(np.arange(tickets), lengths)
+    offsets = np.cumsum(lengths) - lengths
+    position = np.arange(len(ticket)) - np.repeat(offsets, lengths)
+
+    # Straight through the workflow up to the status before last, then
+    # the rework loops, then the final status.
+    to_index = np.minimum(position + 1, last - 1)
+    in_loop = position >= last - 1
+    loop_step = position - (last - 1)
+    to_index[in_loop] = np.where(loop_step[in_loop] % 2 == 0, rework_to, last - 1)
+    to_index[(position == lengths[ticket] - 1) & ~unfinished[ticket]] = last
+    from_index = np.where(position == 0, 0, np.roll(to_index, 1))
+
+    # Timestamps: creation time plus the cumulative time in each status
+    created = rng.random(tickets) * days * SECONDS_PER_DAY
+    sigma = 1.0
+    mu = np.log(mean_hours_in_status * 3600) - sigma**2 / 2
+    dwell = rng.lognormal(mu, sigma, len(ticket))
+    elapsed = np.cumsum(dwell)
+    elapsed -= np.repeat(elapsed[offsets] - dwell[offsets], lengths)
+    changed_at = pd.Timestamp(start) + pd.to_timedelta(
+        np.round(created[ticket] + elapsed), unit="s"
+    )
+
+    numbers = np.arange(first_ticket, first_ticket + tickets)
+    project = numbers % projects
+    project_keys = np.array([f"P{p:02d}" for p in range(projects)], dtype=object)
+    ticket_ids = project_keys[project] + "-" + (numbers // projects + 1).astype(str)
+
+    return pd.DataFrame(
+        {
+            "issue_type": ISSUE_TYPES[rng.integers(0, len(ISSUE_TYPES), tickets)][
+                ticket
+            ],
+            "ticket_id": ticket_ids[ticket],
+            "from_status": statuses[from_index],
+            "to_status": statuses[to_index],
+            "changed_at": changed_at,
+            "project_key": project_keys[project][ticket],
+        },
+        columns=OUTPUT_COLUMNS,
+    )
+
+
+def write_transitions(
+    file_path,
+    rows,
+    timestamp_format="%d/%m/%Y %H:%M:%S",
+    tickets_per_chunk=100_000,
+    **kwargs,
+):
+    """Write about `rows` synthetic transitions to file_path as CSV.
+
+    The tickets are generated and written a chunk at a time, so memory
+    use does not grow with the size of the file. Returns the number of
+    rows written.
+    """
+    statuses = kwargs.get("statuses", DEFAULT_STATUSES)
+    per_ticket = expected_transitions(statuses, kwargs.get("rework_ratio", 0.2))
+    per_ticket *= 1 - kwargs.get("unfinished_ratio", 0.1) / 2
+    tickets = max(1, round(rows / per_ticket))
+
+    written = 0
+    with open(file_path, "w", newline="") as f:
+        for first_ticket in range(0, tickets, tickets_per_chunk):
+            chunk = generate_transitions(
+                min(tickets_per_chunk, tickets - first_ticket),
+                first_ticket=first_ticket,
+                **kwargs,
+            )
+            if timestamp_format == "iso":
+                chunk["changed_at"] = np.datetime_as_string(
+                    chunk["changed_at"].to_numpy(), unit="s"
+                )
+            else:
+                chunk["changed_at"] = chunk["changed_at"].dt.strftime(timestamp_format)
+            chunk.to_csv(f, header=first_ticket == 0, index=False)
+            written += len(chunk)
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Write a synthetic Kanban transition log as CSV"
+    )
+    parser.add_argument("-o", "--output", type=str, required=True)
+    parser.add_argument(
+        "-n", "--rows", type=int, default=10_000, help="Approximate number of rows"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--statuses",
+        type=str,
+        default=",".join(DEFAULT_STATUSES),
+        help="Comma-separated workflow, from first to final status",
+    )
+    parser.add_argument("--rework-ratio", type=float, default=0.2)
+    parser.add_argument("--unfinished-ratio", type=float, default=0.1)
+    parser.add_argument("--projects", type=int, default=1)
+    parser.add_argument("--start", type=str, default="2023-01-01")
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument(
+        "--timestamp-format",
+        type=str,
+        default="%d/%m/%Y %H:%M:%S",
+        help="strftime format, or 'iso' for ISO 8601",
+    )
+    args = parser.parse_args()
+
+    try:
+        rows = write_transitions(
+            args.output,
+            args.rows,
+            timestamp_format=args.timestamp_format,
+            seed=args.seed,
+            statuses=[s.strip() for s in args.statuses.split(",")],
+            rework_ratio=args.rework_ratio,
+            unfinished_ratio=args.unfinished_ratio,
+            projects=args.projects,
+            start=args.start,
+            days=args.days,
+        )
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    print(f"Wrote {rows} transitions to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
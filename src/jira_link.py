@@ -1,12 +1,28 @@
 #!/usr/bin/env python
 
-from jira import JIRA
-import pandas as pd
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from types import SimpleNamespace
+import argparse
+import configparser
 import os
+import re
 import sys
+import time
+
+# pandas, the changelog store (which uses it) and the jira client take
+# a while to import, so they are only imported where they are needed.
+# That way --help, config errors and mock runs don't wait for a Jira
+# client they never use.
+
+# Responses worth retrying: rate limiting and transient server errors
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
 
 
 def connect_to_jira(cfg):
+    from jira import JIRA
+
     options = {"server": cfg["jira_url"]}
     return JIRA(options, basic_auth=(cfg["email"], cfg["api_token"]))
 
@@ -16,10 +32,130 @@ def get_tickets(cfg):
         return get_tickets_from_mockfile(cfg)
     else:
         jira_client = connect_to_jira(cfg)
+        if cfg.get("changelog_store"):
+            return sync_tickets_from_jira(jira_client, cfg)
         return get_tickets_from_jira(jira_client, cfg)
 
 
-def get_tickets_from_jira(jira_client, cfg):
+def retry_delay(error, attempt, backoff):
+    # Honour the server's Retry-After header if it sent one
+    response = getattr(error, "response", None)
+    retry_after = response.headers.get("Retry-After") if response is not None else None
+    try:
+        return float(retry_after)
+    except (TypeError, ValueError):
+        return backoff * 2**attempt
+
+
+def call_with_retries(request, cfg):
+    # Call request(), retrying on rate limits and server errors
+    from jira.exceptions import JIRAError
+
+    max_retries = cfg.get("max_retries", 5)
+    for attempt in range(max_retries + 1):
+        try:
+            return request()
+        except JIRAError as e:
+            if e.status_code not in RETRY_STATUS_CODES or attempt == max_retries:
+                raise
+            time.sleep(retry_delay(e, attempt, cfg.get("retry_backoff", 1.0)))
+
+
+def search_page(jira_client, jql_str, start_at, cfg):
+    # Fetch one page of issues
+    return call_with_retries(
+        lambda: jira_client.search_issues(
+            jql_str=jql_str,
+            expand="changelog",
+            startAt=start_at,
+            maxResults=cfg.get("page_size", 100),
+        ),
+        cfg,
+    )
+
+
+def search_all_pages(jira_client, jql_str, cfg):
+    """Fetch all pages of a search, yielding them in order.
+
+    The first page tells us how many issues there are in total, so the
+    remaining pages are fetched concurrently by a bounded thread pool.
+    Only a few pages are fetched ahead of the one being yielded, so
+    memory use does not grow with the size of the search.
+    """
+    first = search_page(jira_client, jql_str, 0, cfg)
+    yield first
+
+    total = getattr(first, "total", None)
+    if total is None:
+        # No total to go on, so page until we get a short page
+        page, start_at = first, len(first)
+        while len(page) == cfg.get("page_size", 100):
+            page = search_page(jira_client, jql_str, start_at, cfg)
+            start_at += len(page)
+            yield page
+        return
+
+    # The server may return fewer issues per page than we asked for,
+    # so page by what it actually returned.
+    page_size = len(first)
+    if page_size == 0 or page_size >= total:
+        return
+    concurrency = cfg.get("concurrency", 4)
+    starts = iter(range(page_size, total, page_size))
+
+    def fetch(start_at):
+        return search_page(jira_client, jql_str, start_at, cfg)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        pending = deque(
+            pool.submit(fetch, start_at) for start_at in islice(starts, 2 * concurrency)
+        )
+        while pending:
+            page = pending.popleft().result()
+            for start_at in islice(starts, 1):
+                pending.append(pool.submit(fetch, start_at))
+            yield page
+
+
+def changelog_histories(jira_client, issue, cfg):
+    """Yield (created, items) for each entry in an issue's changelog.
+
+    Search results only embed the first page of a changelog. When it
+    was cut short, the rest is fetched from the paged changelog
+    endpoint.
+    """
+    changelog = issue.changelog
+    for history in changelog.histories:
+        yield history.created, history.items
+
+    total = getattr(changelog, "total", None)
+    if not isinstance(total, int):
+        return
+    start_at = len(changelog.histories)
+    while start_at < total:
+        page = call_with_retries(
+            lambda: jira_client._get_json(
+                f"issue/{issue.key}/changelog",
+                params={"startAt": start_at, "maxResults": 100},
+            ),
+            cfg,
+        )
+        values = page.get("values", [])
+        if not values:
+            break
+        for history in values:
+            yield history["created"], [
+                SimpleNamespace(
+                    field=item.get("field"),
+                    fromString=item.get("fromString"),
+                    toString=item.get("toString"),
+                )
+                for item in history.get("items", [])
+            ]
+        start_at += len(values)
+
+
+def get_filter_jql(jira_client, cfg):
     filter_name = cfg["jira_filter"]
     saved_filters = jira_client.favourite_filters()
     target_filter = next((f for f in saved_filters if f.name == filter_name), None)
@@ -27,41 +163,108 @@ def get_tickets_from_jira(jira_client, cfg):
     if not target_filter:
         raise ValueError(f"Jira filter named '{filter_name}' not found.")
 
-    jql_str = target_filter.jql
+    return target_filter.jql
 
-    start_at = 0
-    max_results = 100
-    issues = []
 
-    while True:
-        chunk = jira_client.search_issues(
-            jql_str=jql_str, expand="changelog", startAt=start_at, maxResults=max_results
-        )
+def get_tickets_from_jira(jira_client, cfg):
+    return get_tickets_for_jql(jira_client, get_filter_jql(jira_client, cfg), cfg)
 
-        if len(chunk) == 0:
-            # No more issues to retrieve
-            break
 
-        issues.extend(chunk)
-        start_at += max_results
+def get_tickets_for_jql(jira_client, jql_str, cfg):
+    # Flatten status transitions into column buffers page by page, so
+    # issue objects can be dropped as soon as they are processed.
+    import pandas as pd
+    from changelog_store import TRANSITION_COLUMNS
+
+    columns = {name: [] for name in TRANSITION_COLUMNS}
+    for page in search_all_pages(jira_client, jql_str, cfg):
+        for issue in page:
+            for created, items in changelog_histories(jira_client, issue, cfg):
+                for item in items:
+                    if item.field == "status":
+                        columns["ticket_id"].append(issue.key)
+                        columns["from_status"].append(item.fromString)
+                        columns["to_status"].append(item.toString)
+                        columns["changed_at"].append(created)
 
+    return pd.DataFrame(columns, columns=TRANSITION_COLUMNS)
 
-    ticket_data = []
-    for issue in issues:
-        changelog = issue.changelog
-        for history in changelog.histories:
-            for item in history.items:
-                if item.field == "status":
-                    ticket_data.append(
-                        {
-                            "ticket_id": issue.key,
-                            "from_status": item.fromString,
-                            "to_status": item.toString,
-                            "changed_at": history.created,
-                        }
-                    )
 
-    return pd.DataFrame(ticket_data)
+def updated_since_jql(jql_str, since):
+    # Restrict a JQL query to issues updated since a point in time,
+    # keeping any ORDER BY clause at the end where it belongs.
+    query, *order_by = re.split(r"\s+(?=ORDER\s+BY\s)", jql_str, flags=re.IGNORECASE)
+    jql = f'({query}) AND updated >= "{since:%Y-%m-%d %H:%M}"'
+    return " ".join([jql] + order_by)
+
+
+def sync_tickets_from_jira(jira_client, cfg):
+    """Fetch ticket data through a local changelog store.
+
+    The first sync fetches every issue in the filter. Later syncs only
+    fetch issues updated since the last one, and merge their status
+    transitions into the store, skipping the ones we already have.
+    Returns all transitions in the store.
+    """
+    import pandas as pd
+    from changelog_store import (
+        add_transitions,
+        get_last_sync,
+        load_transitions,
+        open_store,
+        set_last_sync,
+    )
+
+    jql_str = get_filter_jql(jira_client, cfg)
+    source = f"{cfg.get('jira_url')} {jql_str}"
+    sync_started = pd.Timestamp.now(tz="UTC")
+
+    connection = open_store(cfg["changelog_store"])
+    try:
+        last_sync = get_last_sync(connection, source)
+        if last_sync is not None:
+            # JQL dates are in the Jira user's timezone, which we do not
+            # know, so overlap with the previous sync to be safe.
+            since = last_sync - pd.Timedelta(hours=cfg.get("sync_overlap_hours", 24))
+            jql_str = updated_since_jql(jql_str, since)
+
+        add_transitions(connection, get_tickets_for_jql(jira_client, jql_str, cfg))
+        set_last_sync(connection, source, sync_started)
+        return load_transitions(connection)
+    finally:
+        connection.close()
+
+
+class JiraPoller:
+    """Polls Jira for the status transitions of recently updated issues.
+
+    The first poll fetches every issue in the filter. Later polls only
+    fetch issues updated since the previous one (with the same overlap
+    as sync_tickets_from_jira), so they return transitions already
+    seen as well as new ones.
+    """
+
+    def __init__(self, cfg, jira_client=None):
+        self.cfg = cfg
+        self.jira_client = jira_client
+        self.last_poll = None
+
+    def poll(self):
+        import pandas as pd
+
+        if self.jira_client is None:
+            self.jira_client = connect_to_jira(self.cfg)
+        jql_str = get_filter_jql(self.jira_client, self.cfg)
+        poll_started = pd.Timestamp.now(tz="UTC")
+        if self.last_poll is not None:
+            since = self.last_poll - pd.Timedelta(
+                hours=self.cfg.get("sync_overlap_hours", 24)
+            )
+            jql_str = updated_since_jql(jql_str, since)
+
+        transitions = get_tickets_for_jql(self.jira_client, jql_str, self.cfg)
+        self.last_poll = poll_started
+        return transitions
 
 
 def get_tickets_from_mockfile(cfg):
@@ -72,17 +275,36 @@ def get_tickets_from_mockfile(cfg):
         )
         sys.exit(1)
 
+    import pandas as pd
+
     return pd.read_csv(mock_datafile, parse_dates=["changed_at"])
 
 
+def read_jira_config(config):
+    # The [JIRA] section of a config file
+    return {
+        "email": config.get("JIRA", "EMAIL", fallback=None),
+        "jira_url": config.get("JIRA", "JIRA_URL", fallback=None),
+        "api_token": config.get("JIRA", "API_TOKEN", fallback=None),
+        "project_key": config.get("JIRA", "PROJECT_KEY", fallback=None),
+        "mock_jira_data": config.get("JIRA", "MOCK_JIRA_DATA", fallback=None),
+        "jira_filter": config.get("JIRA", "JIRA_FILTER", fallback=None),
+        "page_size": config.getint("JIRA", "PAGE_SIZE", fallback=100),
+        "concurrency": config.getint("JIRA", "CONCURRENCY", fallback=4),
+        "max_retries": config.getint("JIRA", "MAX_RETRIES", fallback=5),
+        "retry_backoff": config.getfloat("JIRA", "RETRY_BACKOFF", fallback=1.0),
+        "changelog_store": config.get("JIRA", "CHANGELOG_STORE", fallback=None),
+        "sync_overlap_hours": config.getfloat(
+            "JIRA", "SYNC_OVERLAP_HOURS", fallback=24
+        ),
+    }
+
+
 def print_help():
     print("jira_link.py - get ticket details from Jira")
 
 
-if __name__ == "__main__":
-    import configparser
-    import argparse
-
+def main():
     parser = argparse.ArgumentParser(description="Fetch Jira ticket data")
     parser.add_argument(
         "-c",
@@ -96,21 +318,21 @@ if __name__ == "__main__":
     if not args.config_file:
         print("Error:  -c (config file) must be provided.")
         sys.exit(1)
+    if not os.path.isfile(args.config_file):
+        print(f"The file '{args.config_file}' does not exist or is not readable.")
+        sys.exit(1)
 
     # Get configfile settings
     config = configparser.ConfigParser()
     config.read(args.config_file)
-    cfg = {
-        "email": config.get("JIRA", "EMAIL", fallback=None),
-        "jira_url": config.get("JIRA", "JIRA_URL", fallback=None),
-        "api_token": config.get("JIRA", "API_TOKEN", fallback=None),
-        "project_key": config.get("JIRA", "PROJECT_KEY", fallback=None),
-        "mock_jira_data": config.get("JIRA", "MOCK_JIRA_DATA", fallback=None),
-        "jira_filter": config.get("JIRA", "JIRA_FILTER", fallback=None),
-    }
+    cfg = read_jira_config(config)
 
     # connect to a source and get ticket data
     # source can be: jira or mockfile
     dataframe = get_tickets(cfg)
 
     print(dataframe.sort_values(by="changed_at").to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
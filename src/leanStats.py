@@ -1,256 +1,1154 @@
 #!/usr/bin/env python3
 
-import argparse
-import configparser
 import pandas as pd
 import numpy as np
-import re
+from pandas.api.indexers import BaseIndexer
+from pandas.api.types import union_categoricals
+import configparser
 import datetime
-
+import io
 import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain, repeat
+
 import os
 
+from stage_profile import NullProfiler
+from state_store import load_state, save_state, read_appended_lines
+from parse_cache import cache_key, load_transitions, store_transitions
+from metrics_output import output_path, write_metrics
+from quantile_sketch import (
+    QuantileSketch,
+    counts_quantiles,
+    grouped_counts,
+    sketch_gamma,
+)
+from stats_common import (
+    LANE_DONE,
+    LANE_IGNORE,
+    LANE_TODO,
+    LANE_UNKNOWN,
+    LANE_WIP,
+    PERIODS,
+    WEEKDAYS,
+    input_files,
+)
+from stats_config import read_config
 
-def check_statuses_defined(dataframe_in, cfg):
-    defined_statuses = set(
-        status.upper()
-        for group in ["todo_names", "wip_names", "done_names"]
-        for status in cfg[group]
-    )
+# Timestamp formats we know about, in the order they are tried when
+# sniffing the changed_at column.
+TIMESTAMP_FORMATS = [
+    # Jira REST API, e.g. 2023-09-26T09:03:31.355+0200
+    "%Y-%m-%dT%H:%M:%S.%f%z",
+    # Jira CSV export, e.g. 15/08/2023 06:39:14
+    "%d/%m/%Y %H:%M:%S",
+    "%d/%m/%Y",
+    "ISO8601",
+]
+UTC_OFFSET_PATTERN = r"(?:Z|[+-]\d{2}:?\d{2})$"
+
+# The only columns of the input CSV we use
+INPUT_COLUMNS = ["ticket_id", "to_status", "changed_at"]
+
+# Compact dtypes for the pipeline. Ticket ids and statuses repeat a
+# lot, so they are categoricals. Timestamps stay datetime64 (int64
+# under the hood). Cycletimes and metrics are whole numbers of days or
+# tickets, in nullable ints so tickets which are not done yet can be
+# left empty.
+INPUT_DTYPES = {"ticket_id": "category", "to_status": "category", "changed_at": str}
+METRIC_DTYPE = "Int32"
+
+
+def sniff_timestamp_format(values, sample_size=1000):
+    # Pick the format which parses most of a sample of the values
+    sample = values.dropna().head(sample_size)
+    best_format, best_count = None, 0
+    for timestamp_format in TIMESTAMP_FORMATS:
+        count = (
+            pd.to_datetime(sample, format=timestamp_format, errors="coerce", utc=True)
+            .notna()
+            .sum()
+        )
+        if count > best_count:
+            best_format, best_count = timestamp_format, count
+        if count == len(sample):
+            break
+    return best_format
+
+
+def parse_timestamp(date_str):
+    # Slow path for values the sniffed format could not handle.
+    # First, try parsing the sane format
+    try:
+        return pd.Timestamp(datetime.datetime.fromisoformat(date_str))
+    except ValueError:
+        pass
+    # If unsuccessful, try freedom format
+    try:
+        return pd.Timestamp(datetime.datetime.strptime(date_str, "%d/%m/%Y %H:%M:%S"))
+    except ValueError:
+        raise ValueError(f"Could not parse timestamp '{date_str}'")
 
-    # get statuses we want to ignore
-    ignored_statuses = set(status.upper() for status in cfg.get("ignore_names", []))
 
-    # Get unique statuses, and check if there are any which are not
-    # defined in the config file
-    all_statuses = set(dataframe_in["to_status"].str.upper().unique())
-    undefined_statuses = all_statuses - defined_statuses
+def parse_timestamps(values, timezone="UTC"):
+    """Parse a column of timestamp strings into naive datetimes.
 
-    # Now remove the known ignored statuses from the list of undefineds
-    undefined_statuses = undefined_statuses - ignored_statuses
+    The format is sniffed once and the whole column parsed in one
+    vectorized call; only values which do not fit are parsed one by
+    one. Timestamps carrying a UTC offset are converted to `timezone`,
+    and timestamps without one are taken to already be in `timezone`.
+    """
+    values = pd.Series(values)
+    timestamp_format = sniff_timestamp_format(values)
 
-    if undefined_statuses:
+    if timestamp_format is None:
+        parsed = pd.Series(pd.NaT, index=values.index, dtype="datetime64[ns, UTC]")
+    else:
+        parsed = pd.to_datetime(
+            values, format=timestamp_format, errors="coerce", utc=True
+        )
+
+    wall_clock = parsed.dt.tz_localize(None)
+    if timestamp_format == "ISO8601":
+        has_offset = values.str.contains(UTC_OFFSET_PATTERN, na=False)
+        localized = parsed.dt.tz_convert(timezone).dt.tz_localize(None)
+        result = localized.where(has_offset, wall_clock)
+    elif timestamp_format is not None and "%z" in timestamp_format:
+        result = parsed.dt.tz_convert(timezone).dt.tz_localize(None)
+    else:
+        result = wall_clock
+
+    # Fall back to row by row parsing for the outliers. The result may
+    # still be a view of the .dt accessor, which can't be written to.
+    outliers = np.flatnonzero(parsed.isna() & values.notna())
+    if len(outliers):
+        result = result.copy()
+    for row in outliers:
+        timestamp = parse_timestamp(values.iloc[row])
+        if timestamp.tzinfo is not None:
+            timestamp = timestamp.tz_convert(timezone).tz_localize(None)
+        result.iloc[row] = timestamp
+
+    return result
+
+
+# Config groups for each lane. Later groups win when a status is in
+# more than one, so a status listed as both ignored and WIP is WIP.
+LANE_GROUPS = [
+    ("ignore_names", LANE_IGNORE),
+    ("todo_names", LANE_TODO),
+    ("wip_names", LANE_WIP),
+    ("done_names", LANE_DONE),
+]
+
+
+def lane_lookup(cfg):
+    # Upper-cased status name -> lane code, from the [BOARD] config
+    return {
+        status.upper(): lane
+        for group, lane in LANE_GROUPS
+        for status in cfg.get(group, [])
+    }
+
+
+def classify_statuses(statuses, cfg):
+    """Lane code (int8) of each status in a to_status column.
+
+    The column is turned into a Categorical (a no-op if it already is
+    one), so each distinct status is looked up once, and the lanes of
+    all rows are then taken from the category codes in one go.
+    """
+    statuses = statuses.astype("category")
+    lookup = lane_lookup(cfg)
+    category_lanes = np.array(
+        [
+            lookup.get(str(status).upper(), LANE_UNKNOWN)
+            for status in statuses.cat.categories
+        ]
+        # Missing statuses have code -1, which picks this last entry
+        + [LANE_UNKNOWN],
+        dtype=np.int8,
+    )
+    return category_lanes[statuses.cat.codes.to_numpy()]
+
+
+def check_statuses_defined(dataframe_in, cfg, lanes=None):
+    # Statuses which are neither on the board nor ignored
+    if lanes is None:
+        lanes = classify_statuses(dataframe_in["to_status"], cfg)
+    unknown = lanes == LANE_UNKNOWN
+
+    if unknown.any():
+        undefined_statuses = (
+            dataframe_in["to_status"][unknown].astype(str).str.upper().unique()
+        )
         raise ValueError(
             f"The following statuses are not defined in the configuration: {', '.join(undefined_statuses)}"
         )
 
 
-def extract_ticket_timestamps(dataframe_in, cfg):
-    # Find any statuses which might not be defined
-    check_statuses_defined(dataframe_in, cfg)
+def ticket_timestamps(dataframe_in, cfg, lanes=None):
+    if lanes is None:
+        lanes = classify_statuses(dataframe_in["to_status"], cfg)
 
     # Filter when tickets moved to any WIP state
     in_progress = (
-        dataframe_in[
-            dataframe_in["to_status"].str.upper().isin(map(str.upper, cfg["wip_names"]))
-        ]
-        .groupby("ticket_id")
+        dataframe_in[lanes == LANE_WIP]
+        .groupby("ticket_id", observed=True)
         .agg({"changed_at": "min"})
         .rename(columns={"changed_at": "timestamp_start"})
     )
 
     # Filter when tickets moved to any DONE state
     done = (
-        dataframe_in[
-            dataframe_in["to_status"]
-            .str.upper()
-            .isin(map(str.upper, cfg["done_names"]))
-        ]
-        .groupby("ticket_id")
+        dataframe_in[lanes == LANE_DONE]
+        .groupby("ticket_id", observed=True)
         .agg({"changed_at": "max"})
         .rename(columns={"changed_at": "timestamp_end"})
     )
 
-    # left join on key.
-    return in_progress.join(done, on="ticket_id").reset_index()
+    # Outer join on key, so that partial results (e.g. from separate
+    # chunks of a file) can be combined with combine_ticket_timestamps.
+    return in_progress.join(done, how="outer")
+
+
+def combine_ticket_timestamps(partials):
+    return (
+        pd.concat(partials)
+        .groupby(level="ticket_id", observed=True)
+        .agg({"timestamp_start": "min", "timestamp_end": "max"})
+    )
+
+
+def started_tickets(timestamps):
+    # Only tickets which entered a WIP state have a cycletime
+    started = timestamps[timestamps["timestamp_start"].notna()].reset_index()
+
+    # However the partial results were combined, the ticket ids end up
+    # a categorical of just these tickets
+    started["ticket_id"] = (
+        started["ticket_id"].astype("category").cat.remove_unused_categories()
+    )
+    return started
+
+
+def extract_ticket_timestamps(dataframe_in, cfg):
+    return LeanStats(dataframe_in, cfg).timestamps
+
+
+def read_transitions(file_path, cfg, chunksize=None, names=None, extra_columns=()):
+    # Only read the columns we need, plus any extra_columns (read as
+    # categories). With a chunksize this returns an iterator of parsed
+    # chunks instead of one DataFrame. `names` is for input without a
+    # header line.
+    reader = pd.read_csv(
+        file_path,
+        usecols=INPUT_COLUMNS + [c for c in extra_columns if c not in INPUT_COLUMNS],
+        dtype=dict({column: "category" for column in extra_columns}, **INPUT_DTYPES),
+        chunksize=chunksize,
+        names=names,
+        header=None if names else "infer",
+    )
+    if chunksize is None:
+        reader["changed_at"] = parse_timestamps(
+            reader["changed_at"], cfg.get("timezone", "UTC")
+        )
+        return reader
+    return (
+        chunk.assign(
+            changed_at=parse_timestamps(chunk["changed_at"], cfg.get("timezone", "UTC"))
+        )
+        for chunk in reader
+    )
+
+
+def read_transitions_cached(file_path, cfg, extra_columns=()):
+    # Like read_transitions, but keeps the parsed table in the cache
+    # directory (if configured) so the next run can skip parsing.
+    # Tables with extra columns are not cached.
+    cache_dir = cfg.get("cache_dir")
+    if not cache_dir or extra_columns:
+        return read_transitions(file_path, cfg, extra_columns=extra_columns)
+
+    key = cache_key(file_path, cfg, cfg.get("cache_hash_content", False))
+    data = load_transitions(cache_dir, key)
+    if data is None:
+        data = read_transitions(file_path, cfg)
+        store_transitions(cache_dir, key, data, cfg.get("cache_size"))
+    return data
+
+
+def concat_transitions(parts):
+    # pd.concat turns categoricals with different categories into
+    # plain objects, so those columns are unioned instead
+    return pd.DataFrame(
+        {
+            column: (
+                union_categoricals([part[column] for part in parts])
+                if isinstance(parts[0][column].dtype, pd.CategoricalDtype)
+                else pd.concat([part[column] for part in parts], ignore_index=True)
+            )
+            for column in parts[0].columns
+        }
+    )
+
+
+def drop_duplicate_transitions(data):
+    # Keep the first of each (ticket_id, to_status, changed_at). Rows
+    # are compared by a 64-bit hash of those columns, which makes this
+    # one pass over a hash table of integers; a collision between two
+    # different transitions is vanishingly unlikely.
+    hashes = pd.util.hash_pandas_object(data[INPUT_COLUMNS], index=False)
+    return data[~hashes.duplicated().to_numpy()].reset_index(drop=True)
+
+
+def read_input_files(file_paths, cfg, jobs=None, extra_columns=()):
+    """Transitions of one or more CSV files, as one table.
+
+    Several files are parsed (and cached) one per task, in a pool of
+    `jobs` processes (one per CPU by default), and transitions found
+    in more than one of them, as in overlapping exports, are kept
+    once. A single file is read as it is.
+    """
+    if len(file_paths) == 1:
+        return read_transitions_cached(file_paths[0], cfg, extra_columns)
+    jobs = jobs or os.cpu_count()
+    if jobs == 1:
+        parts = [read_transitions_cached(p, cfg, extra_columns) for p in file_paths]
+    else:
+        # Hand out the files a few at a time, so hundreds of small files
+        # don't cost a round trip each
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            parts = list(
+                pool.map(
+                    read_transitions_cached,
+                    file_paths,
+                    repeat(cfg),
+                    repeat(extra_columns),
+                    chunksize=max(1, len(file_paths) // (4 * jobs)),
+                )
+            )
+    return drop_duplicate_transitions(concat_transitions(parts))
+
+
+def reduce_transitions(chunks, cfg):
+    """Reduce chunks of transitions to per-ticket timestamps.
+
+    Each chunk is reduced to per-ticket first WIP / last DONE
+    timestamps straight away, so memory grows with the number of
+    tickets rather than with the number of transitions.
+    """
+    combined = None
+    partials = []
+    buffered = 0
+    for chunk in chunks:
+        lanes = classify_statuses(chunk["to_status"], cfg)
+        check_statuses_defined(chunk, cfg, lanes)
+        partial = ticket_timestamps(chunk, cfg, lanes)
+        partials.append(partial)
+        buffered += len(partial)
+
+        # Fold the buffered partials into the running result once they
+        # outgrow it, which keeps the total amount of folding linear.
+        if combined is None or buffered > len(combined):
+            if combined is not None:
+                partials.insert(0, combined)
+            combined = combine_ticket_timestamps(partials)
+            partials, buffered = [], 0
+
+    if combined is None:
+        return ticket_timestamps(pd.DataFrame(columns=INPUT_COLUMNS), cfg)
+    if partials:
+        combined = combine_ticket_timestamps([combined] + partials)
+    return combined
+
+
+def stream_ticket_timestamps(file_paths, cfg, chunksize):
+    # Extract ticket timestamps from one or more CSV files, one chunk at
+    # a time. Duplicate transitions do no harm here, as only the first
+    # and last timestamps of each ticket are kept.
+    if isinstance(file_paths, (str, os.PathLike)):
+        file_paths = [file_paths]
+    chunks = chain.from_iterable(
+        read_transitions(file_path, cfg, chunksize) for file_path in file_paths
+    )
+    return started_tickets(reduce_transitions(chunks, cfg))
 
 
 def calculate_cycletime(dataframe):
     df_copy = dataframe.copy()
 
+    # Tickets which are not done yet get an empty cycletime
     time_difference = df_copy["timestamp_end"] - df_copy["timestamp_start"]
     total_seconds = time_difference.dt.total_seconds()
     cycletime_in_days = np.ceil(total_seconds / (24 * 3600))
-    df_copy["cycletime"] = cycletime_in_days.astype(int)
+    df_copy["cycletime"] = cycletime_in_days.astype(METRIC_DTYPE)
 
     return df_copy
 
 
-def compute_metrics_per_ticket(dataframe):
-    # Sort dataframe by 'timestamp_end'
-    dataframe = dataframe.sort_values(by="timestamp_end")
+class LookbackIndexer(BaseIndexer):
+    """Rolling window bounds taken from precomputed start/end arrays.
+
+    Lets pandas run its incremental (skiplist based) median and
+    quantile over windows we have already located with searchsorted.
+    """
+
+    def get_window_bounds(
+        self, num_values=0, min_periods=None, center=None, closed=None, step=None
+    ):
+        return self.start, self.end
+
+
+def lookback_window_bounds(timestamps, lookbacks):
+    # timestamps must be sorted. A ticket's window holds every ticket
+    # which finished in [timestamp_end - lookback, timestamp_end],
+    # including tickets finishing at the exact same time. The end
+    # bounds are the same for every lookback, so only the starts are
+    # computed per lookback.
+    end = np.searchsorted(timestamps, timestamps, side="right").astype(np.int64)
+    starts = [
+        np.searchsorted(timestamps, timestamps - lookback, side="left").astype(np.int64)
+        for lookback in lookbacks
+    ]
+    return starts, end
+
+
+def metric_column(name, window, windows):
+    # Column names only carry the window when there is more than one,
+    # so the default single 7 day window keeps the classic names.
+    return name if len(windows) == 1 else f"{name}_{window}d"
+
+
+def cycletime_column(percentile, window, windows):
+    name = "median_cycletime" if percentile == 50 else f"p{percentile:g}_cycletime"
+    return metric_column(name, window, windows)
+
+
+def compute_metrics_per_ticket(dataframe, windows=(7,), percentiles=(50, 85)):
+    # Sort dataframe by 'timestamp_end'. Unfinished tickets (NaT)
+    # end up last, and tickets finishing at the same time keep their
+    # order.
+    dataframe = dataframe.sort_values(by="timestamp_end", kind="stable")
 
     # Initialize new columns
-    dataframe["median_cycletime"] = np.nan
-    dataframe["p85_cycletime"] = np.nan
-    dataframe["throughput"] = np.nan
-
-    # For each ticket, compute metrics over lookback window of 1 week
-    for idx, row in dataframe.iterrows():
-        lookback_start = row["timestamp_end"] - pd.Timedelta(days=7)
-        lookback_end = row["timestamp_end"]
-
-        # Filter dataframe for tickets within the lookback window
-        lookback_data = dataframe[
-            (dataframe["timestamp_end"] >= lookback_start)
-            & (dataframe["timestamp_end"] <= lookback_end)
-        ]
+    for window in windows:
+        for percentile in percentiles:
+            dataframe[cycletime_column(percentile, window, windows)] = pd.Series(
+                pd.NA, index=dataframe.index, dtype=METRIC_DTYPE
+            )
+        dataframe[metric_column("throughput", window, windows)] = pd.Series(
+            0, index=dataframe.index, dtype=METRIC_DTYPE
+        )
+
+    finished = dataframe["timestamp_end"].notna().to_numpy()
+    if not finished.any():
+        return dataframe
+
+    timestamps = dataframe.loc[finished, "timestamp_end"].to_numpy(
+        dtype="datetime64[ns]"
+    )
+    cycletimes = (
+        dataframe.loc[finished, "cycletime"].astype(float).reset_index(drop=True)
+    )
+
+    # For each ticket, compute metrics over each lookback window (in days)
+    starts, end = lookback_window_bounds(
+        timestamps, [np.timedelta64(window, "D") for window in windows]
+    )
+
+    def column_values(finished_values, empty):
+        values = np.full(len(dataframe), empty, dtype=float)
+        values[finished] = finished_values
+        return pd.array(values, dtype=METRIC_DTYPE)
 
-        # Compute metrics
-        dataframe.at[idx, "median_cycletime"] = np.ceil(
-            lookback_data["cycletime"].median()
+    for window, start in zip(windows, starts):
+        rolling = cycletimes.rolling(
+            LookbackIndexer(start=start, end=end), min_periods=1
         )
-        dataframe.at[idx, "p85_cycletime"] = np.ceil(
-            lookback_data["cycletime"].quantile(0.85)
+        for percentile in percentiles:
+            if percentile == 50:
+                values = rolling.median()
+            else:
+                values = rolling.quantile(percentile / 100)
+            dataframe[cycletime_column(percentile, window, windows)] = column_values(
+                np.ceil(values.to_numpy()), np.nan
+            )
+        dataframe[metric_column("throughput", window, windows)] = column_values(
+            end - start, 0
         )
-        dataframe.at[idx, "throughput"] = np.ceil(lookback_data.shape[0])
 
     return dataframe
 
 
-def compute_metrics_per_week(dataframe):
-    # populate week column
-    dataframe["week"] = dataframe["timestamp_end"].dt.strftime("%Y-W%U")
-
-    # Group by week
-    weekly_data = (
-        dataframe.groupby("week")
-        .agg(
-            {
-                "cycletime": [
-                    lambda x: np.ceil(x.quantile(0.5)),
-                    lambda x: np.ceil(x.quantile(0.85)),
-                ],
-                "ticket_id": "count",  # throughput
-            }
+def period_frequency(period, week_start="MON"):
+    if period == "week":
+        # Pandas names weeks after the day they end on
+        return f"W-{WEEKDAYS[WEEKDAYS.index(week_start) - 1]}"
+    return PERIODS[period]
+
+
+def period_columns(percentiles, relative_error=None):
+    return (
+        ["startdate", "enddate"]
+        + [f"cycletime_p{percentile:g}" for percentile in percentiles]
+        + (["cycletime_error"] if relative_error else [])
+        + ["throughput"]
+    )
+
+
+def compute_metrics_per_period(
+    dataframe,
+    period="week",
+    percentiles=(50, 85),
+    week_start="MON",
+    relative_error=None,
+):
+    """Cycletime percentiles and throughput per calendar period.
+
+    Tickets count towards the day, week, month or quarter their
+    timestamp_end falls in. All percentiles are computed in one
+    groupby on the periods, and periods in between without any
+    finished tickets are listed with empty metrics.
+
+    With a relative_error, the percentiles are read from a quantile
+    sketch of each period instead (see quantile_sketch), and are
+    within that fraction of the exact values. The bound is reported in
+    the cycletime_error column.
+    """
+    freq = period_frequency(period, week_start)
+    columns = period_columns(percentiles, relative_error)
+    finished = dataframe[dataframe["timestamp_end"].notna()]
+    if finished.empty:
+        return pd.DataFrame(columns=columns)
+
+    periods = finished["timestamp_end"].dt.to_period(freq)
+    cycletimes = finished["cycletime"].astype(float)
+    all_periods = pd.period_range(periods.min(), periods.max(), freq=freq)
+    quantiles = [percentile / 100 for percentile in percentiles]
+
+    if relative_error:
+        gamma = sketch_gamma(relative_error)
+        counts, offset = grouped_counts(
+            all_periods.get_indexer(periods), cycletimes, len(all_periods), gamma
         )
-        .reset_index()
+        values = np.ceil(
+            counts_quantiles(counts, quantiles, offset, gamma, whole_numbers=True)
+        )
+        throughput = np.where(counts.sum(axis=1) > 0, counts.sum(axis=1), np.nan)
+    else:
+        grouped = cycletimes.groupby(periods)
+        values = np.ceil(
+            grouped.quantile(quantiles).unstack().reindex(all_periods).to_numpy()
+        )
+        throughput = grouped.size().reindex(all_periods).to_numpy()
+
+    result = pd.DataFrame(
+        values, columns=columns[2 : 2 + len(percentiles)], dtype=METRIC_DTYPE
+    )
+    result.insert(0, "startdate", all_periods.start_time)
+    result.insert(1, "enddate", all_periods.end_time.normalize())
+    if relative_error:
+        result["cycletime_error"] = relative_error
+    result["throughput"] = throughput
+    return result.astype({"throughput": METRIC_DTYPE})
+
+
+def period_sketches(dataframe, period="week", week_start="MON", relative_error=0.01):
+    """A QuantileSketch of the cycletimes finished in each period.
+
+    Sketches of adjacent periods, or of the same period in different
+    partitions of the input, can be merged to get the percentiles of
+    the union without going back to the tickets.
+    """
+    freq = period_frequency(period, week_start)
+    finished = dataframe[dataframe["timestamp_end"].notna()]
+    periods = finished["timestamp_end"].dt.to_period(freq)
+    all_periods = pd.Index(periods.unique()).sort_values()
+    counts, offset = grouped_counts(
+        all_periods.get_indexer(periods),
+        finished["cycletime"].astype(float),
+        len(all_periods),
+        sketch_gamma(relative_error),
+    )
+    return pd.Series(
+        [QuantileSketch.from_counts(row, offset, relative_error) for row in counts],
+        index=all_periods,
+        dtype=object,
     )
-    weekly_data.columns = ["week", "cycletime_p50", "cycletime_p85", "throughput"]
 
-    # calculate start and end dates for all weeks
-    weekly_data["startdate"] = pd.to_datetime(
-        weekly_data["week"].apply(lambda x: x + "-1"), format="%Y-W%U-%w"
+
+def compute_metrics_per_week(dataframe, percentiles=(50, 85), week_start="MON"):
+    return compute_metrics_per_period(dataframe, "week", percentiles, week_start)
+
+
+def period_metrics(ticket_metrics, cfg):
+    # Periodic metrics with the period settings from cfg
+    return compute_metrics_per_period(
+        ticket_metrics,
+        cfg.get("period", "week"),
+        cfg.get("percentiles", (50, 85)),
+        cfg.get("week_start", "MON"),
+        cfg.get("relative_error"),
     )
-    weekly_data["enddate"] = weekly_data["startdate"] + pd.Timedelta(days=6)
 
-    # Clone the date data from weekly_data to all_weeks
-    all_weeks = weekly_data[["week", "startdate", "enddate"]].copy()
 
-    # Generate a dataframe with all weeks in the range
-    complete_weeks = pd.DataFrame(
-        {
-            "startdate": pd.date_range(
-                start=weekly_data["startdate"].min(),
-                end=weekly_data["enddate"].max(),
-                freq="W-MON",
-            )
+def compute_metrics(data, cfg):
+    # Per-ticket and periodic metrics for a table of transitions
+    return LeanStats(data, cfg).metrics()
+
+
+def drop_unused_categories(dataframe):
+    # A slice of a table keeps all categories of the whole table, which
+    # slows down grouping on them and is pickled along with the slice
+    return dataframe.assign(
+        **{
+            column: dataframe[column].cat.remove_unused_categories()
+            for column in dataframe.columns
+            if isinstance(dataframe[column].dtype, pd.CategoricalDtype)
         }
     )
-    complete_weeks["enddate"] = complete_weeks["startdate"] + pd.Timedelta(days=6)
-    complete_weeks["week"] = complete_weeks["startdate"].dt.strftime("%Y-W%U")
 
-    # Merge complete_weeks with all_weeks to fill in missing weeks
-    all_weeks = pd.merge(
-        complete_weeks, all_weeks, on=["week", "startdate", "enddate"], how="left"
+
+def labelled(column, keys, tables):
+    # Tables of each group concatenated, with the group in the first
+    # column
+    tables = [table.assign(**{column: key}) for key, table in zip(keys, tables)]
+    combined = pd.concat(tables, ignore_index=True)
+    return combined[[column] + [c for c in combined.columns if c != column]]
+
+
+def compute_metrics_by_group(data, column, cfg, jobs=None, profiler=None):
+    """Per-ticket and periodic metrics for each value of `column`.
+
+    The transitions are split on the value of `column` in each row,
+    and the groups are computed in a pool of `jobs` processes (one per
+    CPU by default). The results are concatenated, group by group,
+    with the group in the first column. Rows without a value form a
+    group of their own. Each step is run through `profiler`, if given.
+    """
+    return LeanStats(data, cfg).metrics_by_group(column, jobs, profiler)
+
+
+def rows_in_range(table, column, start=None, end=None):
+    # Rows where `column` is from start up to, but not including, end
+    keep = pd.Series(True, index=table.index)
+    if start is not None:
+        keep &= table[column] >= pd.Timestamp(start)
+    if end is not None:
+        keep &= table[column] < pd.Timestamp(end)
+    return table[keep].reset_index(drop=True)
+
+
+def whole_periods(periods, start=None, end=None):
+    # Periods which lie entirely from start up to, but not including,
+    # end. The ones cut off by either are left out rather than shown
+    # with only part of their tickets.
+    if periods.empty:
+        return periods
+    keep = pd.Series(True, index=periods.index)
+    if start is not None:
+        keep &= periods["startdate"] >= pd.Timestamp(start)
+    if end is not None:
+        keep &= periods["enddate"] + pd.Timedelta(days=1) <= pd.Timestamp(end)
+    return periods[keep].reset_index(drop=True)
+
+
+class LeanStats:
+    """Metrics of one table of transitions, for answering many queries.
+
+    Built once from the transitions (a DataFrame, or the path, glob or
+    directory of CSVs to read, along with any extra_columns to group
+    by) and a cfg with the board and the default settings. The lanes
+    of the transitions, the ticket table and every metrics table asked
+    for are kept once computed, so later queries for other date ranges
+    or groups, or the same windows again, only do the work which is
+    new to them. Date ranges are cut out of the metrics of
+    all tickets, so lookback windows still see the tickets finished
+    before the start.
+
+    The lanes, timestamps and tickets are shared with the engine and
+    must not be changed in place; metrics tables are handed out as
+    copies.
+    """
+
+    def __init__(self, data, cfg, extra_columns=()):
+        if isinstance(data, (str, os.PathLike)):
+            data = read_input_files(
+                input_files(os.fspath(data)), cfg, cfg.get("jobs"), extra_columns
+            )
+        self.data = data
+        self.cfg = cfg
+        self.results = {}
+
+    @classmethod
+    def from_config(cls, config, data=None, extra_columns=()):
+        """An engine with the settings of a config file.
+
+        `config` is the path of the file or a ConfigParser. The input
+        is the config's input_csv_file, unless `data` is given.
+        """
+        if not isinstance(config, configparser.ConfigParser):
+            path, config = config, configparser.ConfigParser()
+            if not config.read(path):
+                raise ValueError(
+                    f"The file '{path}' does not exist or is not readable."
+                )
+        if data is None:
+            data = config.get("SYSTEM", "input_csv_file", fallback=None)
+        return cls(data, read_config(config), extra_columns)
+
+    def memoized(self, key, compute):
+        if key not in self.results:
+            self.results[key] = compute()
+        return self.results[key]
+
+    @property
+    def lanes(self):
+        return self.memoized(
+            "lanes", lambda: classify_statuses(self.data["to_status"], self.cfg)
+        )
+
+    @property
+    def timestamps(self):
+        # When each ticket which entered WIP started, and finished
+        def compute():
+            check_statuses_defined(self.data, self.cfg, self.lanes)
+            return started_tickets(ticket_timestamps(self.data, self.cfg, self.lanes))
+
+        return self.memoized("timestamps", compute)
+
+    @property
+    def tickets(self):
+        return self.memoized("tickets", lambda: calculate_cycletime(self.timestamps))
+
+    def ticket_metrics(self, windows=None, percentiles=None, start=None, end=None):
+        """Rolling metrics of the tickets finished from start up to end.
+
+        Without a date range, unfinished tickets are included too.
+        """
+        windows = tuple(windows or self.cfg.get("windows", (7,)))
+        percentiles = tuple(percentiles or self.cfg.get("percentiles", (50, 85)))
+        metrics = self.memoized(
+            ("ticket_metrics", windows, percentiles),
+            lambda: compute_metrics_per_ticket(
+                self.tickets, windows, percentiles
+            ).reset_index(drop=True),
+        )
+        return rows_in_range(metrics, "timestamp_end", start, end)
+
+    def period_metrics(
+        self,
+        period=None,
+        percentiles=None,
+        week_start=None,
+        relative_error=None,
+        start=None,
+        end=None,
+    ):
+        """Metrics of the periods starting from start up to end.
+
+        A relative_error of 0 asks for exact percentiles when the cfg
+        has one.
+        """
+        period = period or self.cfg.get("period", "week")
+        percentiles = tuple(percentiles or self.cfg.get("percentiles", (50, 85)))
+        week_start = week_start or self.cfg.get("week_start", "MON")
+        if relative_error is None:
+            relative_error = self.cfg.get("relative_error")
+        settings = (period, percentiles, week_start, relative_error or None)
+        metrics = self.memoized(
+            ("period_metrics",) + settings,
+            lambda: compute_metrics_per_period(self.tickets, *settings),
+        )
+        return rows_in_range(metrics, "startdate", start, end)
+
+    def metrics(self):
+        # Per-ticket and periodic metrics with the settings from cfg
+        return self.ticket_metrics(), self.period_metrics()
+
+    def groups(self, column):
+        # An engine for the transitions with each value of `column`.
+        # Rows without a value form a group of their own.
+        def split():
+            if column not in self.data.columns:
+                raise ValueError(f"No column '{column}' to group by")
+            check_statuses_defined(self.data, self.cfg, self.lanes)
+            return {
+                key: LeanStats(drop_unused_categories(part), self.cfg)
+                for key, part in self.data.groupby(
+                    column, observed=True, dropna=False, sort=True
+                )
+            }
+
+        return self.memoized(("groups", column), split)
+
+    def metrics_by_group(self, column, jobs=None, profiler=None):
+        """Per-ticket and periodic metrics for each value of `column`.
+
+        Like metrics(), for each group, computed in a pool of `jobs`
+        processes (one per CPU by default). Splitting, computing and
+        concatenating the groups are run through `profiler`, if given.
+        """
+        profiler = profiler or NullProfiler()
+
+        def compute_groups(engines):
+            if jobs == 1 or len(engines) < 2:
+                return [engine.metrics() for engine in engines]
+            with ProcessPoolExecutor(max_workers=jobs) as pool:
+                return list(
+                    pool.map(
+                        compute_metrics,
+                        [engine.data for engine in engines],
+                        repeat(self.cfg),
+                    )
+                )
+
+        def concat_groups(groups, results):
+            ticket_metrics = labelled(column, groups, [t for t, _ in results])
+            return (
+                ticket_metrics.astype({column: "category", "ticket_id": "category"}),
+                labelled(column, groups, [p for _, p in results]),
+            )
+
+        def compute():
+            groups = profiler.run("split_groups", self.groups, column)
+            results = profiler.run(
+                "compute_groups", compute_groups, list(groups.values())
+            )
+            return profiler.run("concat_groups", concat_groups, groups, results)
+
+        ticket_metrics, periodic_metrics = self.memoized(
+            ("metrics_by_group", column), compute
+        )
+        return ticket_metrics.copy(), periodic_metrics.copy()
+
+    def query(self, table="tickets", group_by=None, **settings):
+        """One metrics table, "tickets" or "periods".
+
+        The settings are those of ticket_metrics or period_metrics.
+        With group_by, the table has the metrics of each group, with
+        the group in the first column.
+        """
+        if table not in ("tickets", "periods"):
+            raise ValueError(f"Table must be tickets or periods: '{table}'")
+
+        def answer(engine):
+            if table == "tickets":
+                return engine.ticket_metrics(**settings)
+            return engine.period_metrics(**settings)
+
+        if group_by is None:
+            return answer(self)
+        groups = self.groups(group_by)
+        result = labelled(group_by, groups, [answer(e) for e in groups.values()])
+        if table == "tickets":
+            result = result.astype({group_by: "category", "ticket_id": "category"})
+        return result
+
+    def batch(self, queries):
+        # Answers to a list of queries, each a dict of query() arguments,
+        # sharing whatever they have in common
+        return [self.query(**query) for query in queries]
+
+
+def changed_since(previous, current):
+    # Earliest timestamp_end, before or after the change, of any ticket
+    # whose timestamps differ between the two per-ticket tables. Only
+    # the metrics of tickets finishing at or after it can be affected.
+    previous = previous.reindex(current.index)
+    same = (previous == current) | (previous.isna() & current.isna())
+    changed = ~same.all(axis=1)
+    if not changed.any():
+        return None
+    ends = pd.concat(
+        [previous.loc[changed, "timestamp_end"], current.loc[changed, "timestamp_end"]]
+    )
+    if ends.notna().any():
+        return ends.min()
+    # Only unfinished tickets changed
+    return pd.NaT
+
+
+def update_ticket_metrics(previous_metrics, tickets, since, cfg):
+    # Recompute per-ticket metrics for tickets finishing at or after
+    # `since` (and unfinished tickets), reusing the rest.
+    started = started_tickets(tickets)
+    if pd.isna(since):
+        since = started["timestamp_end"].max()
+    if pd.isna(since):
+        # Nothing has finished yet
+        context = started
+    else:
+        lookback = pd.Timedelta(days=max(cfg["windows"]))
+        context = started[~(started["timestamp_end"] < since - lookback)]  # keeps NaT
+
+    recomputed = compute_metrics_per_ticket(
+        calculate_cycletime(context), cfg["windows"], cfg["percentiles"]
+    )
+    recomputed = recomputed[~(recomputed["timestamp_end"] < since)]
+    kept = previous_metrics[previous_metrics["timestamp_end"] < since]
+    return pd.concat([kept, recomputed], ignore_index=True).astype(
+        {"ticket_id": "category"}
     )
 
-    # Now merge all_weeks with weekly_data to get the metrics
-    result = pd.merge(
-        all_weeks,
-        weekly_data.drop(columns=["startdate", "enddate"]),
-        on="week",
-        how="left",
+
+def update_period_metrics(previous_periods, ticket_metrics, since, cfg):
+    # Recompute the periods from the one `since` falls in onwards
+    if pd.isna(since):
+        return previous_periods
+    freq = period_frequency(cfg.get("period", "week"), cfg.get("week_start", "MON"))
+    period_start = pd.Period(since, freq).start_time
+
+    recent = ticket_metrics[ticket_metrics["timestamp_end"] >= period_start]
+    kept = previous_periods[previous_periods["startdate"] < period_start]
+    if recent.empty:
+        periods = kept
+    else:
+        periods = pd.concat([kept, period_metrics(recent, cfg)], ignore_index=True)
+
+    # Fill in any empty periods between the kept and recomputed parts
+    all_periods = pd.period_range(
+        periods["startdate"].min(), periods["startdate"].max(), freq=freq
+    )
+    periods = (
+        periods.set_index("startdate")
+        .reindex(all_periods.start_time)
+        .rename_axis("startdate")
+        .reset_index()
     )
+    periods["enddate"] = all_periods.end_time.normalize()
+    if "cycletime_error" in periods:
+        periods["cycletime_error"] = cfg["relative_error"]
+    return periods
 
-    return result[
-        ["startdate", "enddate", "cycletime_p50", "cycletime_p85", "throughput"]
-    ]
 
+def state_fingerprint(file_path, cfg):
+    # Anything which changes the results of a run invalidates the state
+    return {
+        "input_csv_file": os.path.abspath(file_path),
+        "board": [
+            sorted(status.upper() for status in cfg.get(group, []))
+            for group in ["todo_names", "wip_names", "done_names", "ignore_names"]
+        ],
+        "timezone": cfg["timezone"],
+        "windows": list(cfg["windows"]),
+        "percentiles": list(cfg["percentiles"]),
+        "period": cfg.get("period", "week"),
+        "week_start": cfg.get("week_start", "MON"),
+        "relative_error": cfg.get("relative_error"),
+    }
 
-def print_weekly_metrics(dataframe_in):
-    print(dataframe_in.to_string(index=False))
 
+def update_metrics(state, transitions, cfg, profiler=None):
+    """Fold new transitions into the metrics of an earlier update.
 
-def print_ticket_metrics(dataframe_in):
-    print(dataframe_in.sort_values(by="timestamp_end").to_string(index=False))
+    `state` holds the per-ticket timestamps and both metrics tables from
+    the last update, or is None to start from scratch. `transitions`
+    are chunks of parsed transitions, which may repeat ones already
+    seen. Only the metrics the new transitions can affect are
+    recomputed. Each step is run through `profiler`, if given. Returns
+    the new state.
+    """
+    profiler = profiler or NullProfiler()
+    new_tickets = profiler.run(
+        "reduce_transitions", reduce_transitions, transitions, cfg
+    )
 
+    if state is None:
+        tickets = new_tickets
+        ticket_metrics = profiler.run(
+            "compute_metrics_per_ticket",
+            lambda: compute_metrics_per_ticket(
+                calculate_cycletime(started_tickets(tickets)),
+                cfg["windows"],
+                cfg["percentiles"],
+            ).reset_index(drop=True),
+        )
+        periodic_metrics = profiler.run(
+            "compute_metrics_per_period", period_metrics, ticket_metrics, cfg
+        )
+    else:
+        tickets = profiler.run(
+            "combine_ticket_timestamps",
+            combine_ticket_timestamps,
+            [state["tickets"], new_tickets],
+        )
+        since = changed_since(state["tickets"], tickets.loc[new_tickets.index])
+        ticket_metrics = state["ticket_metrics"]
+        periodic_metrics = state["periodic_metrics"]
+        if since is not None:
+            ticket_metrics = profiler.run(
+                "update_ticket_metrics",
+                update_ticket_metrics,
+                ticket_metrics,
+                tickets,
+                since,
+                cfg,
+            )
+            periodic_metrics = profiler.run(
+                "update_period_metrics",
+                update_period_metrics,
+                periodic_metrics,
+                ticket_metrics,
+                since,
+                cfg,
+            )
+
+    return {
+        "tickets": tickets,
+        "ticket_metrics": ticket_metrics,
+        "periodic_metrics": periodic_metrics,
+    }
 
-def print_help():
-    print("leanStats.py - get lean metrics from jira csv")
 
+def read_appended_transitions(data, cfg, names=None):
+    # Parse lines returned by read_appended_lines into chunks of
+    # transitions. Reads which start mid file have no header line, so
+    # they need the `names` from the first one. Returns (chunks, header).
+    chunksize = cfg.get("chunk_size") or None
+    if not data:
+        return [], names
+    transitions = read_transitions(io.BytesIO(data), cfg, chunksize, names=names)
+    if chunksize is None:
+        transitions = [transitions]
+    header = names or list(pd.read_csv(io.BytesIO(data), nrows=0).columns)
+    return transitions, header
 
-def main():
-    parser = argparse.ArgumentParser(description="calculate lean metrics")
-    parser.add_argument(
-        "-c",
-        "--config-file",
-        help="Path to config file. Overrides all other commandline params if specified.",
-        type=str,
-        required=True,
+
+def compute_metrics_incrementally(file_path, cfg, state_file, profiler=None):
+    """Compute per-ticket and periodic metrics, reusing the previous run.
+
+    Exports are expected to only grow at the end. The state file holds
+    how far into the input file we have read, the per-ticket timestamps
+    and the metrics from the last run; only the lines appended since
+    are read, and only the metrics they can affect are recomputed. If
+    the input was rewritten, or the config changed, everything is
+    recomputed from scratch. Each step is run through `profiler`, if
+    given.
+    """
+    profiler = profiler or NullProfiler()
+    fingerprint = state_fingerprint(file_path, cfg)
+    state = profiler.run("load_state", load_state, state_file, fingerprint)
+    appended = None
+    if state is not None:
+        appended = profiler.run(
+            "read_appended_lines",
+            read_appended_lines,
+            file_path,
+            state["offset"],
+            state["checksum"],
+        )
+    if appended is None:
+        state = None
+        appended = profiler.run("read_appended_lines", read_appended_lines, file_path)
+    data, offset, checksum = appended
+
+    transitions, header = profiler.run(
+        "read_appended_transitions",
+        read_appended_transitions,
+        data,
+        cfg,
+        None if state is None else state["header"],
     )
-    args = parser.parse_args()
-
-    if not os.path.isfile(args.config_file):
-        print(f"The file '{args.config_file}' does not exist or is not readable.")
-        sys.exit(1)
-    config = configparser.ConfigParser()
-    config.read(args.config_file)
-
-    file_path = config.get("SYSTEM", "input_csv_file", fallback=None)
-    cfg = {
-        "todo_names": re.split(
-            r"\s*,\s*",
-            config.get("BOARD", "TODO", fallback="Todo"),
-        ),
-        "wip_names": re.split(
-            r"\s*,\s*",
-            config.get("BOARD", "WIP", fallback="Doing"),
-        ),
-        "done_names": re.split(
-            r"\s*,\s*",
-            config.get("BOARD", "DONE", fallback="Done"),
-        ),
-        "ignore_names": re.split(
-            r"\s*,\s*",
-            config.get("BOARD", "IGNORE", fallback=""),
+    state = update_metrics(state, transitions, cfg, profiler)
+
+    profiler.run(
+        "save_state",
+        save_state,
+        state_file,
+        dict(
+            state,
+            fingerprint=fingerprint,
+            offset=offset,
+            checksum=checksum,
+            header=header,
         ),
-    }
+    )
+    return state["ticket_metrics"], state["periodic_metrics"]
 
-    # Sanity checks
-    if not os.path.isfile(file_path):
-        print(f"The file '{file_path}' does not exist or is not readable.")
-        sys.exit(1)
 
-    # read in data and calculate cycletime
-    def custom_date_parser(date_str):
-        # First, try parsing the sane format
-        try:
-            return datetime.datetime.fromisoformat(date_str)
-        except ValueError:
-            # If unsuccessful, try freedom format
-            return datetime.datetime.strptime(date_str, "%d/%m/%Y %H:%M:%S")
+class TransitionsTail:
+    """Polls a file for transitions appended to it since the last poll."""
 
-    data = pd.read_csv(file_path, dtype={"changed_at": str})
-    data["changed_at"] = data["changed_at"].apply(custom_date_parser)
+    def __init__(self, file_path, cfg):
+        self.file_path = file_path
+        self.cfg = cfg
+        self.offset = None
+        self.checksum = None
+        self.header = None
 
-    dataframe = None
-    try:
-        dataframe = extract_ticket_timestamps(data, cfg)
-    except Exception as e:
-        print(f"Error: {e}")
-        sys.exit(1)
+    def poll(self):
+        # Returns (chunks, restart). After the first poll, or if the file
+        # was rewritten, restart is True and the chunks are all of it.
+        appended = None
+        if self.offset is not None:
+            appended = read_appended_lines(self.file_path, self.offset, self.checksum)
+        restart = appended is None
+        if restart:
+            self.header = None
+            appended = read_appended_lines(self.file_path)
+        data, self.offset, self.checksum = appended
+        transitions, self.header = read_appended_transitions(
+            data, self.cfg, self.header
+        )
+        return transitions, restart
 
-    dataframe = calculate_cycletime(dataframe)
 
-    # get per-ticket metrics
-    dataframe = compute_metrics_per_ticket(dataframe)
-    print_ticket_metrics(dataframe)
+def fetched_transitions(dataframe, cfg):
+    # Transitions fetched by jira_link, in the dtypes read_transitions
+    # gives
+    return (
+        dataframe[INPUT_COLUMNS]
+        .astype({"ticket_id": "category", "to_status": "category"})
+        .assign(
+            changed_at=parse_timestamps(
+                dataframe["changed_at"].astype(str), cfg.get("timezone", "UTC")
+            )
+        )
+    )
 
-    # get metrics grouped by week
-    weekly_df = compute_metrics_per_week(dataframe)
-    print_weekly_metrics(weekly_df)
+
+def watch_metrics(poll, cfg, server, interval, polls=None):
+    """Keep the metrics up to date in memory, and publish them on server.
+
+    `poll` returns the transitions which arrived since it was last
+    called, as chunks, and whether they replace everything seen so
+    far. The metrics are only updated when something arrived, and
+    errors are reported while the last good metrics stay published.
+    Runs until interrupted, or for `polls` polls.
+    """
+    state = None
+    count = 0
+    while polls is None or count < polls:
+        if count:
+            time.sleep(interval)
+        count += 1
+        try:
+            transitions, restart = poll()
+            if restart or state is None or transitions:
+                state = update_metrics(None if restart else state, transitions, cfg)
+                server.publish(state["ticket_metrics"], state["periodic_metrics"])
+        except Exception as e:
+            print(f"Error: {e}", file=sys.stderr)
+
+
+def output_metrics(profiler, table, dataframe, cfg):
+    # Write the "tickets" or "periods" table in the output format, to
+    # <output>.<table>.<extension> or stdout. Ticket metrics are
+    # already in timestamp_end order.
+    output_format = cfg.get("output_format", "table")
+    path = output_path(cfg.get("output"), table, output_format)
+    if table == "periods" and path is None and output_format == "csv":
+        # Keep the two tables apart on stdout
+        sys.stdout.write("\n")
+    profiler.run(f"write_{table}", write_metrics, dataframe, output_format, path)
 
 
 if __name__ == "__main__":
-    main()
+    # The command line lives in stats_cli; this keeps the old way of
+    # running leanStats working
+    from stats_cli import main
+
+    sys.exit(main())
@@ -0,0 +1,100 @@
+import importlib.util
+import sys
+
+OUTPUT_FORMATS = ["table", "csv", "jsonl", "parquet"]
+OUTPUT_EXTENSIONS = {
+    "table": "txt",
+    "csv": "csv",
+    "jsonl": "jsonl",
+    "parquet": "parquet",
+}
+
+# Rows converted and written at a time, to bound the memory the text
+# of a large report takes
+OUTPUT_CHUNK_ROWS = 100_000
+
+CSV_TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def row_chunks(dataframe, chunk_rows):
+    for start in range(0, len(dataframe), chunk_rows):
+        yield start, dataframe.iloc[start : start + chunk_rows]
+
+
+def write_table(dataframe, out, chunk_rows):
+    # Fixed-width text for people to read; the column widths depend on
+    # every row, so this one is not chunked
+    out.write(dataframe.to_string(index=False) + "\n")
+
+
+def write_csv(dataframe, out, chunk_rows):
+    # A fixed timestamp format, or pandas would leave out the time in
+    # chunks where it is always midnight
+    if dataframe.empty:
+        dataframe.to_csv(out, index=False)
+    for start, chunk in row_chunks(dataframe, chunk_rows):
+        chunk.to_csv(
+            out, header=start == 0, index=False, date_format=CSV_TIMESTAMP_FORMAT
+        )
+
+
+def write_jsonl(dataframe, out, chunk_rows):
+    # One object per row, with null for missing values and ISO 8601
+    # timestamps
+    for _, chunk in row_chunks(dataframe, chunk_rows):
+        out.write(
+            chunk.to_json(
+                orient="records", lines=True, date_format="iso", date_unit="s"
+            )
+        )
+
+
+def write_parquet(dataframe, path, chunk_rows):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.Schema.from_pandas(dataframe, preserve_index=False)
+    with pq.ParquetWriter(path, schema) as writer:
+        for _, chunk in row_chunks(dataframe, chunk_rows):
+            writer.write_table(
+                pa.Table.from_pandas(chunk, schema=schema, preserve_index=False)
+            )
+
+
+WRITERS = {"table": write_table, "csv": write_csv, "jsonl": write_jsonl}
+
+
+def check_output_format(output_format, prefix=None):
+    # Fail before any work is done, rather than after
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(
+            f"Output format must be one of {', '.join(OUTPUT_FORMATS)}: '{output_format}'"
+        )
+    if output_format == "parquet":
+        if not prefix:
+            raise ValueError("Parquet output needs an output file prefix (--output)")
+        if importlib.util.find_spec("pyarrow") is None:
+            raise ValueError("Parquet output needs pyarrow: pip install pyarrow")
+
+
+def output_path(prefix, table, output_format):
+    # <prefix>.<table>.<extension>, or None for stdout
+    if not prefix:
+        return None
+    return f"{prefix}.{table}.{OUTPUT_EXTENSIONS[output_format]}"
+
+
+def write_metrics(dataframe, output_format="table", path=None, chunk_rows=None):
+    """Write a metrics table to path, or to stdout.
+
+    Rows are converted and written in chunks of chunk_rows, except for
+    the table format.
+    """
+    chunk_rows = chunk_rows or OUTPUT_CHUNK_ROWS
+    if output_format == "parquet":
+        write_parquet(dataframe, path, chunk_rows)
+    elif path is None:
+        WRITERS[output_format](dataframe, sys.stdout, chunk_rows)
+    else:
+        with open(path, "w", newline="") as out:
+            WRITERS[output_format](dataframe, out, chunk_rows)
@@ -0,0 +1,132 @@
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pandas as pd
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Columns of the ticket table which are not rolling metrics
+TICKET_COLUMNS = ["ticket_id", "timestamp_start", "timestamp_end", "cycletime"]
+
+
+def metric_name(column):
+    # Prometheus names only allow letters, digits and underscores
+    return "leanstats_" + re.sub(r"[^a-zA-Z0-9_]", "_", column)
+
+
+def current_metrics(ticket_metrics, periodic_metrics):
+    # The rolling metrics as of the last finished ticket, and the
+    # metrics of the last period, with None where there are none
+    finished = ticket_metrics[ticket_metrics["timestamp_end"].notna()]
+    current = {
+        "tickets_finished": len(finished),
+        "tickets_in_progress": len(ticket_metrics) - len(finished),
+    }
+    for column in ticket_metrics.columns:
+        if column not in TICKET_COLUMNS:
+            current[column] = finished[column].iloc[-1] if len(finished) else None
+    for column in periodic_metrics.columns:
+        if column.startswith("cycletime_p") or column == "throughput":
+            current[f"period_{column}"] = (
+                periodic_metrics[column].iloc[-1] if len(periodic_metrics) else None
+            )
+    return {
+        column: None if pd.isna(value) else int(value)
+        for column, value in current.items()
+    }
+
+
+def prometheus_text(ticket_metrics, periodic_metrics, updated_at):
+    current = dict(
+        current_metrics(ticket_metrics, periodic_metrics),
+        last_update_timestamp_seconds=updated_at,
+    )
+    lines = []
+    for column, value in current.items():
+        name = metric_name(column)
+        value = "NaN" if value is None else value
+        lines += [f"# TYPE {name} gauge", f"{name} {value}"]
+    return "\n".join(lines) + "\n"
+
+
+def json_text(ticket_metrics, periodic_metrics, updated_at):
+    periods = periodic_metrics.to_json(
+        orient="records", date_format="iso", date_unit="s"
+    )
+    return json.dumps(
+        {
+            "updated_at": updated_at,
+            "current": current_metrics(ticket_metrics, periodic_metrics),
+            "periods": json.loads(periods),
+        }
+    )
+
+
+class MetricsServer(ThreadingHTTPServer):
+    """Serves the latest metrics over HTTP.
+
+    /metrics has the current rolling and periodic metrics in the
+    Prometheus text format, and /metrics.json has them as JSON along
+    with every period. Both are rendered once per publish(), so
+    requests are answered straight from memory.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, host="127.0.0.1", port=0):
+        super().__init__((host, port), MetricsHandler)
+        self.lock = threading.Lock()
+        self.bodies = {}
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return self
+
+    def publish(self, ticket_metrics, periodic_metrics):
+        updated_at = time.time()
+        bodies = {
+            "/metrics": (
+                PROMETHEUS_CONTENT_TYPE,
+                prometheus_text(ticket_metrics, periodic_metrics, updated_at),
+            ),
+            "/metrics.json": (
+                "application/json",
+                json_text(ticket_metrics, periodic_metrics, updated_at),
+            ),
+        }
+        with self.lock:
+            self.bodies = {
+                path: (content_type, body.encode())
+                for path, (content_type, body) in bodies.items()
+            }
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        with self.server.lock:
+            bodies = self.server.bodies
+        if self.path not in ("/metrics", "/metrics.json"):
+            self.send_body(404, "text/plain", b"Not found\n")
+        elif not bodies:
+            self.send_body(503, "text/plain", b"No metrics yet\n")
+        else:
+            self.send_body(200, *bodies[self.path])
+
+    def send_body(self, status, content_type, body):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
@@ -0,0 +1,124 @@
+import hashlib
+import json
+import os
+import shutil
+import uuid
+
+import numpy as np
+import pandas as pd
+
+# Bump this whenever the layout of a cache entry changes
+CACHE_VERSION = 1
+
+# Columns stored as category codes plus a small table of categories
+CATEGORY_COLUMNS = ["ticket_id", "to_status"]
+TIMESTAMP_COLUMN = "changed_at"
+
+
+def file_digest(file_path):
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def cache_key(file_path, cfg, hash_content=False):
+    """Key for the parsed contents of file_path under the config cfg.
+
+    The input is identified by its path, size and mtime, or by a hash
+    of its contents if hash_content is set. The board and timezone are
+    part of the key too, since they decide how the file is read.
+    """
+    stat = os.stat(file_path)
+    identity = {
+        "version": CACHE_VERSION,
+        "path": os.path.abspath(file_path),
+        "size": stat.st_size,
+        "board": [
+            cfg.get(group, [])
+            for group in ["todo_names", "wip_names", "done_names", "ignore_names"]
+        ],
+        "timezone": cfg.get("timezone", "UTC"),
+    }
+    if hash_content:
+        identity["sha256"] = file_digest(file_path)
+    else:
+        identity["mtime_ns"] = stat.st_mtime_ns
+    return hashlib.sha256(json.dumps(identity).encode()).hexdigest()
+
+
+def load_transitions(cache_dir, key):
+    # Returns the cached transitions, or None on a cache miss
+    entry = os.path.join(cache_dir, key)
+    if not os.path.isdir(entry):
+        return None
+
+    try:
+        columns = {}
+        for column in CATEGORY_COLUMNS:
+            codes = np.load(os.path.join(entry, f"{column}.codes.npy"), mmap_mode="r")
+            categories = np.load(os.path.join(entry, f"{column}.categories.npy"))
+            columns[column] = pd.Categorical.from_codes(codes, categories)
+        columns[TIMESTAMP_COLUMN] = np.load(
+            os.path.join(entry, f"{TIMESTAMP_COLUMN}.npy"), mmap_mode="r"
+        )
+    except (OSError, ValueError):
+        return None
+
+    # Mark the entry as recently used
+    os.utime(entry)
+    return pd.DataFrame(columns)
+
+
+def store_transitions(cache_dir, key, dataframe, max_bytes=None):
+    # Write the entry under a temporary name and rename it into place,
+    # so readers never see a half written entry.
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_entry = os.path.join(cache_dir, f".{key}.{uuid.uuid4().hex}.tmp")
+    os.makedirs(tmp_entry)
+    for column in CATEGORY_COLUMNS:
+        values = dataframe[column]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            codes, categories = values.cat.codes.to_numpy(), values.cat.categories
+        else:
+            codes, categories = pd.factorize(values)
+        np.save(os.path.join(tmp_entry, f"{column}.codes.npy"), codes)
+        np.save(
+            os.path.join(tmp_entry, f"{column}.categories.npy"),
+            np.asarray(categories, dtype=str),
+        )
+    np.save(
+        os.path.join(tmp_entry, f"{TIMESTAMP_COLUMN}.npy"),
+        dataframe[TIMESTAMP_COLUMN].to_numpy(),
+    )
+
+    entry = os.path.join(cache_dir, key)
+    try:
+        os.rename(tmp_entry, entry)
+    except OSError:
+        # Another run stored the same entry first
+        shutil.rmtree(tmp_entry, ignore_errors=True)
+
+    if max_bytes is not None:
+        evict(cache_dir, max_bytes)
+
+
+def entry_size(entry):
+    return sum(os.path.getsize(os.path.join(entry, name)) for name in os.listdir(entry))
+
+
+def evict(cache_dir, max_bytes):
+    # Remove the least recently used entries until the cache fits
+    entries = [
+        os.path.join(cache_dir, name)
+        for name in os.listdir(cache_dir)
+        if not name.startswith(".")
+    ]
+    entries.sort(key=os.path.getmtime, reverse=True)
+
+    total = 0
+    for entry in entries:
+        total += entry_size(entry)
+        if total > max_bytes:
+            shutil.rmtree(entry, ignore_errors=True)
@@ -0,0 +1,139 @@
+import numpy as np
+
+
+def sketch_gamma(relative_error):
+    if not 0 < relative_error < 1:
+        raise ValueError(f"Relative error must be between 0 and 1: '{relative_error}'")
+    return (1 + relative_error) / (1 - relative_error)
+
+
+def sketch_keys(values, gamma):
+    # Bucket key of each value, in the same order as the values: 0 for
+    # values between -1 and 1, otherwise +/-(ceil(log_gamma |v|) + 1).
+    # The values must not be NaN.
+    values = np.asarray(values, dtype=float)
+    magnitude = np.abs(values)
+    keys = np.zeros(len(values), dtype=np.int64)
+    large = magnitude >= 1
+    keys[large] = np.ceil(np.log(magnitude[large]) / np.log(gamma)) + 1
+    return np.where(values < 0, -keys, keys)
+
+
+def key_values(keys, gamma):
+    # A value within the relative error of everything in each bucket
+    keys = np.asarray(keys)
+    magnitude = 2 * gamma ** (np.abs(keys) - 1.0) / (gamma + 1)
+    return np.where(keys == 0, 0.0, np.sign(keys) * magnitude)
+
+
+def grouped_counts(groups, values, n_groups, gamma):
+    """Bucket counts of the values in each group, in one pass.
+
+    Returns (counts, offset), where counts[g, i] is the number of
+    values in group g with key offset + i.
+    """
+    keys = sketch_keys(values, gamma)
+    if len(keys) == 0:
+        return np.zeros((n_groups, 0), dtype=np.int64), 0
+    offset = keys.min()
+    width = keys.max() - offset + 1
+    counts = np.bincount(
+        np.asarray(groups) * width + (keys - offset), minlength=n_groups * width
+    )
+    return counts.reshape(n_groups, width), offset
+
+
+def counts_quantiles(counts, quantiles, offset, gamma, whole_numbers=False):
+    """Quantiles of each row of a matrix of bucket counts.
+
+    Like the exact quantiles pandas computes, these interpolate
+    linearly between the values at the ranks either side of q * (n - 1),
+    with each value read from its bucket to within the relative error.
+    With whole_numbers, the bucket values are rounded first, which
+    makes the quantiles of small whole numbers exact. Rows without any
+    values get NaN.
+    """
+    cumulative = np.cumsum(counts, axis=1)
+    total = cumulative[:, -1] if cumulative.shape[1] else np.zeros(len(counts))
+
+    def value_at(rank):
+        # Value of the rank-th smallest value (0-based) in each row
+        bucket = (cumulative <= rank[:, None]).sum(axis=1)
+        values = key_values(bucket + offset, gamma)
+        return np.round(values) if whole_numbers else values
+
+    result = np.full((len(counts), len(quantiles)), np.nan)
+    for column, quantile in enumerate(quantiles):
+        position = quantile * (total - 1)
+        below, above = value_at(np.floor(position)), value_at(np.ceil(position))
+        result[:, column] = below + (above - below) * (position - np.floor(position))
+    result[total == 0] = np.nan
+    return result
+
+
+class QuantileSketch:
+    """Mergeable quantile sketch with a relative error bound.
+
+    Values are counted in logarithmically sized buckets (as in
+    DDSketch), so any quantile is answered within `relative_error` of
+    the true value, using memory that grows with the log of the range
+    of the values rather than with their number. Sketches with the
+    same error bound merge by adding up their counts, so sketches of
+    days or teams can be combined into weeks or departments without
+    going back to the data. Values between -1 and 1 are counted as 0,
+    which suits cycletimes in whole days.
+    """
+
+    def __init__(self, relative_error=0.01):
+        self.relative_error = relative_error
+        self.gamma = sketch_gamma(relative_error)
+        self.offset = 0
+        self.counts = np.zeros(0, dtype=np.int64)
+
+    @classmethod
+    def from_counts(cls, counts, offset, relative_error):
+        sketch = cls(relative_error)
+        sketch.add_counts(counts, offset)
+        return sketch
+
+    @property
+    def count(self):
+        return int(self.counts.sum())
+
+    def add(self, values):
+        values = np.asarray(values, dtype=float).ravel()
+        counts, offset = grouped_counts(
+            np.zeros(len(values), dtype=np.int64),
+            values[~np.isnan(values)],
+            1,
+            self.gamma,
+        )
+        return self.add_counts(counts[0], offset)
+
+    def merge(self, other):
+        if other.gamma != self.gamma:
+            raise ValueError("Sketches with different error bounds can not be merged")
+        return self.add_counts(other.counts, other.offset)
+
+    def add_counts(self, counts, offset):
+        # Add bucket counts starting at key `offset`, growing the range
+        # of keys we hold if needed
+        if len(counts) == 0:
+            return self
+        if len(self.counts) == 0:
+            self.offset, self.counts = offset, np.array(counts, dtype=np.int64)
+            return self
+        start = min(self.offset, offset)
+        stop = max(self.offset + len(self.counts), offset + len(counts))
+        merged = np.zeros(stop - start, dtype=np.int64)
+        merged[
+            self.offset - start : self.offset - start + len(self.counts)
+        ] += self.counts
+        merged[offset - start : offset - start + len(counts)] += counts
+        self.offset, self.counts = start, merged
+        return self
+
+    def quantile(self, quantile):
+        return counts_quantiles(
+            self.counts[None, :], [quantile], self.offset, self.gamma
+        )[0, 0]
@@ -0,0 +1,137 @@
+import cProfile
+import json
+import resource
+import sys
+import time
+import tracemalloc
+
+PROFILE_FORMATS = ["table", "json"]
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux (bytes on macOS, close enough
+    # to tell which stage the memory went to)
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def row_count(result):
+    # Rows of a stage's result, if it is a table or an array. Tuples
+    # of tables and the like have a length, but not in rows.
+    shape = getattr(result, "shape", None)
+    return shape[0] if shape else None
+
+
+def footprint_mb(result):
+    # Memory held by a stage's result, if it is a table or an array
+    if hasattr(result, "memory_usage"):
+        import numpy as np
+
+        return float(np.sum(result.memory_usage(deep=True))) / 2**20
+    if hasattr(result, "nbytes"):
+        return result.nbytes / 2**20
+    return None
+
+
+class NullProfiler:
+    """Stands in for StageProfiler when profiling is off."""
+
+    def run(self, name, function, *args, **kwargs):
+        return function(*args, **kwargs)
+
+    def report(self, out=None):
+        pass
+
+    def close(self):
+        pass
+
+
+class StageProfiler:
+    """Records wall time, CPU time, rows and memory per pipeline stage.
+
+    Memory is the size of each stage's result (for tables and arrays)
+    and the process' peak RSS after the stage. With a dump
+    prefix, the whole run is also profiled with cProfile and
+    tracemalloc: the peak traced memory of each stage is recorded too,
+    and close() writes <prefix>.prof (for pstats or snakeviz) and
+    <prefix>.tracemalloc (a tracemalloc snapshot).
+    """
+
+    def __init__(self, output_format="table", dump_prefix=None):
+        self.output_format = output_format
+        self.dump_prefix = dump_prefix
+        self.stages = []
+        self.profile = None
+        if dump_prefix:
+            tracemalloc.start()
+            self.profile = cProfile.Profile()
+            self.profile.enable()
+
+    def run(self, name, function, *args, **kwargs):
+        # Call function(*args, **kwargs) as the stage `name`
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.reset_peak()
+            traced_before = tracemalloc.get_traced_memory()[0]
+        wall_started = time.perf_counter()
+        cpu_started = time.process_time()
+
+        result = function(*args, **kwargs)
+
+        stage = {
+            "stage": name,
+            "wall_s": time.perf_counter() - wall_started,
+            "cpu_s": time.process_time() - cpu_started,
+            "rows": row_count(result),
+            "size_mb": footprint_mb(result),
+            "peak_rss_mb": peak_rss_mb(),
+        }
+        if tracing:
+            peak = tracemalloc.get_traced_memory()[1]
+            stage["traced_peak_mb"] = (peak - traced_before) / 2**20
+        self.stages.append(stage)
+        return result
+
+    def report(self, out=None):
+        # The profile goes to stderr, to keep it apart from the metrics
+        out = out or sys.stderr
+        if self.output_format == "json":
+            for stage in self.stages:
+                out.write(json.dumps(stage) + "\n")
+            return
+
+        traced = any("traced_peak_mb" in stage for stage in self.stages)
+        header = (
+            f"{'stage':<28} {'wall s':>8} {'cpu s':>8} {'rows':>10} "
+            f"{'size MB':>8} {'peak RSS MB':>12}"
+        )
+        out.write(header + (f" {'traced MB':>10}" if traced else "") + "\n")
+        for stage in self.stages:
+            rows = "" if stage["rows"] is None else stage["rows"]
+            size = "" if stage["size_mb"] is None else f"{stage['size_mb']:.1f}"
+            line = (
+                f"{stage['stage']:<28} {stage['wall_s']:>8.3f} {stage['cpu_s']:>8.3f} "
+                f"{rows:>10} {size:>8} {stage['peak_rss_mb']:>12.1f}"
+            )
+            if traced:
+                line += f" {stage.get('traced_peak_mb', float('nan')):>10.1f}"
+            out.write(line + "\n")
+        total_wall = sum(stage["wall_s"] for stage in self.stages)
+        total_cpu = sum(stage["cpu_s"] for stage in self.stages)
+        out.write(f"{'total':<28} {total_wall:>8.3f} {total_cpu:>8.3f}\n")
+
+    def close(self):
+        if not self.profile:
+            return
+        self.profile.disable()
+        self.profile.dump_stats(f"{self.dump_prefix}.prof")
+        tracemalloc.take_snapshot().dump(f"{self.dump_prefix}.tracemalloc")
+        tracemalloc.stop()
+        self.profile = None
+
+
+def make_profiler(output_format=None, dump_prefix=None):
+    # A real profiler only when asked for one, so a normal run does not
+    # pay for the bookkeeping
+    if not output_format and not dump_prefix:
+        return NullProfiler()
+    return StageProfiler(output_format or "table", dump_prefix)
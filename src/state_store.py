@@ -0,0 +1,68 @@
+import hashlib
+import os
+import pickle
+
+# Bump this whenever the layout of the saved state changes, so old
+# state files are ignored rather than misread.
+STATE_VERSION = 2
+
+# Number of bytes before the saved offset which are checksummed, to
+# detect that the input file was rewritten rather than appended to.
+CHECKSUM_BYTES = 4096
+
+
+def load_state(state_file, fingerprint):
+    # Returns the saved state, or None if there is none we can use
+    if not os.path.isfile(state_file):
+        return None
+    try:
+        with open(state_file, "rb") as f:
+            state = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError):
+        return None
+
+    if state.get("version") != STATE_VERSION:
+        return None
+    if state.get("fingerprint") != fingerprint:
+        return None
+    return state
+
+
+def save_state(state_file, state):
+    # Write to a temporary file first, so an interrupted run never
+    # leaves a half written state file behind.
+    state = dict(state, version=STATE_VERSION)
+    tmp_file = f"{state_file}.tmp"
+    with open(tmp_file, "wb") as f:
+        pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_file, state_file)
+
+
+def tail_checksum(f, offset):
+    start = max(0, offset - CHECKSUM_BYTES)
+    f.seek(start)
+    return hashlib.sha256(f.read(offset - start)).hexdigest()
+
+
+def read_appended_lines(file_path, offset=0, checksum=None):
+    """Read the complete lines appended to a file since `offset`.
+
+    Returns (data, offset, checksum) where `offset` and `checksum`
+    describe the new end of the data read, to be passed in on the next
+    call. Returns None if the file no longer starts with the data read
+    last time, i.e. it was truncated or rewritten.
+    """
+    with open(file_path, "rb") as f:
+        size = f.seek(0, os.SEEK_END)
+        if size < offset:
+            return None
+        if checksum is not None and tail_checksum(f, offset) != checksum:
+            return None
+
+        f.seek(offset)
+        data = f.read()
+
+        # Leave any partially written last line for the next run
+        data = data[: data.rfind(b"\n") + 1]
+        offset += len(data)
+        return data, offset, tail_checksum(f, offset)
@@ -0,0 +1,379 @@
+#!/usr/bin/env python3
+
+import argparse
+import configparser
+import os
+import re
+import sys
+
+from metrics_output import OUTPUT_FORMATS
+from stage_profile import PROFILE_FORMATS
+from stats_common import input_files
+from stats_config import WATCH_SOURCES, parse_date, parse_interval, read_config
+
+# The command line of leanStats. Only the standard library is imported
+# here, so --help and mistakes in the arguments or the config are
+# reported without waiting for pandas to load; main() imports the
+# metrics code once everything has been checked.
+
+
+def main():
+    parser = argparse.ArgumentParser(description="calculate lean metrics")
+    parser.add_argument(
+        "-c",
+        "--config-file",
+        help="Path to config file. The other options override its settings.",
+        type=str,
+        required=True,
+    )
+    parser.add_argument(
+        "-w",
+        "--windows",
+        help="Comma-separated lookback windows in days, e.g. 7,14,30,90.",
+        type=str,
+    )
+    parser.add_argument(
+        "-p",
+        "--percentiles",
+        help="Comma-separated cycletime percentiles, e.g. 50,70,85,95.",
+        type=str,
+    )
+    parser.add_argument(
+        "--chunk-size",
+        help="Read the input in chunks of this many rows, to bound memory use.",
+        type=str,
+    )
+    parser.add_argument(
+        "--cache-dir",
+        help="Cache parsed input in this directory, to speed up later runs.",
+        type=str,
+    )
+    parser.add_argument(
+        "--state-file",
+        help="Keep state between runs in this file, and only process new input.",
+        type=str,
+    )
+    parser.add_argument(
+        "--period",
+        help="Period to compute cycletime percentiles and throughput over: day, week, month or quarter.",
+        type=str,
+    )
+    parser.add_argument(
+        "--week-start",
+        help="Day weeks start on, e.g. monday or sunday.",
+        type=str,
+    )
+    parser.add_argument(
+        "--output-format",
+        help="Write the metrics as a table, csv, jsonl or parquet.",
+        type=str,
+        choices=OUTPUT_FORMATS,
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        help="Write the metrics to PREFIX.tickets.<format> and PREFIX.periods.<format> instead of stdout.",
+        type=str,
+        metavar="PREFIX",
+    )
+    parser.add_argument(
+        "--relative-error",
+        help="Approximate the periodic percentiles to within this fraction, e.g. 0.01 (0 is exact).",
+        type=str,
+    )
+    parser.add_argument(
+        "-g",
+        "--group-by",
+        help="Compute metrics separately for each value of this column, e.g. project_key.",
+        type=str,
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        help="Processes to read input files and compute groups in (0 is one per CPU).",
+        type=str,
+    )
+    parser.add_argument(
+        "--profile",
+        help="Report time, rows and memory per stage on stderr, as a table or JSON lines.",
+        nargs="?",
+        const="table",
+        choices=PROFILE_FORMATS,
+    )
+    parser.add_argument(
+        "--profile-dump",
+        help="Also profile with cProfile and tracemalloc, writing PREFIX.prof and PREFIX.tracemalloc.",
+        metavar="PREFIX",
+        type=str,
+    )
+    parser.add_argument(
+        "--watch",
+        help="Keep running, polling for new transitions every SECONDS (default 60), and serve the metrics over HTTP.",
+        nargs="?",
+        const="60",
+        metavar="SECONDS",
+        type=str,
+    )
+    parser.add_argument(
+        "--watch-source",
+        help="Poll the input file for appended rows (file), or Jira (jira).",
+        choices=WATCH_SOURCES,
+        type=str,
+    )
+    parser.add_argument(
+        "--port",
+        help="Port to serve the metrics on, with --watch.",
+        type=str,
+    )
+    parser.add_argument(
+        "--store",
+        help="Load the input into this SQLite transition store, and compute from there.",
+        type=str,
+    )
+    parser.add_argument(
+        "--since",
+        help="Only tickets finished on or after this date, e.g. 2024-01-01 (needs --store).",
+        type=str,
+    )
+    parser.add_argument(
+        "--until",
+        help="Only tickets finished before this date (needs --store).",
+        type=str,
+    )
+    parser.add_argument(
+        "--project",
+        help="Comma-separated project keys to compute metrics for (needs --store).",
+        type=str,
+    )
+    args = parser.parse_args()
+
+    if not os.path.isfile(args.config_file):
+        print(f"The file '{args.config_file}' does not exist or is not readable.")
+        sys.exit(1)
+    config = configparser.ConfigParser()
+    config.read(args.config_file)
+
+    file_path = config.get("SYSTEM", "input_csv_file", fallback=None)
+    try:
+        cfg = read_config(
+            config,
+            chunk_size=args.chunk_size,
+            windows=args.windows,
+            percentiles=args.percentiles,
+            cache_dir=args.cache_dir,
+            period=args.period,
+            week_start=args.week_start,
+            relative_error=args.relative_error,
+            group_by=args.group_by,
+            output_format=args.output_format,
+            output=args.output,
+            jobs=args.jobs,
+            watch_source=args.watch_source,
+            watch_port=args.port,
+            store=args.store,
+        )
+        cfg["watch_interval"] = args.watch and parse_interval(args.watch)
+        cfg["since"] = args.since and parse_date(args.since)
+        cfg["until"] = args.until and parse_date(args.until)
+        cfg["projects"] = args.project and re.split(r"\s*,\s*", args.project.strip())
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    # Sanity checks
+    watching_jira = cfg["watch_interval"] and cfg["watch_source"] == "jira"
+    file_paths = []
+    if not watching_jira:
+        try:
+            file_paths = input_files(file_path)
+        except ValueError as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+    if cfg["watch_interval"] and cfg["group_by"]:
+        print("Error: Grouping can not be combined with watching.")
+        sys.exit(1)
+    state_file = args.state_file or config.get("SYSTEM", "state_file", fallback=None)
+    if state_file and cfg["group_by"]:
+        print("Error: Grouping can not be combined with a state file.")
+        sys.exit(1)
+    if (cfg["since"] or cfg["until"] or cfg["projects"]) and not cfg["store"]:
+        print("Error: --since, --until and --project need a transition store.")
+        sys.exit(1)
+    if cfg["store"] and (cfg["group_by"] or state_file or cfg["watch_interval"]):
+        print(
+            "Error: A transition store can not be combined with grouping, "
+            "a state file or watching."
+        )
+        sys.exit(1)
+    # Appended rows can only be followed in a single file
+    if len(file_paths) > 1 and (state_file or cfg["watch_interval"]):
+        print("Error: A state file or watching needs a single input file.")
+        sys.exit(1)
+
+    # Everything is checked, so now it is worth loading pandas
+    from leanStats import (
+        TransitionsTail,
+        calculate_cycletime,
+        check_statuses_defined,
+        classify_statuses,
+        compute_metrics_by_group,
+        compute_metrics_incrementally,
+        compute_metrics_per_ticket,
+        fetched_transitions,
+        output_metrics,
+        period_metrics,
+        read_input_files,
+        rows_in_range,
+        started_tickets,
+        stream_ticket_timestamps,
+        ticket_timestamps,
+        watch_metrics,
+        whole_periods,
+    )
+    from metrics_server import MetricsServer
+    from stage_profile import make_profiler
+    from transition_store import store_ticket_timestamps
+
+    # Keep running, and serve the metrics as they change
+    if cfg["watch_interval"]:
+        if watching_jira:
+            from jira_link import JiraPoller, read_jira_config
+
+            poller = JiraPoller(read_jira_config(config))
+
+            def poll():
+                # Only what changed since the last poll, so never a restart
+                return [fetched_transitions(poller.poll(), cfg)], False
+
+        else:
+            poll = TransitionsTail(file_paths[0], cfg).poll
+        try:
+            server = MetricsServer(port=cfg["watch_port"]).start()
+        except OSError as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+        print(
+            f"Serving metrics on {server.url}/metrics and {server.url}/metrics.json",
+            file=sys.stderr,
+        )
+        try:
+            watch_metrics(poll, cfg, server, cfg["watch_interval"])
+        except KeyboardInterrupt:
+            server.shutdown()
+        return
+
+    profiler = make_profiler(args.profile, args.profile_dump)
+
+    # With a state file, only read what was appended since last run
+    if state_file:
+        try:
+            dataframe, periodic_df = compute_metrics_incrementally(
+                file_paths[0], cfg, state_file, profiler
+            )
+        except Exception as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+        output_metrics(profiler, "tickets", dataframe, cfg)
+        output_metrics(profiler, "periods", periodic_df, cfg)
+        profiler.close()
+        profiler.report()
+        return
+
+    # Metrics per group, all read from the input in one go
+    if cfg["group_by"]:
+        try:
+            data = profiler.run(
+                "read_transitions",
+                read_input_files,
+                file_paths,
+                cfg,
+                cfg["jobs"],
+                extra_columns=[cfg["group_by"]],
+            )
+            dataframe, periodic_df = compute_metrics_by_group(
+                data, cfg["group_by"], cfg, cfg["jobs"], profiler
+            )
+        except Exception as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+        output_metrics(profiler, "tickets", dataframe, cfg)
+        output_metrics(profiler, "periods", periodic_df, cfg)
+        profiler.close()
+        profiler.report()
+        return
+
+    # read in data and calculate cycletime
+    dataframe = None
+    try:
+        if cfg["store"]:
+            dataframe = profiler.run(
+                "store_ticket_timestamps",
+                store_ticket_timestamps,
+                cfg["store"],
+                file_paths,
+                cfg,
+            )
+        elif cfg["chunk_size"]:
+            dataframe = profiler.run(
+                "stream_ticket_timestamps",
+                stream_ticket_timestamps,
+                file_paths,
+                cfg,
+                cfg["chunk_size"],
+            )
+        else:
+            data = profiler.run(
+                "read_transitions", read_input_files, file_paths, cfg, cfg["jobs"]
+            )
+            # extract_ticket_timestamps, one step at a time
+            lanes = profiler.run(
+                "classify_statuses", classify_statuses, data["to_status"], cfg
+            )
+            profiler.run(
+                "check_statuses_defined", check_statuses_defined, data, cfg, lanes
+            )
+            dataframe = profiler.run(
+                "extract_ticket_timestamps",
+                lambda: started_tickets(ticket_timestamps(data, cfg, lanes)),
+            )
+    except Exception as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    dataframe = profiler.run("calculate_cycletime", calculate_cycletime, dataframe)
+
+    # get per-ticket metrics
+    dataframe = profiler.run(
+        "compute_metrics_per_ticket",
+        compute_metrics_per_ticket,
+        dataframe,
+        cfg["windows"],
+        cfg["percentiles"],
+    )
+    # Tickets finished before the date range were only read for the
+    # lookback windows of the ones in it
+    tickets_df = dataframe
+    if cfg["since"]:
+        tickets_df = profiler.run(
+            "rows_in_range", rows_in_range, dataframe, "timestamp_end", cfg["since"]
+        )
+    output_metrics(profiler, "tickets", tickets_df, cfg)
+
+    # get metrics grouped by day, week, month or quarter
+    periodic_df = profiler.run(
+        "compute_metrics_per_period", period_metrics, tickets_df, cfg
+    )
+    # Periods the date range starts or ends in the middle of would only
+    # count some of their tickets
+    if cfg["since"] or cfg["until"]:
+        periodic_df = profiler.run(
+            "whole_periods", whole_periods, periodic_df, cfg["since"], cfg["until"]
+        )
+    output_metrics(profiler, "periods", periodic_df, cfg)
+
+    profiler.close()
+    profiler.report()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,38 @@
+import glob
+import os
+import re
+
+# What the metrics code and its command line both need to know. Only
+# the standard library is imported here, so the command line can check
+# its arguments without loading pandas.
+
+# Periods the periodic metrics can be computed over, as pandas period
+# frequencies. Weeks also need the day they end on (see
+# period_frequency).
+PERIODS = {"day": "D", "week": "W", "month": "M", "quarter": "Q"}
+WEEKDAYS = ["MON", "TUE", "WED", "THU", "FRI", "SAT", "SUN"]
+
+# Lanes of the board, as the int8 codes classify_statuses maps each
+# transition to.
+LANES = ["TODO", "WIP", "DONE", "IGNORE", "UNKNOWN"]
+LANE_TODO, LANE_WIP, LANE_DONE, LANE_IGNORE, LANE_UNKNOWN = range(len(LANES))
+
+
+def input_files(path):
+    """The CSV files input_csv_file stands for, in name order.
+
+    A directory stands for the .csv files in it, and a pattern with
+    wildcards (** for any number of directories) for the files it
+    matches. Anything else is a single file.
+    """
+    if path and os.path.isdir(path):
+        files = glob.glob(os.path.join(glob.escape(path), "*.csv"))
+    elif path and re.search(r"[*?[]", path):
+        files = [f for f in glob.glob(path, recursive=True) if os.path.isfile(f)]
+    elif path and os.path.isfile(path):
+        return [path]
+    else:
+        raise ValueError(f"The file '{path}' does not exist or is not readable.")
+    if not files:
+        raise ValueError(f"No CSV files found for '{path}'")
+    return sorted(files)
@@ -0,0 +1,213 @@
+import calendar
+import datetime
+import os
+import re
+import zoneinfo
+
+from metrics_output import check_output_format
+from stats_common import PERIODS, WEEKDAYS
+
+# Reading and checking the settings in a config file. Only the
+# standard library is imported here, so the command line tools can
+# report mistakes in the config without waiting for pandas to load.
+
+# Where --watch gets new transitions from
+WATCH_SOURCES = ["file", "jira"]
+
+
+def parse_number_list(value, cast, name):
+    try:
+        numbers = [cast(item) for item in re.split(r"\s*,\s*", value.strip())]
+    except ValueError:
+        raise ValueError(f"{name} must be a comma-separated list of numbers: '{value}'")
+    return numbers
+
+
+def parse_windows(value):
+    windows = parse_number_list(value, int, "Lookback windows")
+    if any(window <= 0 for window in windows):
+        raise ValueError(
+            f"Lookback windows must be positive numbers of days: '{value}'"
+        )
+    if len(set(windows)) != len(windows):
+        raise ValueError(f"Lookback windows must not repeat: '{value}'")
+    return windows
+
+
+def parse_percentiles(value):
+    percentiles = parse_number_list(value, float, "Percentiles")
+    if any(not 0 < percentile <= 100 for percentile in percentiles):
+        raise ValueError(f"Percentiles must be between 0 and 100: '{value}'")
+    if len(set(percentiles)) != len(percentiles):
+        raise ValueError(f"Percentiles must not repeat: '{value}'")
+    return percentiles
+
+
+def parse_chunk_size(value):
+    chunk_size = parse_number_list(value, int, "Chunk size")
+    if len(chunk_size) != 1 or chunk_size[0] < 0:
+        raise ValueError(f"Chunk size must be a number of rows, or 0: '{value}'")
+    return chunk_size[0]
+
+
+def parse_cache_size(value):
+    size = parse_number_list(value, float, "Cache size")
+    if len(size) != 1 or size[0] < 0:
+        raise ValueError(f"Cache size must be a number of megabytes: '{value}'")
+    return int(size[0] * 1024 * 1024)
+
+
+def parse_period(value):
+    period = value.strip().lower()
+    if period not in PERIODS:
+        raise ValueError(f"Period must be one of {', '.join(PERIODS)}: '{value}'")
+    return period
+
+
+def parse_week_start(value):
+    # Monday, mon and MON are all fine
+    day = value.strip().lower()
+    for weekday, name in zip(WEEKDAYS, calendar.day_name):
+        if len(day) >= 3 and name.lower().startswith(day):
+            return weekday
+    raise ValueError(f"Week start must be a day of the week: '{value}'")
+
+
+def parse_relative_error(value):
+    error = parse_number_list(value, float, "Relative error")
+    if len(error) != 1 or not 0 <= error[0] < 1:
+        raise ValueError(f"Relative error must be between 0 and 1: '{value}'")
+    # 0 means exact percentiles
+    return error[0] or None
+
+
+def parse_interval(value):
+    interval = parse_number_list(value, float, "Interval")
+    if len(interval) != 1 or interval[0] <= 0:
+        raise ValueError(f"Interval must be a positive number of seconds: '{value}'")
+    return interval[0]
+
+
+def parse_port(value):
+    port = parse_number_list(value, int, "Port")
+    if len(port) != 1 or not 0 <= port[0] < 65536:
+        raise ValueError(f"Port must be a number between 0 and 65535: '{value}'")
+    return port[0]
+
+
+def parse_jobs(value):
+    jobs = parse_number_list(value, int, "Jobs")
+    if len(jobs) != 1 or jobs[0] < 0:
+        raise ValueError(f"Jobs must be a number of processes, or 0: '{value}'")
+    # 0 means one per CPU
+    return jobs[0] or os.cpu_count()
+
+
+def parse_date(value):
+    # A date, or a date and time, in ISO 8601: 2024-01-01, 2024-01-01T12:00
+    try:
+        datetime.datetime.fromisoformat(value.strip())
+    except ValueError:
+        raise ValueError(f"Dates must look like 2024-01-31: '{value}'")
+    return value.strip()
+
+
+def parse_timezone(value):
+    # Zone names like Europe/Stockholm are checked without pandas; only
+    # anything else (fixed offsets, say) is left to pandas to make sense of
+    try:
+        zoneinfo.ZoneInfo(value)
+        return value
+    except (ValueError, zoneinfo.ZoneInfoNotFoundError):
+        pass
+    import pandas as pd
+
+    try:
+        pd.Timestamp.now(tz=value)
+    except Exception:
+        raise ValueError(f"Unknown timezone: '{value}'")
+    return value
+
+
+def read_board_config(config):
+    # The status names of each lane, from the [BOARD] section
+    return {
+        "todo_names": re.split(
+            r"\s*,\s*",
+            config.get("BOARD", "TODO", fallback="Todo"),
+        ),
+        "wip_names": re.split(
+            r"\s*,\s*",
+            config.get("BOARD", "WIP", fallback="Doing"),
+        ),
+        "done_names": re.split(
+            r"\s*,\s*",
+            config.get("BOARD", "DONE", fallback="Done"),
+        ),
+        "ignore_names": re.split(
+            r"\s*,\s*",
+            config.get("BOARD", "IGNORE", fallback=""),
+        ),
+    }
+
+
+def read_config(config, **overrides):
+    """The settings of the metrics, from a ConfigParser.
+
+    Every setting is checked, and a ValueError raised for the first
+    which isn't valid. Values in `overrides` (raw strings, as given on
+    a command line) take the place of the ones in the config; None
+    keeps the config value.
+    """
+
+    def setting(name, section, option, fallback=None):
+        value = overrides.get(name)
+        return (
+            value
+            if value is not None
+            else config.get(section, option, fallback=fallback)
+        )
+
+    cfg = read_board_config(config)
+    cfg["timezone"] = parse_timezone(setting("timezone", "SYSTEM", "timezone", "UTC"))
+    cfg["chunk_size"] = parse_chunk_size(
+        setting("chunk_size", "SYSTEM", "chunk_size", "0")
+    )
+    cfg["windows"] = parse_windows(setting("windows", "METRICS", "WINDOWS", "7"))
+    cfg["percentiles"] = parse_percentiles(
+        setting("percentiles", "METRICS", "PERCENTILES", "50, 85")
+    )
+    cfg["cache_dir"] = setting("cache_dir", "SYSTEM", "cache_dir")
+    cfg["cache_size"] = parse_cache_size(
+        setting("cache_size", "SYSTEM", "cache_size_mb", "1024")
+    )
+    cfg["cache_hash_content"] = config.getboolean(
+        "SYSTEM", "cache_hash_content", fallback=False
+    )
+    cfg["period"] = parse_period(setting("period", "METRICS", "PERIOD", "week"))
+    cfg["week_start"] = parse_week_start(
+        setting("week_start", "METRICS", "WEEK_START", "monday")
+    )
+    cfg["relative_error"] = parse_relative_error(
+        setting("relative_error", "METRICS", "RELATIVE_ERROR", "0")
+    )
+    cfg["group_by"] = setting("group_by", "METRICS", "GROUP_BY")
+    cfg["output_format"] = (
+        setting("output_format", "SYSTEM", "output_format", "table").strip().lower()
+    )
+    cfg["output"] = setting("output", "SYSTEM", "output")
+    check_output_format(cfg["output_format"], cfg["output"])
+    cfg["jobs"] = parse_jobs(setting("jobs", "SYSTEM", "jobs", "0"))
+    cfg["watch_source"] = (
+        setting("watch_source", "SYSTEM", "watch_source", "file").strip().lower()
+    )
+    if cfg["watch_source"] not in WATCH_SOURCES:
+        raise ValueError(
+            f"Watch source must be one of {', '.join(WATCH_SOURCES)}: "
+            f"'{cfg['watch_source']}'"
+        )
+    cfg["watch_port"] = parse_port(
+        setting("watch_port", "SYSTEM", "watch_port", "9464")
+    )
+    cfg["store"] = setting("store", "SYSTEM", "transition_store")
+    return cfg
@@ -0,0 +1,279 @@
+import os
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+from leanStats import (
+    LANE_DONE,
+    LANE_WIP,
+    check_statuses_defined,
+    classify_statuses,
+    read_transitions,
+)
+
+# Timestamps are stored as nanoseconds since the epoch, in the
+# configured timezone, so they sort and compare as integers in SQL
+# and come back as datetime64[ns] without parsing. The primary key
+# doubles as the (ticket_id, changed_at) index and skips transitions
+# already in the store.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS transitions (
+    ticket_id   TEXT NOT NULL,
+    changed_at  INTEGER NOT NULL,
+    to_status   TEXT NOT NULL,
+    project_key TEXT,
+    PRIMARY KEY (ticket_id, changed_at, to_status)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS loaded_files (
+    path     TEXT PRIMARY KEY,
+    size     INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS settings (
+    name  TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+# Statuses are indexed along with the time, so "done since" is a
+# range scan, with or without a project
+INDEXES = {
+    "transitions_status": "transitions (to_status, changed_at)",
+    "transitions_project": "transitions (project_key, to_status, changed_at)",
+}
+
+
+# Rows of an input file parsed and inserted at a time, to keep memory
+# use down on large exports
+LOAD_CHUNK_ROWS = 100_000
+
+
+def create_indexes(connection):
+    for name, columns in INDEXES.items():
+        connection.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {columns}")
+
+
+def open_store(path, cfg):
+    """Open (or create) the store at path for the timezone in cfg.
+
+    Timestamps are stored in the timezone the store was created with,
+    so a store can't be read with another one.
+    """
+    connection = sqlite3.connect(path)
+    connection.executescript(SCHEMA)
+    create_indexes(connection)
+    timezone = cfg.get("timezone", "UTC")
+    with connection:
+        connection.execute(
+            "INSERT OR IGNORE INTO settings VALUES ('timezone', ?)", (timezone,)
+        )
+    (stored,) = connection.execute(
+        "SELECT value FROM settings WHERE name = 'timezone'"
+    ).fetchone()
+    if stored != timezone:
+        connection.close()
+        raise ValueError(
+            f"The transition store '{path}' is in timezone {stored}, not {timezone}"
+        )
+    return connection
+
+
+def add_transitions(connection, data):
+    # Transitions the store already has are skipped. Returns the number
+    # of new transitions.
+    data = data[data["changed_at"].notna()]
+    if "project_key" in data.columns:
+        projects = data["project_key"].astype(object)
+        projects = projects.where(projects.notna(), None).tolist()
+    else:
+        projects = [None] * len(data)
+    rows = zip(
+        data["ticket_id"].astype(str).tolist(),
+        data["changed_at"].to_numpy(dtype="datetime64[ns]").view(np.int64).tolist(),
+        data["to_status"].astype(str).tolist(),
+        projects,
+    )
+    with connection:
+        before = connection.total_changes
+        connection.executemany(
+            "INSERT OR IGNORE INTO transitions VALUES (?, ?, ?, ?)", rows
+        )
+        return connection.total_changes - before
+
+
+def load_files(connection, file_paths, cfg):
+    """Add the transitions of the files which are new or have changed.
+
+    Files are recognised by their path, size and modification time,
+    and read LOAD_CHUNK_ROWS rows at a time. Transitions are never
+    removed, so a store should be deleted and loaded again when an
+    export is rewritten rather than appended to. Returns the number of
+    new transitions.
+    """
+    changed = []
+    new_bytes = 0
+    for file_path in file_paths:
+        path = os.path.abspath(file_path)
+        stat = os.stat(path)
+        loaded = connection.execute(
+            "SELECT size, mtime_ns FROM loaded_files WHERE path = ?", (path,)
+        ).fetchone()
+        if loaded != (stat.st_size, stat.st_mtime_ns):
+            changed.append((path, stat))
+            new_bytes += stat.st_size - (loaded[0] if loaded else 0)
+    if not changed:
+        return 0
+
+    # Keeping the indexes up to date row by row takes a few times
+    # longer than building them from scratch, which pays off when at
+    # least as much is added as the store already has
+    (stored_bytes,) = connection.execute(
+        "SELECT COALESCE(SUM(size), 0) FROM loaded_files"
+    ).fetchone()
+    rebuild = new_bytes >= stored_bytes
+    if rebuild:
+        with connection:
+            for name in INDEXES:
+                connection.execute(f"DROP INDEX IF EXISTS {name}")
+    added = 0
+    try:
+        for path, stat in changed:
+            header = pd.read_csv(path, nrows=0).columns
+            extra_columns = ["project_key"] if "project_key" in header else []
+            for chunk in read_transitions(
+                path, cfg, chunksize=LOAD_CHUNK_ROWS, extra_columns=extra_columns
+            ):
+                added += add_transitions(connection, chunk)
+            with connection:
+                connection.execute(
+                    "INSERT OR REPLACE INTO loaded_files VALUES (?, ?, ?)",
+                    (path, stat.st_size, stat.st_mtime_ns),
+                )
+    finally:
+        if rebuild:
+            with connection:
+                create_indexes(connection)
+    return added
+
+
+def in_list(column, values):
+    # "column IN (?, ...)" and its parameters
+    return f"{column} IN ({', '.join('?' * len(values))})", list(values)
+
+
+def lane_statuses(connection, cfg, projects=None):
+    """The statuses in the store which are in WIP, and in done.
+
+    Statuses are looked up in the board config case-insensitively,
+    like everywhere else, so the store is asked for its distinct
+    statuses first (straight from the status index) and the queries
+    then match them exactly. Raises ValueError for statuses which are
+    not on the board.
+    """
+    where, parameters = "", []
+    if projects:
+        where, parameters = in_list("project_key", projects)
+        where = f"WHERE {where}"
+    statuses = pd.read_sql_query(
+        f"SELECT DISTINCT to_status FROM transitions {where}",
+        connection,
+        params=parameters,
+    )
+    lanes = classify_statuses(statuses["to_status"], cfg)
+    check_statuses_defined(statuses, cfg, lanes)
+    return (
+        statuses["to_status"][lanes == LANE_WIP].tolist(),
+        statuses["to_status"][lanes == LANE_DONE].tolist(),
+    )
+
+
+def query_ticket_timestamps(connection, cfg, since=None, until=None, projects=None):
+    """Start and end of each started ticket, aggregated in the store.
+
+    The same table extract_ticket_timestamps gives, for the tickets of
+    `projects` (all by default). With `since` or `until`, only tickets
+    finished from since up to, but not including, until are returned;
+    with `since`, only the tickets done since then are looked at, and
+    only their transitions are read.
+    """
+    wip, done = lane_statuses(connection, cfg, projects)
+    columns = ["ticket_id", "timestamp_start", "timestamp_end"]
+    if not wip:
+        result = pd.DataFrame(columns=columns)
+        return result.astype(
+            {
+                "ticket_id": "category",
+                "timestamp_start": "datetime64[ns]",
+                "timestamp_end": "datetime64[ns]",
+            }
+        )
+
+    wip_in, wip_parameters = in_list("to_status", wip)
+    done_in, done_parameters = in_list("to_status", done or [None])
+    conditions, parameters = [], []
+    if projects:
+        condition, project_parameters = in_list("project_key", projects)
+        conditions.append(condition)
+        parameters += project_parameters
+    if since is not None:
+        # Tickets with a done transition since then; the rest of their
+        # transitions are found through the primary key
+        recent = [done_in, "changed_at >= ?"] + conditions
+        conditions.append(
+            f"ticket_id IN (SELECT ticket_id FROM transitions "
+            f"WHERE {' AND '.join(recent)})"
+        )
+        parameters = parameters + done_parameters + [timestamp_ns(since)] + parameters
+
+    having = ["timestamp_start IS NOT NULL"]
+    having_parameters = []
+    if since is not None:
+        having.append("timestamp_end >= ?")
+        having_parameters.append(timestamp_ns(since))
+    if until is not None:
+        having.append("timestamp_end < ?")
+        having_parameters.append(timestamp_ns(until))
+
+    query = (
+        f"SELECT ticket_id, "
+        f"MIN(CASE WHEN {wip_in} THEN changed_at END) AS timestamp_start, "
+        f"MAX(CASE WHEN {done_in} THEN changed_at END) AS timestamp_end "
+        f"FROM transitions "
+        + (f"WHERE {' AND '.join(conditions)} " if conditions else "")
+        + f"GROUP BY ticket_id HAVING {' AND '.join(having)}"
+    )
+    result = pd.read_sql_query(
+        query,
+        connection,
+        params=wip_parameters + done_parameters + parameters + having_parameters,
+    )
+    for column in ["timestamp_start", "timestamp_end"]:
+        result[column] = pd.to_datetime(result[column].astype("Int64"), unit="ns")
+    result["ticket_id"] = result["ticket_id"].astype("category")
+    return result[columns]
+
+
+def timestamp_ns(value):
+    return pd.Timestamp(value).as_unit("ns").value
+
+
+def store_ticket_timestamps(store_path, file_paths, cfg):
+    # Bring the store up to date with the input files, and get the
+    # ticket timestamps within the date range and projects of cfg.
+    # Tickets finished in the lookback windows before the range are
+    # included, so their metrics can count them.
+    since = cfg.get("since")
+    if since is not None:
+        since = pd.Timestamp(since) - pd.Timedelta(days=max(cfg.get("windows", (7,))))
+    connection = open_store(store_path, cfg)
+    try:
+        load_files(connection, file_paths, cfg)
+        return query_ticket_timestamps(
+            connection, cfg, since, cfg.get("until"), cfg.get("projects")
+        )
+    finally:
+        connection.close()
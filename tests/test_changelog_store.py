@@ -0,0 +1,43 @@
+import pandas as pd
+
+from changelog_store import (
+    open_store,
+    add_transitions,
+    load_transitions,
+    get_last_sync,
+    set_last_sync,
+)
+
+
+def test_add_transitions_skips_duplicates(tmp_path):
+    # Given: an empty store
+    connection = open_store(tmp_path / "changelog.sqlite")
+    transitions = pd.DataFrame(
+        {
+            "ticket_id": ["T-1", "T-1"],
+            "from_status": [None, "In Progress"],
+            "to_status": ["In Progress", "Done"],
+            "changed_at": [
+                "2023-09-26T09:03:31.355+0200",
+                "2023-09-27T09:03:31.355+0200",
+            ],
+        }
+    )
+
+    # When: adding overlapping batches of transitions
+    added = add_transitions(connection, transitions)
+    added_again = add_transitions(connection, transitions.tail(1))
+
+    # Then: each transition is stored once
+    assert (added, added_again) == (2, 0)
+    pd.testing.assert_frame_equal(load_transitions(connection), transitions)
+
+
+def test_last_sync_per_source(tmp_path):
+    connection = open_store(tmp_path / "changelog.sqlite")
+    synced_at = pd.Timestamp("2023-09-26 10:00", tz="UTC")
+
+    set_last_sync(connection, "filter A", synced_at)
+
+    assert get_last_sync(connection, "filter A") == synced_at
+    assert get_last_sync(connection, "filter B") is None
@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+
+import pytest
+from unittest.mock import patch
+from fake_jira import FakeJira, FakeJiraServer
+from jira_link import JiraPoller, get_tickets
+
+
+@pytest.fixture
+def fake_jira():
+    jira = FakeJira(issues=120, seed=3, long_changelog_ratio=0.05)
+    server = FakeJiraServer(jira, max_page_size=50).start()
+    yield jira, server
+    server.shutdown()
+    server.server_close()
+
+
+def jira_cfg(server, **overrides):
+    cfg = {
+        "jira_url": server.url,
+        "email": "test@example.com",
+        "api_token": "token",
+        "jira_filter": "fake filter",
+        "mock_jira_data": None,
+        "page_size": 50,
+        "concurrency": 4,
+    }
+    cfg.update(overrides)
+    return cfg
+
+
+def status_changes(jira, index):
+    return [
+        (item["toString"], history["created"])
+        for history in jira.histories(index)
+        for item in history["items"]
+        if item["field"] == "status"
+    ]
+
+
+def test_get_tickets_fetches_every_transition(fake_jira):
+    # Given a fake Jira with some long changelogs
+    jira, server = fake_jira
+    assert any(len(jira.histories(i)) > 100 for i in range(jira.issues))
+
+    # When fetching all tickets through the real client
+    df = get_tickets(jira_cfg(server))
+
+    # Then every status transition of every issue is returned
+    assert df["ticket_id"].nunique() == jira.issues
+    for index in range(jira.issues):
+        rows = df[df["ticket_id"] == jira.key(index)]
+        assert list(zip(rows["to_status"], rows["changed_at"])) == status_changes(
+            jira, index
+        )
+
+    # And the search is not asked for a page past the end
+    assert server.requests["search"] == 3
+
+
+def test_sync_only_fetches_updated_issues(fake_jira, tmp_path):
+    # Given a store synced once
+    jira, server = fake_jira
+    cfg = jira_cfg(server, changelog_store=str(tmp_path / "store.sqlite"))
+    first = get_tickets(cfg)
+
+    # When syncing again
+    searched = server.requests["search"]
+    second = get_tickets(cfg)
+
+    # Then only issues updated recently are fetched, and nothing changes
+    assert server.requests["search"] - searched == 1
+    assert second.equals(first)
+
+
+def test_jira_poller_only_fetches_updated_issues(fake_jira):
+    # Given a poller which fetched everything once
+    jira, server = fake_jira
+    poller = JiraPoller(jira_cfg(server))
+    first = poller.poll()
+    assert first["ticket_id"].nunique() == jira.issues
+
+    # When polling again
+    searched = server.requests["search"]
+    second = poller.poll()
+
+    # Then only issues updated since are searched for, and there are
+    # none (the fake ones were all last updated in 2023)
+    assert server.requests["search"] - searched == 1
+    assert second.empty
+
+
+def test_rate_limited_requests_are_retried(fake_jira):
+    # Given a fake Jira answering every 5th request with a 429
+    jira, server = fake_jira
+    server.throttle_every = 5
+
+    # When fetching all tickets, without the client's retry delays
+    with patch("jira.resilientsession.time"):
+        df = get_tickets(jira_cfg(server))
+
+    # Then all tickets are returned anyway
+    assert df["ticket_id"].nunique() == jira.issues
+    assert server.request_count >= 5
@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+
+import numpy as np
+import pandas as pd
+import pytest
+from flow_metrics import cumulative_flow, status_intervals, time_in_status
+from stats_common import LANE_DONE, LANE_TODO, LANE_WIP
+
+cfg = {
+    "todo_names": ["To Do"],
+    "wip_names": ["In Progress", "Review"],
+    "done_names": ["Done"],
+    "ignore_names": ["Ignored"],
+}
+
+
+def transitions(rows):
+    return pd.DataFrame(
+        {
+            "ticket_id": [row[0] for row in rows],
+            "to_status": [row[1] for row in rows],
+            "changed_at": pd.to_datetime([row[2] for row in rows]),
+        }
+    )
+
+
+def test_status_intervals_end_at_the_next_transition():
+    # Given two tickets with transitions out of order, one still in WIP
+    data = transitions(
+        [
+            ("A", "Done", "2024-01-05 00:00"),
+            ("B", "To Do", "2024-01-02 00:00"),
+            ("A", "To Do", "2024-01-01 00:00"),
+            ("B", "In Progress", "2024-01-03 12:00"),
+            ("A", "In Progress", "2024-01-02 00:00"),
+        ]
+    )
+
+    # When the stays are counted up to a point in time
+    intervals = status_intervals(data, cfg, now=pd.Timestamp("2024-01-06"))
+
+    # Then each stay ends where the next one of the ticket starts, and
+    # only the stay in done has no end
+    assert intervals["ticket_id"].tolist() == ["A", "A", "A", "B", "B"]
+    assert intervals["lane"].tolist() == [
+        LANE_TODO,
+        LANE_WIP,
+        LANE_DONE,
+        LANE_TODO,
+        LANE_WIP,
+    ]
+    assert intervals["days"].tolist()[:2] == [1, 3]
+    assert np.isnan(intervals["days"].iloc[2])
+    assert intervals["days"].tolist()[3:] == [1.5, 2.5]
+    assert intervals["left_at"].isna().tolist() == [False, False, True, False, True]
+
+
+def test_time_in_status_splits_active_and_waiting():
+    # Given a ticket which waits for review and is sent back once
+    data = transitions(
+        [
+            ("A", "To Do", "2024-01-01"),
+            ("A", "In Progress", "2024-01-02"),
+            ("A", "Review", "2024-01-04"),
+            ("A", "In Progress", "2024-01-07"),
+            ("A", "Done", "2024-01-08"),
+            ("B", "To Do", "2024-01-01"),
+            ("B", "Done", "2024-01-03"),
+        ]
+    )
+
+    # When only In Progress counts as active
+    result = time_in_status(status_intervals(data, cfg), ["in progress"])
+    a = result.set_index("ticket_id").loc["A"]
+    b = result.set_index("ticket_id").loc["B"]
+
+    # Then the time in WIP is split between active and waiting, and
+    # tickets never in WIP have no flow efficiency
+    assert a["todo_days"] == 1
+    assert (a["wip_days"], a["active_days"], a["waiting_days"]) == (6, 3, 3)
+    assert a["flow_efficiency"] == 50
+    assert (a["In Progress_days"], a["Review_days"]) == (3, 3)
+    assert "Done_days" not in result.columns
+    assert b["wip_days"] == 0 and np.isnan(b["flow_efficiency"])
+
+
+def test_cumulative_flow_counts_tickets_per_lane_each_day():
+    # Given a ticket passing through WIP within a day, one reopened,
+    # and one in an ignored status
+    data = transitions(
+        [
+            ("A", "To Do", "2024-01-01 09:00"),
+            ("A", "In Progress", "2024-01-02 09:00"),
+            ("A", "Done", "2024-01-02 17:00"),
+            ("B", "In Progress", "2024-01-01 10:00"),
+            ("B", "Done", "2024-01-02 10:00"),
+            ("B", "In Progress", "2024-01-03 10:00"),
+            ("C", "Ignored", "2024-01-01 10:00"),
+        ]
+    )
+
+    # When the lanes are counted at the end of each day
+    result = cumulative_flow(status_intervals(data, cfg))
+
+    # Then a ticket counts in the lane it was in at the end of the day
+    assert result.columns.tolist() == ["date", "todo", "wip", "done"]
+    assert result["date"].tolist() == list(
+        pd.date_range("2024-01-01", "2024-01-03", freq="D")
+    )
+    assert result["todo"].tolist() == [1, 0, 0]
+    assert result["wip"].tolist() == [1, 0, 1]
+    assert result["done"].tolist() == [0, 2, 1]
+
+
+def test_status_intervals_rejects_unknown_statuses():
+    # Given a status which is not on the board
+    data = transitions([("A", "Limbo", "2024-01-01")])
+
+    # Then it is reported
+    with pytest.raises(ValueError, match="LIMBO"):
+        status_intervals(data, cfg)
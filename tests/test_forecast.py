@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+
+import numpy as np
+import pandas as pd
+import pytest
+import forecast
+from forecast import daily_throughput, forecast_completion, forecast_items
+
+
+def test_daily_throughput_counts_days_without_tickets():
+    # Given tickets finished on three days over a week, one unfinished
+    tickets = pd.DataFrame(
+        {
+            "timestamp_end": pd.to_datetime(
+                ["2023-03-01 10:00", "2023-03-01 17:00", "2023-03-04 09:00"]
+                + ["2023-03-07 12:00", None]
+            )
+        }
+    )
+
+    # Then every day is counted, and the history can be cut short
+    assert daily_throughput(tickets).tolist() == [2, 0, 0, 1, 0, 0, 1]
+    assert daily_throughput(tickets, history_days=4).tolist() == [1, 0, 0, 1]
+    assert daily_throughput(tickets.iloc[4:]).tolist() == []
+
+
+def test_daily_throughput_history_stops_at_the_first_finished_ticket():
+    # Given a week of finished tickets
+    tickets = pd.DataFrame(
+        {"timestamp_end": pd.to_datetime(["2023-03-01 10:00", "2023-03-07 12:00"])}
+    )
+
+    # When asking for more history than there is
+    throughput = daily_throughput(tickets, history_days=90)
+
+    # Then no empty days are made up before the first finished ticket
+    assert len(throughput) == 7
+    assert throughput.tolist() == [1, 0, 0, 0, 0, 0, 1]
+
+
+def test_forecast_with_steady_throughput():
+    # Given a team which always finishes two items a day
+    throughput = np.array([2, 2, 2])
+
+    # Then 40 items take 20 days, starting on the start date
+    completion = forecast_completion(throughput, 40, "2024-01-01", trials=1000)
+    assert completion["days"].tolist() == [20, 20, 20]
+    assert completion["date"].tolist() == [pd.Timestamp("2024-01-20")] * 3
+
+    # And 10 days, start and end included, get 20 items done
+    items = forecast_items(throughput, "2024-01-01", "2024-01-10", trials=1000)
+    assert items["items"].tolist() == [20, 20, 20]
+
+
+def test_forecast_draws_large_targets_a_block_at_a_time(monkeypatch):
+    # Given blocks much shorter than the forecast
+    monkeypatch.setattr(forecast, "MAX_BLOCK_DAYS", 8)
+
+    # Then the trials keep drawing days until they are done
+    completion = forecast_completion(np.array([2]), 1000, "2024-01-01", trials=100)
+    assert completion["days"].tolist() == [500, 500, 500]
+
+
+def test_forecast_is_reproducible_across_jobs(monkeypatch):
+    # Given a bursty history, and trials spread over several batches
+    monkeypatch.setattr(forecast, "TRIALS_PER_BATCH", 3000)
+    throughput = np.array([0, 0, 1, 0, 4, 0, 2])
+
+    # When forecasting with the same seed, in one or two processes
+    first = forecast_completion(throughput, 30, "2024-01-01", trials=10_000, seed=3)
+    second = forecast_completion(
+        throughput, 30, "2024-01-01", trials=10_000, seed=3, jobs=2
+    )
+    items = forecast_items(throughput, "2024-01-01", "2024-01-31", trials=10_000)
+
+    # Then the results are the same, and more confidence means later
+    # dates and fewer items
+    pd.testing.assert_frame_equal(first, second)
+    assert first["days"].is_monotonic_increasing
+    assert items["items"].is_monotonic_decreasing
+    assert first["days"].iloc[0] == pytest.approx(30 / throughput.mean(), rel=0.2)
+
+
+def test_forecast_needs_finished_tickets():
+    with pytest.raises(ValueError):
+        forecast_completion(np.array([0, 0]), 10, "2024-01-01")
+    with pytest.raises(ValueError):
+        forecast_items(np.array([1]), "2024-01-02", "2024-01-01")
@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+
+import pytest
+from generate_transitions import generate_transitions, write_transitions
+from leanStats import extract_ticket_timestamps, read_transitions
+
+
+def test_generate_transitions_is_seeded():
+    # Given the same seed twice, and another seed
+    first = generate_transitions(200, seed=7)
+    second = generate_transitions(200, seed=7)
+    other = generate_transitions(200, seed=8)
+
+    # Then the same seed gives the same log, another one does not
+    assert first.equals(second)
+    assert not first.equals(other)
+
+
+def test_generate_transitions_follows_workflow():
+    # Given a log with plenty of rework and unfinished tickets
+    df = generate_transitions(500, seed=1, rework_ratio=0.5, unfinished_ratio=0.3)
+    grouped = df.groupby("ticket_id", sort=False)
+
+    # Then each ticket starts at the start and moves forward in time
+    assert (grouped["from_status"].first() == "Backlog").all()
+    assert grouped["changed_at"].apply(lambda s: s.is_monotonic_increasing).all()
+
+    # And each transition leaves the status the previous one entered
+    previous = grouped["to_status"].shift()
+    has_previous = previous.notna()
+    assert (df["from_status"][has_previous] == previous[has_previous]).all()
+
+    # And some tickets had rework, and some never got done
+    assert (df["to_status"] == "Done").groupby(df["ticket_id"]).sum().max() == 1
+    assert grouped.size().max() > 4
+    assert (grouped["to_status"].last() != "Done").any()
+
+
+@pytest.mark.parametrize("timestamp_format", ["%d/%m/%Y %H:%M:%S", "iso"])
+def test_write_transitions_is_readable(tmp_path, timestamp_format):
+    # Given a generated file, written in several chunks
+    csv = tmp_path / "transitions.csv"
+    rows = write_transitions(
+        csv, 5000, timestamp_format=timestamp_format, tickets_per_chunk=300, projects=3
+    )
+    assert 4000 < rows < 6000
+
+    # When it is read like any other input
+    cfg = {
+        "todo_names": ["Backlog", "To Do"],
+        "wip_names": ["In Progress", "Review"],
+        "done_names": ["Done"],
+        "ignore_names": [""],
+        "timezone": "UTC",
+    }
+    data = read_transitions(csv, cfg)
+
+    # Then all rows and tickets are there
+    assert len(data) == rows
+    assert extract_ticket_timestamps(data, cfg)["ticket_id"].is_unique
+    assert data["changed_at"].notna().all()
@@ -1,14 +1,24 @@
 #!/usr/bin/env python
 
+import threading
 import pandas as pd
+import pytest
 from unittest.mock import patch, Mock
-from jira_link import connect_to_jira, get_tickets_from_jira
+from jira.client import ResultList
+from jira.exceptions import JIRAError
+from jira_link import (
+    connect_to_jira,
+    get_tickets_from_jira,
+    search_all_pages,
+    sync_tickets_from_jira,
+    updated_since_jql,
+)
 
 
 def test_connect_to_jira():
     # replace JIRA class inside the jira_connector module temporarily
     # with a mock object.
-    with patch("jira_link.JIRA") as mock_jira:
+    with patch("jira.JIRA") as mock_jira:
         mock_instance = Mock()
         mock_jira.return_value = mock_instance
 
@@ -27,7 +37,7 @@ def test_connect_to_jira():
         assert result == mock_instance
 
 
-@patch("jira_link.JIRA")
+@patch("jira.JIRA")
 def test_get_tickets_from_jira(mocked_jira_class):
     # Given: a mock jira client
     mock_item = Mock()
@@ -69,3 +79,195 @@ def test_get_tickets_from_jira(mocked_jira_class):
     )
 
     pd.testing.assert_frame_equal(df, expected_df)
+
+
+def make_issue(key, created):
+    item = Mock(field="status", fromString="To Do", toString="Done")
+    history = Mock(items=[item], created=created)
+    issue = Mock(key=key)
+    issue.changelog.histories = [history]
+    return issue
+
+
+class FakeSearchClient:
+    """Serves a fixed list of issues, a page at a time, like Jira does.
+
+    `server_page_size` caps the page size regardless of what is asked
+    for, and `failures` maps startAt to a list of errors to raise
+    before answering.
+    """
+
+    def __init__(self, issues, server_page_size=100, failures=None, changelogs=None):
+        self.issues = issues
+        self.changelogs = changelogs or {}
+        self.server_page_size = server_page_size
+        self.failures = failures or {}
+        self.calls = []
+        self.queries = []
+        self.lock = threading.Lock()
+
+    def _get_json(self, path, params):
+        # The paged changelog endpoint, serving 2 entries per page
+        with self.lock:
+            self.calls.append(path)
+        key = path.split("/")[1]
+        start_at = params["startAt"]
+        values = self.changelogs[key][start_at : start_at + 2]
+        return {
+            "startAt": start_at,
+            "total": len(self.changelogs[key]),
+            "values": values,
+        }
+
+    def favourite_filters(self):
+        saved_filter = Mock(jql="project = TEST ORDER BY key")
+        saved_filter.name = "some_filter"
+        return [saved_filter]
+
+    def search_issues(self, jql_str, expand, startAt, maxResults):
+        with self.lock:
+            self.calls.append(startAt)
+            self.queries.append(jql_str)
+            errors = self.failures.get(startAt)
+            if errors:
+                raise errors.pop(0)
+        page_size = min(maxResults, self.server_page_size)
+        return ResultList(
+            self.issues[startAt : startAt + page_size],
+            _startAt=startAt,
+            _maxResults=page_size,
+            _total=len(self.issues),
+        )
+
+
+@pytest.fixture
+def issues():
+    return [
+        make_issue(f"TEST-{i}", f"2023-09-26T15:59:{i % 60:02d}.000+0200")
+        for i in range(250)
+    ]
+
+
+def test_search_all_pages_fans_out_after_first_page(issues):
+    # Given: a filter matching 250 issues, and a server which returns
+    # at most 40 of them per page
+    client = FakeSearchClient(issues, server_page_size=40)
+    cfg = {"page_size": 100, "concurrency": 3}
+
+    # When: fetching all pages
+    pages = search_all_pages(client, "MOCKED JQL", cfg)
+
+    # Then: every issue is fetched once, in order, without an extra
+    # round trip past the end
+    assert [issue.key for page in pages for issue in page] == [
+        issue.key for issue in issues
+    ]
+    assert sorted(client.calls) == list(range(0, 250, 40))
+
+
+def test_search_all_pages_retries_rate_limits(issues):
+    # Given: a server which rate limits and fails some requests
+    client = FakeSearchClient(
+        issues,
+        failures={
+            100: [JIRAError(status_code=429), JIRAError(status_code=503)],
+            200: [JIRAError(status_code=502)],
+        },
+    )
+    cfg = {"max_retries": 2, "retry_backoff": 0}
+
+    # When: fetching all pages
+    pages = search_all_pages(client, "MOCKED JQL", cfg)
+
+    # Then: the failed pages were retried
+    assert sum(len(page) for page in pages) == 250
+    assert client.calls.count(100) == 3
+    assert client.calls.count(200) == 2
+
+
+def test_search_all_pages_gives_up(issues):
+    # Given: a server which keeps failing, and one which rejects the query
+    busy = FakeSearchClient(issues, failures={0: [JIRAError(status_code=429)] * 3})
+    broken = FakeSearchClient(issues, failures={0: [JIRAError(status_code=400)]})
+    cfg = {"max_retries": 2, "retry_backoff": 0}
+
+    # When/Then: we give up after max_retries, or straight away
+    with pytest.raises(JIRAError):
+        list(search_all_pages(busy, "MOCKED JQL", cfg))
+    assert busy.calls == [0, 0, 0]
+    with pytest.raises(JIRAError):
+        list(search_all_pages(broken, "MOCKED JQL", cfg))
+    assert broken.calls == [0]
+
+
+def test_updated_since_jql():
+    since = pd.Timestamp("2023-09-26 10:00")
+    assert (
+        updated_since_jql("project = XX OR key = YY-1 order by created", since)
+        == '(project = XX OR key = YY-1) AND updated >= "2023-09-26 10:00" '
+        "order by created"
+    )
+
+
+def test_sync_tickets_from_jira(tmp_path):
+    # Given: a filter with a few issues and an empty changelog store
+    issues = [
+        make_issue(f"TEST-{i}", f"2023-09-2{i}T10:00:00.000+0200") for i in range(3)
+    ]
+    client = FakeSearchClient(issues)
+    cfg = {
+        "jira_filter": "some_filter",
+        "jira_url": "https://jira.example.com",
+        "changelog_store": tmp_path / "changelog.sqlite",
+    }
+
+    # When: syncing twice, with a new transition in between
+    first = sync_tickets_from_jira(client, cfg)
+    issues[1].changelog.histories.append(
+        Mock(
+            items=[Mock(field="status", fromString="Done", toString="In Progress")],
+            created="2023-09-28T10:00:00.000+0200",
+        )
+    )
+    second = sync_tickets_from_jira(client, cfg)
+
+    # Then: the first sync fetched everything, the second only asked
+    # for recently updated issues, and nothing is stored twice
+    assert client.queries[0] == "project = TEST ORDER BY key"
+    assert client.queries[1].startswith("(project = TEST) AND updated >= ")
+    assert client.queries[1].endswith(" ORDER BY key")
+    assert list(first["ticket_id"]) == ["TEST-0", "TEST-1", "TEST-2"]
+    assert list(second["ticket_id"]) == ["TEST-0", "TEST-1", "TEST-1", "TEST-2"]
+    assert list(second.columns) == [
+        "ticket_id",
+        "from_status",
+        "to_status",
+        "changed_at",
+    ]
+
+
+def test_get_tickets_from_jira_fetches_truncated_changelogs():
+    # Given: an issue whose embedded changelog holds only the first 2
+    # of its 5 entries, and one with a complete changelog
+    created = [f"2023-09-2{i}T10:00:00.000+0200" for i in range(5)]
+    long_lived = make_issue("TEST-1", created[0])
+    long_lived.changelog.histories.append(
+        Mock(items=[Mock(field="assignee")], created=created[1])
+    )
+    long_lived.changelog.total = 5
+    complete = make_issue("TEST-2", created[0])
+    complete.changelog.total = 1
+    changelog = [
+        {"created": created[i], "items": [{"field": "status", "toString": f"S{i}"}]}
+        for i in range(5)
+    ]
+    client = FakeSearchClient([long_lived, complete], changelogs={"TEST-1": changelog})
+
+    # When: fetching the tickets
+    df = get_tickets_from_jira(client, {"jira_filter": "some_filter"})
+
+    # Then: the rest of the long changelog was paged in
+    assert list(df["ticket_id"]) == ["TEST-1", "TEST-1", "TEST-1", "TEST-1", "TEST-2"]
+    assert list(df["to_status"]) == ["Done", "S2", "S3", "S4", "Done"]
+    assert df["from_status"][1:4].isna().all()
+    assert client.calls[1:] == ["issue/TEST-1/changelog"] * 2
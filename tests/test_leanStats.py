@@ -3,15 +3,39 @@ import pandas as pd
 import numpy as np
 from io import StringIO
 import sys
+import warnings
 import os
 
 from leanStats import (
+    combine_ticket_timestamps,
+    ticket_timestamps,
     extract_ticket_timestamps,
     calculate_cycletime,
     compute_metrics_per_ticket,
     compute_metrics_per_week,
+    compute_metrics_per_period,
     check_statuses_defined,
+    classify_statuses,
+    LANE_TODO,
+    LANE_WIP,
+    LANE_DONE,
+    LANE_IGNORE,
+    LANE_UNKNOWN,
+    parse_timestamps,
+    sniff_timestamp_format,
+    read_transitions,
+    stream_ticket_timestamps,
+    compute_metrics_incrementally,
+    compute_metrics,
+    compute_metrics_by_group,
+    period_sketches,
+    TransitionsTail,
+    watch_metrics,
+    LeanStats,
+    read_input_files,
 )
+from quantile_sketch import QuantileSketch
+from stats_common import input_files
 
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
@@ -86,6 +110,35 @@ def test_extract_ticket_timestamps(sample_data_time):
     )
 
 
+def test_ticket_timestamps_only_has_tickets_in_the_data():
+    # Given: categorical ticket ids, with tickets which were filtered
+    # out or never left to do
+    data = pd.DataFrame(
+        {
+            "ticket_id": pd.Categorical(
+                ["T-1", "T-1", "T-2"], categories=["T-1", "T-2", "T-3"]
+            ),
+            "to_status": ["In Progress", "Done", "To Do"],
+            "changed_at": pd.to_datetime(["2023-09-15", "2023-09-17", "2023-09-16"]),
+        }
+    )
+    cfg = {
+        "todo_names": ["To Do"],
+        "wip_names": ["In Progress"],
+        "done_names": ["Done"],
+    }
+
+    # When: finding when each ticket started and finished
+    with warnings.catch_warnings():
+        warnings.simplefilter("error", FutureWarning)
+        partial = ticket_timestamps(data, cfg)
+        combined = combine_ticket_timestamps([partial, partial])
+
+    # Then: unused categories get no rows of their own
+    assert partial.index.tolist() == ["T-1"]
+    assert combined.index.tolist() == ["T-1"]
+
+
 def test_calculate_cycletime(sample_data_time):
     data = pd.read_csv(sample_data_time, parse_dates=["changed_at"], dayfirst=True)
     cfg = {
@@ -156,6 +209,124 @@ def test_compute_metrics_per_ticket_basic_functionality():
     assert result_df.loc[result_df["ticket_id"] == "D", "throughput"].values[0] == 4
 
 
+def reference_metrics_per_ticket(dataframe):
+    # The original row-by-row implementation, kept as the oracle for
+    # the rolling-window engine. The only changes are the stable sort,
+    # which keeps the order of tickets finishing at the same time, and
+    # the nullable int columns of the result.
+    dataframe = dataframe.sort_values(by="timestamp_end", kind="stable")
+    dataframe["median_cycletime"] = np.nan
+    dataframe["p85_cycletime"] = np.nan
+    dataframe["throughput"] = np.nan
+    for idx, row in dataframe.iterrows():
+        lookback_start = row["timestamp_end"] - pd.Timedelta(days=7)
+        lookback_end = row["timestamp_end"]
+        lookback_data = dataframe[
+            (dataframe["timestamp_end"] >= lookback_start)
+            & (dataframe["timestamp_end"] <= lookback_end)
+        ]
+        dataframe.at[idx, "median_cycletime"] = np.ceil(
+            lookback_data["cycletime"].median()
+        )
+        dataframe.at[idx, "p85_cycletime"] = np.ceil(
+            lookback_data["cycletime"].quantile(0.85)
+        )
+        dataframe.at[idx, "throughput"] = np.ceil(lookback_data.shape[0])
+    return dataframe.astype(
+        {"median_cycletime": "Int32", "p85_cycletime": "Int32", "throughput": "Int32"}
+    )
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_compute_metrics_per_ticket_matches_reference(seed):
+    # Given: random tickets, with ties on timestamp_end and a few
+    # tickets exactly one lookback window apart
+    rng = np.random.default_rng(seed)
+    n = 300
+    ends = pd.Timestamp("2023-01-01") + pd.to_timedelta(
+        rng.integers(0, 90 * 24, n), unit="h"
+    )
+    df = pd.DataFrame(
+        {
+            "ticket_id": [f"T-{i}" for i in range(n)],
+            "timestamp_end": ends,
+            "cycletime": rng.integers(1, 30, n),
+        }
+    )
+    df.loc[n - 1, "timestamp_end"] = df.loc[0, "timestamp_end"] + pd.Timedelta(days=7)
+
+    # When: computing metrics with both implementations
+    result = compute_metrics_per_ticket(df)
+    expected = reference_metrics_per_ticket(df)
+
+    # Then: they agree row for row
+    pd.testing.assert_frame_equal(result, expected)
+
+
+def test_compute_metrics_per_ticket_unfinished_tickets():
+    # Given: one ticket which never reached a DONE state
+    df = pd.DataFrame(
+        {
+            "ticket_id": ["A", "B", "C"],
+            "timestamp_end": [
+                pd.Timestamp("2023-09-15 10:00:00"),
+                pd.NaT,
+                pd.Timestamp("2023-09-17 10:00:00"),
+            ],
+            "cycletime": [5, 3, 4],
+        }
+    )
+
+    # When: Run the compute_metrics_per_ticket function
+    result_df = compute_metrics_per_ticket(df)
+
+    # Then: it is sorted last, has no metrics, and does not count
+    # towards the other tickets' windows
+    pd.testing.assert_frame_equal(result_df, reference_metrics_per_ticket(df))
+    assert list(result_df["ticket_id"]) == ["A", "C", "B"]
+    assert result_df["throughput"].tolist() == [1, 2, 0]
+
+
+def test_compute_metrics_per_ticket_multiple_windows():
+    # Given: tickets spread over three weeks
+    df = pd.DataFrame(
+        {
+            "ticket_id": ["A", "B", "C", "D"],
+            "timestamp_end": [
+                pd.Timestamp("2023-09-01 10:00:00"),
+                pd.Timestamp("2023-09-05 10:00:00"),
+                pd.Timestamp("2023-09-12 10:00:00"),
+                pd.Timestamp("2023-09-20 10:00:00"),
+            ],
+            "cycletime": [2, 4, 6, 8],
+        }
+    )
+
+    # When: computing 7 and 30 day windows with three percentiles
+    result_df = compute_metrics_per_ticket(df, [7, 30], [50, 70, 95])
+
+    # Then: every window/percentile combination gets its own column
+    assert list(result_df.columns[3:]) == [
+        "median_cycletime_7d",
+        "p70_cycletime_7d",
+        "p95_cycletime_7d",
+        "throughput_7d",
+        "median_cycletime_30d",
+        "p70_cycletime_30d",
+        "p95_cycletime_30d",
+        "throughput_30d",
+    ]
+    assert result_df["throughput_7d"].tolist() == [1, 2, 2, 1]
+    assert result_df["throughput_30d"].tolist() == [1, 2, 3, 4]
+    assert result_df["median_cycletime_7d"].tolist() == [2, 3, 5, 8]
+    assert result_df["median_cycletime_30d"].tolist() == [2, 3, 4, 5]
+    assert result_df["p95_cycletime_30d"].tolist() == [2, 4, 6, 8]
+
+    # And: each window matches a single-window run
+    single = compute_metrics_per_ticket(df, [30], [50, 70, 95])
+    assert single["p70_cycletime"].tolist() == result_df["p70_cycletime_30d"].tolist()
+
+
 def test_compute_metrics_per_week_basic_input():
     # Given: A basic input DataFrame
     data = {
@@ -169,8 +340,13 @@ def test_compute_metrics_per_week_basic_input():
     # When: Calling the compute_metrics_per_week function
     result = compute_metrics_per_week(df)
 
-    # Then: It should handle and return the expected output
-    expected = [(pd.Timestamp("2023-01-02"), pd.Timestamp("2023-01-08"), 6.0, 7.0, 3)]
+    # Then: It should handle and return the expected output. Weeks
+    # start on Monday, so the ticket finishing on Sunday the 1st
+    # belongs to the week before.
+    expected = [
+        (pd.Timestamp("2022-12-26"), pd.Timestamp("2023-01-01"), 5, 5, 1),
+        (pd.Timestamp("2023-01-02"), pd.Timestamp("2023-01-08"), 7, 7, 2),
+    ]
     assert list(result.itertuples(index=False, name=None)) == expected
 
 
@@ -189,15 +365,15 @@ def test_compute_metrics_per_week_fill_missing_week():
 
     # Then: It should fill the missing week with NaN
     expected = [
-        (pd.Timestamp("2023-01-02"), pd.Timestamp("2023-01-08"), 5.0, 5.0, 1),
+        (pd.Timestamp("2022-12-26"), pd.Timestamp("2023-01-01"), 5, 5, 1),
         (
-            pd.Timestamp("2023-01-09"),
-            pd.Timestamp("2023-01-15"),
-            np.nan,
-            np.nan,
-            np.nan,
+            pd.Timestamp("2023-01-02"),
+            pd.Timestamp("2023-01-08"),
+            pd.NA,
+            pd.NA,
+            pd.NA,
         ),
-        (pd.Timestamp("2023-01-16"), pd.Timestamp("2023-01-22"), 7.0, 7.0, 1),
+        (pd.Timestamp("2023-01-09"), pd.Timestamp("2023-01-15"), 7, 7, 1),
     ]
 
     expected_df = pd.DataFrame(
@@ -211,8 +387,17 @@ def test_compute_metrics_per_week_fill_missing_week():
         ],
     )
 
-    # Use the pandas equals method which considers NaN values as equal
-    assert result.equals(expected_df)
+    # Metrics are nullable ints, so missing values compare as equal
+    expected_df = expected_df.astype(
+        {
+            "startdate": result["startdate"].dtype,
+            "enddate": result["enddate"].dtype,
+            "cycletime_p50": "Int32",
+            "cycletime_p85": "Int32",
+            "throughput": "Int32",
+        }
+    )
+    pd.testing.assert_frame_equal(result, expected_df)
 
 
 def test_compute_metrics_per_week_expected_columns():
@@ -238,6 +423,149 @@ def test_compute_metrics_per_week_expected_columns():
     ]
 
 
+def test_compute_metrics_per_week_across_year_boundary():
+    # Given: tickets finishing either side of new year, in years where
+    # the 1st of January is not on a week start
+    df = pd.DataFrame(
+        {
+            "timestamp_end": pd.to_datetime(
+                ["2021-12-30", "2022-01-01", "2022-01-02", "2022-12-31", "2023-01-01"]
+            ),
+            "cycletime": [1, 2, 3, 4, 5],
+            "ticket_id": [1, 2, 3, 4, 5],
+        }
+    )
+
+    # When: computing weekly metrics, with weeks starting on Monday
+    # and on Sunday
+    monday = compute_metrics_per_week(df)
+    sunday = compute_metrics_per_week(df, week_start="SUN")
+
+    # Then: each week is listed once, covering 7 days
+    assert monday["startdate"].is_unique
+    assert ((monday["enddate"] - monday["startdate"]).dt.days == 6).all()
+    assert len(monday) == 53
+    assert monday["throughput"].iloc[[0, -1]].tolist() == [3, 2]
+    assert monday["startdate"].iloc[0] == pd.Timestamp("2021-12-27")
+    assert sunday["startdate"].iloc[0] == pd.Timestamp("2021-12-26")
+    assert sunday["throughput"].iloc[[0, 1, -1]].tolist() == [2, 1, 1]
+    assert sunday["throughput"].sum() == 5
+
+
+@pytest.mark.parametrize(
+    "period, startdates, enddates, throughput",
+    [
+        (
+            "day",
+            ["2023-01-30", "2023-01-31", "2023-02-01"],
+            ["2023-01-30", "2023-01-31", "2023-02-01"],
+            [1, 2, 1],
+        ),
+        ("month", ["2023-01-01", "2023-02-01"], ["2023-01-31", "2023-02-28"], [3, 1]),
+        ("quarter", ["2023-01-01"], ["2023-03-31"], [4]),
+    ],
+)
+def test_compute_metrics_per_period(period, startdates, enddates, throughput):
+    # Given: tickets finishing over a month boundary
+    df = pd.DataFrame(
+        {
+            "timestamp_end": pd.to_datetime(
+                ["2023-01-30 10:00", "2023-01-31 09:00", "2023-01-31 23:00", None]
+                + ["2023-02-01 08:00"]
+            ),
+            "cycletime": [2, 4, 6, None, 8],
+            "ticket_id": [1, 2, 3, 4, 5],
+        }
+    ).astype({"cycletime": "Int32"})
+
+    # When: computing metrics per period, with extra percentiles
+    result = compute_metrics_per_period(df, period, [50, 70, 95])
+
+    # Then: there is a row per period, with every percentile
+    assert list(result.columns) == [
+        "startdate",
+        "enddate",
+        "cycletime_p50",
+        "cycletime_p70",
+        "cycletime_p95",
+        "throughput",
+    ]
+    assert result["startdate"].tolist() == pd.to_datetime(startdates).tolist()
+    assert result["enddate"].tolist() == pd.to_datetime(enddates).tolist()
+    assert result["throughput"].tolist() == throughput
+
+
+def test_compute_metrics_per_period_approximate():
+    # Given: tickets with small and large cycletimes over a few weeks
+    rng = np.random.default_rng(3)
+    df = pd.DataFrame(
+        {
+            "timestamp_end": pd.Timestamp("2023-01-02")
+            + pd.to_timedelta(rng.integers(0, 21 * 24, 500), unit="h"),
+            "cycletime": np.concatenate(
+                [rng.integers(0, 40, 400), rng.integers(100, 1000, 100)]
+            ),
+        }
+    ).astype({"cycletime": "Int32"})
+    small = df[df["cycletime"] < 40]
+
+    # When: computing the percentiles exactly and approximately
+    exact = compute_metrics_per_period(df, "week", [50, 85, 99])
+    approximate = compute_metrics_per_period(
+        df, "week", [50, 85, 99], relative_error=0.01
+    )
+
+    # Then: the error bound is reported next to the percentiles
+    assert list(approximate.columns) == [
+        "startdate",
+        "enddate",
+        "cycletime_p50",
+        "cycletime_p85",
+        "cycletime_p99",
+        "cycletime_error",
+        "throughput",
+    ]
+    assert (approximate["cycletime_error"] == 0.01).all()
+    assert approximate["throughput"].tolist() == exact["throughput"].tolist()
+
+    # And: large percentiles are within the bound (plus rounding up)
+    p99 = approximate["cycletime_p99"].astype(float)
+    assert (abs(p99 - exact["cycletime_p99"]) <= 0.01 * p99 + 1).all()
+
+    # And: for small whole numbers of days they are exact
+    pd.testing.assert_frame_equal(
+        compute_metrics_per_period(small, "week", [50, 85], relative_error=0.01).drop(
+            columns="cycletime_error"
+        ),
+        compute_metrics_per_period(small, "week", [50, 85]),
+    )
+
+
+def test_period_sketches_merge_into_longer_periods():
+    # Given: a sketch of the cycletimes finished each day
+    rng = np.random.default_rng(5)
+    df = pd.DataFrame(
+        {
+            "timestamp_end": pd.Timestamp("2023-01-02")
+            + pd.to_timedelta(rng.integers(0, 14 * 24, 300), unit="h"),
+            "cycletime": rng.integers(0, 200, 300),
+        }
+    ).astype({"cycletime": "Int32"})
+    daily = period_sketches(df, "day")
+
+    # When: merging the days of each week
+    weekly = period_sketches(df, "week")
+    for week, sketch in weekly.items():
+        merged = QuantileSketch(0.01)
+        for day, day_sketch in daily.items():
+            if day.start_time >= week.start_time and day.end_time <= week.end_time:
+                merged.merge(day_sketch)
+
+        # Then: they give the same sketch as the whole week
+        assert merged.count == sketch.count
+        assert merged.quantile(0.85) == sketch.quantile(0.85)
+
+
 def test_check_statuses_defined_undefined_statuses():
     """
     This test ensures that the check_statuses_defined function
@@ -337,3 +665,541 @@ def test_check_statuses_defined_undefined_and_ignored_statuses():
     # Then: It should raise an exception mentioning the truly undefined status
     with pytest.raises(ValueError, match=r"(?i)ReallyUndefined"):
         check_statuses_defined(dataframe, cfg)
+
+
+def test_classify_statuses():
+    # Given statuses in any case, one of them missing, and a board
+    # with a status in two groups
+    statuses = pd.Series(
+        ["backlog", "In Progress", "DONE", "Parked", "Blocked", None, "Backlog"]
+    )
+    cfg = {
+        "todo_names": ["Backlog"],
+        "wip_names": ["In Progress", "Parked"],
+        "done_names": ["Done"],
+        "ignore_names": ["Parked", "Blocked"],
+    }
+
+    # When classifying them, as strings or as a Categorical
+    lanes = classify_statuses(statuses, cfg)
+    categorical_lanes = classify_statuses(statuses.astype("category"), cfg)
+
+    # Then each row gets the code of its lane, and the board wins over
+    # the ignore list
+    expected = [
+        LANE_TODO,
+        LANE_WIP,
+        LANE_DONE,
+        LANE_WIP,
+        LANE_IGNORE,
+        LANE_UNKNOWN,
+        LANE_TODO,
+    ]
+    assert lanes.dtype == np.int8
+    assert lanes.tolist() == expected
+    assert categorical_lanes.tolist() == expected
+
+
+def test_sniff_timestamp_format():
+    assert (
+        sniff_timestamp_format(pd.Series(["15/09/2023 00:01:00", None]))
+        == "%d/%m/%Y %H:%M:%S"
+    )
+    assert (
+        sniff_timestamp_format(pd.Series(["2023-09-26T09:03:31.355+0200"]))
+        == "%Y-%m-%dT%H:%M:%S.%f%z"
+    )
+    assert sniff_timestamp_format(pd.Series(["2023-09-26 09:03"])) == "ISO8601"
+    assert sniff_timestamp_format(pd.Series(["not a date"])) is None
+
+
+def test_parse_timestamps_jira_offsets_follow_timezone():
+    # Given: Jira timestamps with UTC offsets, as in mock-jira-data.csv
+    values = pd.Series(
+        ["2023-09-26T09:03:31.355+0200", "2023-09-26T09:03:31.355+0000", None]
+    )
+
+    # When: parsing them for two different timezones
+    utc = parse_timestamps(values)
+    stockholm = parse_timestamps(values, "Europe/Stockholm")
+
+    # Then: they are converted to naive wall-clock time in that zone
+    assert utc.tolist()[:2] == [
+        pd.Timestamp("2023-09-26 07:03:31.355"),
+        pd.Timestamp("2023-09-26 09:03:31.355"),
+    ]
+    assert stockholm.tolist()[:2] == [
+        pd.Timestamp("2023-09-26 09:03:31.355"),
+        pd.Timestamp("2023-09-26 11:03:31.355"),
+    ]
+    assert pd.isna(utc.iloc[2])
+
+
+def test_parse_timestamps_naive_values_and_outliers():
+    # Given: mostly Jira CSV export timestamps, with an ISO outlier
+    values = pd.Series(
+        [
+            "15/09/2023 00:01:00",
+            "17/09/2023 00:02:00",
+            "2023-09-18T10:00:00+0000",
+            "2023-09-19",
+        ]
+    )
+
+    # When: parsing them
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        result = parse_timestamps(values, "Europe/Stockholm")
+
+    # Then: naive values are kept as they are, the outliers are parsed
+    # one by one, without warnings, and the one with an offset is
+    # converted
+    assert result.tolist() == [
+        pd.Timestamp("2023-09-15 00:01:00"),
+        pd.Timestamp("2023-09-17 00:02:00"),
+        pd.Timestamp("2023-09-18 12:00:00"),
+        pd.Timestamp("2023-09-19 00:00:00"),
+    ]
+
+
+def test_parse_timestamps_unparseable():
+    with pytest.raises(ValueError, match="yesterday"):
+        parse_timestamps(pd.Series(["15/09/2023 00:01:00", "yesterday"]))
+
+
+@pytest.fixture
+def board_cfg():
+    return {
+        "todo_names": ["To Do", "Backlog"],
+        "wip_names": ["In Progress", "Review & QA", "Review"],
+        "done_names": ["Done"],
+        "ignore_names": [],
+        "timezone": "UTC",
+    }
+
+
+@pytest.mark.parametrize("chunksize", [1, 2, 5, 1000])
+def test_stream_ticket_timestamps_matches_full_read(board_cfg, chunksize):
+    # Given: the sample data, where most tickets' WIP and DONE
+    # transitions end up in different chunks
+    file_path = os.path.join(os.path.dirname(__file__), "..", "data", "sample.csv")
+
+    # When: reading it in chunks and all at once
+    streamed = stream_ticket_timestamps(file_path, board_cfg, chunksize)
+    full = extract_ticket_timestamps(read_transitions(file_path, board_cfg), board_cfg)
+
+    # Then: the per-ticket timestamps are the same
+    pd.testing.assert_frame_equal(streamed, full)
+    assert list(streamed["ticket_id"]) == [f"PROJ-00{i}" for i in range(1, 6)]
+
+
+def test_stream_ticket_timestamps_keeps_tickets_done_in_later_chunk(
+    board_cfg, tmp_path
+):
+    # Given: a ticket which is finished in the last chunk, and one
+    # that was never started
+    csv = tmp_path / "transitions.csv"
+    csv.write_text("""ticket_id,summary,to_status,changed_at
+T-1,first,In Progress,15/09/2023 00:01:00
+T-2,second,Done,16/09/2023 00:01:00
+T-3,third,In Progress,16/09/2023 00:01:00
+T-1,first,Done,20/09/2023 00:02:00
+""")
+
+    # When: streaming the file two rows at a time
+    df = stream_ticket_timestamps(csv, board_cfg, 2)
+
+    # Then: T-1 spans both chunks, T-2 is dropped and T-3 is unfinished
+    assert list(df["ticket_id"]) == ["T-1", "T-3"]
+    assert df.iloc[0]["timestamp_end"] == pd.Timestamp("2023-09-20 00:02:00")
+    assert pd.isna(df.iloc[1]["timestamp_end"])
+
+
+def test_stream_ticket_timestamps_undefined_status(board_cfg, tmp_path):
+    csv = tmp_path / "transitions.csv"
+    csv.write_text("""ticket_id,to_status,changed_at
+T-1,In Progress,15/09/2023 00:01:00
+T-1,Limbo,20/09/2023 00:02:00
+""")
+
+    with pytest.raises(ValueError, match="LIMBO"):
+        stream_ticket_timestamps(csv, board_cfg, 1)
+
+
+def write_transitions(path, rows, header=True, mode="w"):
+    with open(path, mode) as f:
+        if header:
+            f.write("ticket_id,summary,to_status,changed_at\n")
+        for ticket_id, status, changed_at in rows:
+            f.write(f"{ticket_id},x,{status},{changed_at:%d/%m/%Y %H:%M:%S}\n")
+
+
+def full_metrics(csv, cfg):
+    tickets = calculate_cycletime(
+        extract_ticket_timestamps(read_transitions(csv, cfg), cfg)
+    )
+    ticket_metrics = compute_metrics_per_ticket(
+        tickets, cfg["windows"], cfg["percentiles"]
+    ).reset_index(drop=True)
+    return ticket_metrics, compute_metrics_per_period(
+        ticket_metrics,
+        cfg["period"],
+        cfg["percentiles"],
+        relative_error=cfg["relative_error"],
+    )
+
+
+@pytest.mark.parametrize(
+    "chunk_size, period, relative_error", [(0, "week", None), (7, "month", 0.01)]
+)
+def test_compute_metrics_incrementally_matches_full_run(
+    board_cfg, tmp_path, chunk_size, period, relative_error
+):
+    # Given: an export which grows over several days, where some
+    # tickets are reopened and finished again later
+    cfg = dict(
+        board_cfg,
+        windows=[7, 14],
+        percentiles=[50, 85],
+        chunk_size=chunk_size,
+        period=period,
+        relative_error=relative_error,
+    )
+    csv = tmp_path / "transitions.csv"
+    state_file = tmp_path / "leanStats.state"
+    rng = np.random.default_rng(4)
+    start = pd.Timestamp("2023-01-01")
+    write_transitions(csv, [])
+
+    for batch in range(6):
+        rows = []
+        for i in range(20):
+            # Reopen one ticket from the previous batch
+            ticket = f"T-{batch - 1 if i == 0 and batch else batch}-{i}"
+            wip = start + pd.Timedelta(
+                days=10 * batch, hours=int(rng.integers(0, 24 * 10))
+            )
+            done = wip + pd.Timedelta(hours=int(rng.integers(1, 24 * 10)))
+            rows += [(ticket, "In Progress", wip), (ticket, "Done", done)]
+        write_transitions(csv, rows, header=False, mode="a")
+
+        # When: updating the metrics from the state of the last run
+        ticket_metrics, weekly_metrics = compute_metrics_incrementally(
+            csv, cfg, state_file
+        )
+
+        # Then: they are the same as when computing everything again
+        expected_tickets, expected_weekly = full_metrics(csv, cfg)
+        pd.testing.assert_frame_equal(ticket_metrics, expected_tickets)
+        pd.testing.assert_frame_equal(
+            weekly_metrics, expected_weekly, check_dtype=False
+        )
+
+
+def test_compute_metrics_incrementally_reuses_state(board_cfg, tmp_path):
+    # Given: a state file from an earlier run
+    cfg = dict(board_cfg, windows=[7], percentiles=[50, 85], chunk_size=0)
+    csv = tmp_path / "transitions.csv"
+    state_file = tmp_path / "leanStats.state"
+    day = pd.Timestamp("2023-09-15")
+    write_transitions(
+        csv,
+        [("T-1", "In Progress", day), ("T-1", "Done", day + pd.Timedelta(days=2))],
+    )
+    first, _ = compute_metrics_incrementally(csv, cfg, state_file)
+
+    # When: nothing was appended, then a line was appended, then the
+    # file was rewritten
+    unchanged, _ = compute_metrics_incrementally(csv, cfg, state_file)
+    write_transitions(
+        csv,
+        [("T-2", "In Progress", day), ("T-2", "Done", day + pd.Timedelta(days=4))],
+        header=False,
+        mode="a",
+    )
+    appended, _ = compute_metrics_incrementally(csv, cfg, state_file)
+    write_transitions(
+        csv,
+        [("T-3", "In Progress", day), ("T-3", "Done", day + pd.Timedelta(days=1))],
+    )
+    rewritten, _ = compute_metrics_incrementally(csv, cfg, state_file)
+
+    # Then: each run reflects the current file
+    pd.testing.assert_frame_equal(unchanged, first)
+    assert list(appended["ticket_id"]) == ["T-1", "T-2"]
+    assert list(appended["throughput"]) == [1, 2]
+    assert list(rewritten["ticket_id"]) == ["T-3"]
+
+
+def test_compute_metrics_incrementally_profiles_each_step(board_cfg, tmp_path):
+    # Given: a profiler, and a file which is appended to between runs
+    from stage_profile import StageProfiler
+
+    cfg = dict(board_cfg, windows=[7], percentiles=[50, 85], chunk_size=0)
+    csv = tmp_path / "transitions.csv"
+    state_file = tmp_path / "leanStats.state"
+    day = pd.Timestamp("2023-09-15")
+    write_transitions(csv, [("T-1", "In Progress", day)])
+    compute_metrics_incrementally(csv, cfg, state_file)
+    write_transitions(
+        csv, [("T-1", "Done", day + pd.Timedelta(days=2))], header=False, mode="a"
+    )
+
+    # When: running again through the profiler
+    profiler = StageProfiler("json")
+    compute_metrics_incrementally(csv, cfg, state_file, profiler)
+
+    # Then: each step is a stage of its own
+    assert [stage["stage"] for stage in profiler.stages] == [
+        "load_state",
+        "read_appended_lines",
+        "read_appended_transitions",
+        "reduce_transitions",
+        "combine_ticket_timestamps",
+        "update_ticket_metrics",
+        "update_period_metrics",
+        "save_state",
+    ]
+
+
+class PublishedMetrics:
+    # Stands in for MetricsServer, keeping what was published
+    def __init__(self):
+        self.published = []
+
+    def publish(self, ticket_metrics, periodic_metrics):
+        self.published.append((ticket_metrics, periodic_metrics))
+
+
+def test_watch_metrics_follows_the_input_file(board_cfg, tmp_path):
+    # Given: a file which is appended to between polls, then rewritten
+    cfg = dict(
+        board_cfg,
+        windows=[7],
+        percentiles=[50, 85],
+        chunk_size=0,
+        period="week",
+        relative_error=None,
+    )
+    csv = tmp_path / "transitions.csv"
+    day = pd.Timestamp("2023-09-15")
+    write_transitions(csv, [("T-1", "In Progress", day)])
+    appends = [
+        [("T-1", "Done", day + pd.Timedelta(days=2))],
+        [],
+        [("T-2", "In Progress", day), ("T-2", "Done", day + pd.Timedelta(days=9))],
+    ]
+    tail = TransitionsTail(csv, cfg)
+    expected = []
+
+    def poll():
+        transitions = tail.poll()
+        expected.append(full_metrics(csv, cfg))
+        if appends:
+            write_transitions(csv, appends.pop(0), header=False, mode="a")
+        else:
+            write_transitions(csv, [("T-3", "In Progress", day)])
+        return transitions
+
+    # When: watching it
+    server = PublishedMetrics()
+    watch_metrics(poll, cfg, server, interval=0, polls=5)
+
+    # Then: the metrics are published whenever something arrived, and
+    # are the same as when computing everything again
+    assert len(server.published) == 4
+    for (tickets, periods), (expected_tickets, expected_periods) in zip(
+        server.published, [expected[i] for i in [0, 1, 3, 4]]
+    ):
+        pd.testing.assert_frame_equal(tickets, expected_tickets)
+        pd.testing.assert_frame_equal(periods, expected_periods, check_dtype=False)
+    assert list(server.published[-1][0]["ticket_id"]) == ["T-3"]
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_compute_metrics_by_group_matches_separate_runs(board_cfg, tmp_path, jobs):
+    # Given: transitions of three projects, and a ticket without one
+    from generate_transitions import generate_transitions
+
+    cfg = dict(
+        board_cfg, todo_names=["Backlog", "To Do"], windows=[7], percentiles=[50]
+    )
+    data = generate_transitions(200, seed=5, projects=3)
+    orphan = data.loc[data["to_status"] == "Done", "ticket_id"].iloc[0]
+    data.loc[data["ticket_id"] == orphan, "project_key"] = None
+    data = data.astype({"ticket_id": "category", "project_key": "category"})
+
+    # When: computing metrics per project
+    tickets, weekly = compute_metrics_by_group(data, "project_key", cfg, jobs)
+
+    # Then: each project's rows match a run on just that project
+    assert list(tickets.columns[:2]) == ["project_key", "ticket_id"]
+    assert tickets["project_key"].unique().tolist() == ["P00", "P01", "P02", np.nan]
+    assert tickets.loc[tickets["project_key"].isna(), "ticket_id"].tolist() == [orphan]
+    for project in ["P00", "P01", "P02"]:
+        expected_tickets, expected_weekly = compute_metrics(
+            data[data["project_key"] == project], cfg
+        )
+        project_tickets = tickets[tickets["project_key"] == project]
+        assert project_tickets["ticket_id"].tolist() == (
+            expected_tickets["ticket_id"].tolist()
+        )
+        assert project_tickets["median_cycletime"].tolist() == (
+            expected_tickets["median_cycletime"].tolist()
+        )
+        pd.testing.assert_frame_equal(
+            weekly[weekly["project_key"] == project]
+            .drop(columns="project_key")
+            .reset_index(drop=True),
+            expected_weekly,
+        )
+
+
+def test_compute_metrics_by_group_profiles_each_step(board_cfg):
+    # Given: a profiler, and transitions of two projects
+    from generate_transitions import generate_transitions
+    from stage_profile import StageProfiler
+
+    cfg = dict(board_cfg, todo_names=["Backlog", "To Do"])
+    data = generate_transitions(20, seed=5, projects=2)
+    profiler = StageProfiler("json")
+
+    # When: computing metrics per project through it
+    compute_metrics_by_group(data, "project_key", cfg, 1, profiler)
+
+    # Then: splitting, computing and concatenating are stages of their
+    # own, and only the tables report rows
+    stages = {stage["stage"]: stage for stage in profiler.stages}
+    assert list(stages) == ["split_groups", "compute_groups", "concat_groups"]
+    assert [stage["rows"] for stage in stages.values()] == [None, None, None]
+
+
+def test_compute_metrics_by_group_unknown_column(board_cfg, sample_data_time):
+    data = pd.read_csv(sample_data_time)
+
+    with pytest.raises(ValueError, match="team"):
+        compute_metrics_by_group(data, "team", board_cfg)
+
+
+def test_lean_stats_answers_batched_queries_from_memory(
+    board_cfg, tmp_path, monkeypatch
+):
+    # Given: an engine over the transitions of three projects
+    from generate_transitions import generate_transitions
+    import leanStats
+
+    cfg = dict(
+        board_cfg,
+        todo_names=["Backlog", "To Do"],
+        windows=[7],
+        percentiles=[50, 85],
+        period="week",
+    )
+    csv = tmp_path / "transitions.csv"
+    generate_transitions(300, seed=2, projects=3).to_csv(csv, index=False)
+    engine = LeanStats(str(csv), cfg, extra_columns=["project_key"])
+
+    # When: asking for several windows, date ranges and groups at once
+    calls = []
+    compute = leanStats.compute_metrics_per_ticket
+    monkeypatch.setattr(
+        leanStats,
+        "compute_metrics_per_ticket",
+        lambda *args: calls.append(args[1]) or compute(*args),
+    )
+    everything, january, february, periods, per_project = engine.batch(
+        [
+            {"windows": [7, 30]},
+            {"windows": [7, 30], "start": "2023-01-01", "end": "2023-02-01"},
+            {"windows": [7, 30], "start": "2023-02-01", "end": "2023-03-01"},
+            {"table": "periods", "period": "month"},
+            {"table": "periods", "group_by": "project_key"},
+        ]
+    )
+
+    # Then: the per-ticket metrics are computed once for all ranges,
+    # and the ranges are cut out of them, lookback included
+    assert calls == [(7, 30)]
+    finished = everything["timestamp_end"]
+    pd.testing.assert_frame_equal(
+        january,
+        everything[(finished >= "2023-01-01") & (finished < "2023-02-01")].reset_index(
+            drop=True
+        ),
+    )
+    assert len(january) and len(february)
+    assert (february["timestamp_end"] >= "2023-02-01").all()
+
+    # And: the answers match the functions which compute them from scratch
+    data = read_transitions(str(csv), cfg, extra_columns=["project_key"])
+    tickets, weekly = compute_metrics(data, cfg)
+    pd.testing.assert_frame_equal(engine.query(), tickets)
+    pd.testing.assert_frame_equal(engine.metrics()[1], weekly)
+    pd.testing.assert_frame_equal(
+        periods, compute_metrics_per_period(tickets, "month", [50, 85])
+    )
+    pd.testing.assert_frame_equal(
+        per_project, compute_metrics_by_group(data, "project_key", cfg, 1)[1]
+    )
+
+    # And: handing out tables does not change what the engine holds
+    everything["median_cycletime_7d"] = 0
+    assert not (engine.query(windows=[7, 30])["median_cycletime_7d"] == 0).all()
+    assert calls.count((7, 30)) == 1
+
+
+def test_lean_stats_from_a_config_or_just_the_board(board_cfg, tmp_path):
+    # Given: the sample data, and a config file for it
+    file_path = os.path.join(os.path.dirname(__file__), "..", "data", "sample.csv")
+    config_file = tmp_path / "sample.config"
+    config_file.write_text(
+        f"[SYSTEM]\ninput_csv_file = {file_path}\n\n"
+        "[BOARD]\nTODO = To Do, Backlog\nWIP = In Progress, Review & QA, Review\n"
+        "DONE = Done\n\n[METRICS]\nWINDOWS = 7, 30\n"
+    )
+    board = {name: board_cfg[name] for name in board_cfg if name.endswith("_names")}
+
+    # When: building engines from the config file, and from the board alone
+    configured = LeanStats.from_config(str(config_file))
+    board_only = LeanStats(file_path, board)
+
+    # Then: the config's settings are used, and the defaults otherwise
+    tickets, _ = configured.metrics()
+    assert "median_cycletime_30d" in tickets.columns
+    pd.testing.assert_frame_equal(
+        board_only.metrics()[0],
+        configured.ticket_metrics(windows=[7], percentiles=[50, 85]),
+    )
+    with pytest.raises(ValueError, match="does not exist"):
+        LeanStats.from_config(str(tmp_path / "missing.config"))
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_read_input_files_keeps_overlapping_transitions_once(board_cfg, tmp_path, jobs):
+    # Given: the sample data split over three exports which overlap,
+    # with a file in the directory which is not a CSV
+    file_path = os.path.join(os.path.dirname(__file__), "..", "data", "sample.csv")
+    lines = open(file_path).read().splitlines()
+    header, rows = lines[0], lines[1:]
+    for name, part in [("a", rows[:8]), ("b", rows[5:14]), ("c", rows[12:])]:
+        (tmp_path / f"{name}.csv").write_text("\n".join([header] + part) + "\n")
+    (tmp_path / "notes.txt").write_text("not transitions\n")
+
+    # When: reading the directory, and a glob of the same files
+    data = read_input_files(input_files(str(tmp_path)), board_cfg, jobs)
+    globbed = read_input_files(input_files(str(tmp_path / "*.csv")), board_cfg, jobs)
+
+    # Then: every transition is there once, in the order of the files,
+    # and ticket ids and statuses are still categoricals
+    expected = read_transitions(file_path, board_cfg)
+    expected = expected[expected.notna().all(axis=1)].reset_index(drop=True)
+    pd.testing.assert_frame_equal(data, expected, check_categorical=False)
+    pd.testing.assert_frame_equal(globbed, data)
+    assert isinstance(data["ticket_id"].dtype, pd.CategoricalDtype)
+
+    # And: streaming the files gives the same tickets as a single read
+    pd.testing.assert_frame_equal(
+        stream_ticket_timestamps(input_files(str(tmp_path)), board_cfg, 3),
+        extract_ticket_timestamps(expected, board_cfg),
+        check_categorical=False,
+    )
@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+
+import importlib.util
+import json
+import pandas as pd
+import pytest
+from metrics_output import check_output_format, output_path, write_metrics
+
+
+@pytest.fixture
+def ticket_metrics():
+    return pd.DataFrame(
+        {
+            "ticket_id": pd.Categorical(["T-1", "T-2", "T-3", "T-4", "T-5"]),
+            "timestamp_end": pd.to_datetime(
+                ["2023-01-02 00:00", "2023-01-03 00:00", "2023-01-03 14:30"]
+                + ["2023-01-05 09:00", None]
+            ),
+            "cycletime": pd.array([1, 2, 3, 4, None], dtype="Int32"),
+        }
+    )
+
+
+@pytest.mark.parametrize("chunk_rows", [2, 1000])
+def test_write_metrics_csv_in_chunks(ticket_metrics, tmp_path, chunk_rows):
+    # When writing the metrics as CSV, a few rows at a time
+    path = tmp_path / "metrics.csv"
+    write_metrics(ticket_metrics, "csv", path, chunk_rows)
+
+    # Then there is one header, and every timestamp has the same format
+    lines = path.read_text().splitlines()
+    assert lines[0] == "ticket_id,timestamp_end,cycletime"
+    assert lines[1:] == [
+        "T-1,2023-01-02 00:00:00,1",
+        "T-2,2023-01-03 00:00:00,2",
+        "T-3,2023-01-03 14:30:00,3",
+        "T-4,2023-01-05 09:00:00,4",
+        "T-5,,",
+    ]
+
+
+def test_write_metrics_jsonl_to_stdout(ticket_metrics, capsys):
+    # When writing JSON lines without a path
+    write_metrics(ticket_metrics, "jsonl", chunk_rows=2)
+
+    # Then there is an object per row on stdout, with nulls for NA
+    rows = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert len(rows) == 5
+    assert rows[2] == {
+        "ticket_id": "T-3",
+        "timestamp_end": "2023-01-03T14:30:00",
+        "cycletime": 3,
+    }
+    assert rows[4]["timestamp_end"] is None and rows[4]["cycletime"] is None
+
+
+def test_check_output_format():
+    assert output_path("out/report", "tickets", "jsonl") == "out/report.tickets.jsonl"
+    assert output_path(None, "tickets", "csv") is None
+    with pytest.raises(ValueError):
+        check_output_format("xml")
+    # Parquet is binary, so it needs files
+    with pytest.raises(ValueError):
+        check_output_format("parquet")
+
+
+def test_write_metrics_parquet(ticket_metrics, tmp_path):
+    if importlib.util.find_spec("pyarrow") is None:
+        # Then asking for parquet fails up front
+        with pytest.raises(ValueError, match="pyarrow"):
+            check_output_format("parquet", str(tmp_path / "report"))
+        return
+
+    # When writing parquet a couple of rows at a time
+    path = tmp_path / "metrics.parquet"
+    write_metrics(ticket_metrics, "parquet", path, chunk_rows=2)
+
+    # Then it reads back as the same table
+    pd.testing.assert_frame_equal(pd.read_parquet(path), ticket_metrics)
@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+
+import json
+import urllib.error
+import urllib.request
+import pandas as pd
+import pytest
+from metrics_server import MetricsServer
+
+
+@pytest.fixture
+def server():
+    server = MetricsServer().start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def get(server, path):
+    try:
+        with urllib.request.urlopen(server.url + path) as response:
+            return response.status, response.read().decode()
+    except urllib.error.HTTPError as e:
+        return e.code, e.read().decode()
+
+
+def test_metrics_server_serves_published_metrics(server):
+    # Given nothing published yet
+    assert get(server, "/metrics")[0] == 503
+
+    # When metrics are published
+    tickets = pd.DataFrame(
+        {
+            "ticket_id": ["T-1", "T-2", "T-3"],
+            "timestamp_start": pd.to_datetime(["2023-01-01", "2023-01-02", None]),
+            "timestamp_end": pd.to_datetime(["2023-01-02", "2023-01-05", None]),
+            "cycletime": pd.array([2, 4, None], dtype="Int32"),
+            "p85.5_cycletime": pd.array([2, 4, None], dtype="Int32"),
+            "throughput": pd.array([1, 2, 0], dtype="Int32"),
+        }
+    )
+    periods = pd.DataFrame(
+        {
+            "startdate": pd.to_datetime(["2022-12-26", "2023-01-02"]),
+            "enddate": pd.to_datetime(["2023-01-01", "2023-01-08"]),
+            "cycletime_p85.5": pd.array([None, 4], dtype="Int32"),
+            "throughput": pd.array([None, 2], dtype="Int32"),
+        }
+    )
+    server.publish(tickets, periods)
+
+    # Then the current values are served as Prometheus gauges
+    status, text = get(server, "/metrics")
+    assert status == 200
+    lines = text.splitlines()
+    assert "leanstats_tickets_finished 2" in lines
+    assert "leanstats_tickets_in_progress 1" in lines
+    assert "leanstats_p85_5_cycletime 4" in lines
+    assert "leanstats_period_cycletime_p85_5 4" in lines
+    assert "# TYPE leanstats_throughput gauge" in lines
+
+    # And as JSON, along with every period
+    status, text = get(server, "/metrics.json")
+    body = json.loads(text)
+    assert body["current"]["throughput"] == 2
+    assert [p["throughput"] for p in body["periods"]] == [None, 2]
+    assert body["periods"][1]["startdate"] == "2023-01-02T00:00:00"
+
+    # And anything else is not found
+    assert get(server, "/tickets")[0] == 404
@@ -0,0 +1,76 @@
+import os
+import time
+
+import pandas as pd
+import pytest
+
+from parse_cache import cache_key, load_transitions, store_transitions, evict
+
+
+@pytest.fixture
+def transitions():
+    return pd.DataFrame(
+        {
+            "ticket_id": ["T-1", "T-1", "T-2", None],
+            "to_status": ["In Progress", "Done", "In Progress", "Done"],
+            "changed_at": pd.to_datetime(
+                ["2023-09-15 00:01", "2023-09-17 00:02", None, "2023-09-20 00:02"]
+            ),
+        }
+    ).astype({"ticket_id": "category", "to_status": "category"})
+
+
+@pytest.fixture
+def cfg():
+    return {
+        "todo_names": ["To Do"],
+        "wip_names": ["In Progress"],
+        "done_names": ["Done"],
+        "ignore_names": [],
+        "timezone": "UTC",
+    }
+
+
+def test_store_and_load_transitions(tmp_path, transitions):
+    # Given: a parsed transition table in the cache
+    store_transitions(tmp_path, "key", transitions)
+
+    # When: loading it back
+    loaded = load_transitions(tmp_path, "key")
+
+    # Then: it has the same contents, including missing values
+    pd.testing.assert_frame_equal(loaded, transitions, check_dtype=False)
+    assert load_transitions(tmp_path, "other key") is None
+
+
+def test_cache_key_follows_file_and_config(tmp_path, cfg):
+    # Given: an input file
+    path = tmp_path / "export.csv"
+    path.write_text("ticket_id,to_status,changed_at\n")
+    key = cache_key(path, cfg)
+    content_key = cache_key(path, cfg, hash_content=True)
+
+    # Then: the key is stable, and changes with the board config...
+    assert cache_key(path, cfg) == key
+    assert cache_key(path, dict(cfg, done_names=["Closed"])) != key
+
+    # ...and when the file is modified
+    path.write_text("ticket_id,to_status,changed_at\nT-1,Done,15/09/2023\n")
+    assert cache_key(path, cfg) != key
+    assert cache_key(path, cfg, hash_content=True) != content_key
+
+
+def test_evict_removes_least_recently_used(tmp_path, transitions):
+    # Given: three cache entries, of which the oldest was used lately
+    for key in ["a", "b", "c"]:
+        store_transitions(tmp_path, key, transitions)
+        past = time.time() - 100 + ord(key)
+        os.utime(tmp_path / key, (past, past))
+    load_transitions(tmp_path, "a")
+    entry_size = sum(f.stat().st_size for f in (tmp_path / "a").iterdir())
+
+    # When: capping the cache at two entries
+    evict(tmp_path, 2 * entry_size)
+
+    # Then: the least recently used entry is gone
+    assert sorted(os.listdir(tmp_path)) == ["a", "c"]
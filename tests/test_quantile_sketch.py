@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+
+import numpy as np
+import pytest
+from quantile_sketch import QuantileSketch, counts_quantiles, grouped_counts
+
+
+def test_quantile_sketch_within_relative_error():
+    # Given: a million values spread over several orders of magnitude
+    rng = np.random.default_rng(0)
+    values = 1 + rng.lognormal(3, 2, 1_000_000)
+    sketch = QuantileSketch(0.01).add(values)
+
+    # Then: every quantile is within 1% of the exact one, and the
+    # sketch holds far fewer buckets than values
+    assert sketch.count == len(values)
+    assert len(sketch.counts) < 2000
+    for quantile in [0.01, 0.5, 0.85, 0.99, 1]:
+        exact = np.quantile(values, quantile)
+        assert abs(sketch.quantile(quantile) - exact) <= 0.01 * exact
+
+
+def test_quantile_sketch_merge_matches_union():
+    # Given: sketches of two partitions of the values
+    rng = np.random.default_rng(1)
+    first, second = rng.integers(-50, 5000, 1000), rng.integers(0, 300, 700)
+    merged = QuantileSketch(0.02).add(first).merge(QuantileSketch(0.02).add(second))
+
+    # Then: merging them is the same as sketching everything at once
+    union = QuantileSketch(0.02).add(np.concatenate([first, second]))
+    assert merged.offset == union.offset
+    assert merged.counts.tolist() == union.counts.tolist()
+
+    # And: sketches with different error bounds do not mix
+    with pytest.raises(ValueError):
+        merged.merge(QuantileSketch(0.01))
+
+
+def test_counts_quantiles_whole_numbers_are_exact():
+    # Given: whole numbers of days in a few groups, one of them empty
+    rng = np.random.default_rng(2)
+    groups = rng.integers(0, 3, 600)
+    groups[groups == 1] = 0
+    values = rng.integers(0, 45, 600)
+    gamma = (1 + 0.01) / (1 - 0.01)
+
+    # When: reading quantiles from the bucket counts of each group
+    counts, offset = grouped_counts(groups, values, 3, gamma)
+    result = counts_quantiles(counts, [0.5, 0.85], offset, gamma, whole_numbers=True)
+
+    # Then: they are the exact quantiles, and NaN without values
+    for group in [0, 2]:
+        exact = np.quantile(values[groups == group], [0.5, 0.85])
+        assert result[group].tolist() == pytest.approx(exact.tolist())
+    assert np.isnan(result[1]).all()
+
+
+def test_quantile_sketch_empty_and_invalid():
+    assert np.isnan(QuantileSketch().quantile(0.5))
+    assert QuantileSketch().add([np.nan]).count == 0
+    with pytest.raises(ValueError):
+        QuantileSketch(1.5)
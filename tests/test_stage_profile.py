@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+
+import json
+import os
+from io import StringIO
+import numpy as np
+import pandas as pd
+import pytest
+from stage_profile import NullProfiler, StageProfiler, make_profiler
+
+
+def test_make_profiler_is_a_no_op_by_default():
+    # Given no profiling options
+    profiler = make_profiler()
+
+    # Then stages are just called
+    assert isinstance(profiler, NullProfiler)
+    assert profiler.run("add", lambda a, b: a + b, 1, b=2) == 3
+
+
+def test_stage_profiler_records_stages():
+    # Given a profiler, and three stages run through it
+    profiler = StageProfiler("json")
+    rows = profiler.run("build", lambda: np.arange(10))
+    profiler.run("count", len, rows)
+    profiler.run("split", lambda: (rows[:5], rows[5:]))
+
+    # When reporting as JSON lines
+    out = StringIO()
+    profiler.report(out)
+
+    # Then there is a line per stage, with the rows of those which
+    # produced a table or an array
+    stages = [json.loads(line) for line in out.getvalue().splitlines()]
+    assert [s["stage"] for s in stages] == ["build", "count", "split"]
+    assert [s["rows"] for s in stages] == [10, None, None]
+    assert [s["size_mb"] is None for s in stages] == [False, True, True]
+    assert all(s["wall_s"] >= 0 and s["cpu_s"] >= 0 for s in stages)
+    assert all(s["peak_rss_mb"] > 0 for s in stages)
+
+
+def test_stage_profiler_reports_table_sizes():
+    # Given a stage producing a table of 1M float64 values
+    profiler = StageProfiler("json")
+    profiler.run("table", lambda: pd.DataFrame({"x": np.zeros(2**20)}))
+
+    # Then its size is about 8MB
+    assert profiler.stages[0]["size_mb"] == pytest.approx(8, rel=0.01)
+
+
+def test_stage_profiler_dumps_profiles(tmp_path):
+    # Given a profiler with a dump prefix
+    prefix = str(tmp_path / "run")
+    profiler = StageProfiler("table", dump_prefix=prefix)
+    profiler.run("allocate", lambda: bytearray(1 << 20))
+    profiler.close()
+
+    # When reporting as a table
+    out = StringIO()
+    profiler.report(out)
+
+    # Then traced memory is in the table, and both dumps are written
+    lines = out.getvalue().splitlines()
+    assert "traced MB" in lines[0]
+    assert lines[1].split()[0] == "allocate"
+    assert float(lines[1].split()[-1]) >= 1.0
+    assert os.path.isfile(f"{prefix}.prof")
+    assert os.path.isfile(f"{prefix}.tracemalloc")
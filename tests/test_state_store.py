@@ -0,0 +1,46 @@
+from state_store import load_state, save_state, read_appended_lines
+
+
+def test_read_appended_lines_only_returns_new_complete_lines(tmp_path):
+    # Given: a file whose last line is still being written
+    path = tmp_path / "export.csv"
+    path.write_bytes(b"header\nline 1\nline 2\nline 3 (partial")
+
+    # When: reading it, then reading again after it was appended to
+    data, offset, checksum = read_appended_lines(path)
+    with open(path, "ab") as f:
+        f.write(b")\nline 4\n")
+    more, new_offset, _ = read_appended_lines(path, offset, checksum)
+
+    # Then: each read returns whole lines, and nothing is read twice
+    assert data == b"header\nline 1\nline 2\n"
+    assert more == b"line 3 (partial)\nline 4\n"
+    assert new_offset == path.stat().st_size
+
+
+def test_read_appended_lines_detects_rewritten_file(tmp_path):
+    # Given: a file which was read once
+    path = tmp_path / "export.csv"
+    path.write_bytes(b"header\nline 1\nline 2\n")
+    _, offset, checksum = read_appended_lines(path)
+
+    # When: it is rewritten with the same size, or truncated
+    path.write_bytes(b"header\nline X\nline 2\n")
+    rewritten = read_appended_lines(path, offset, checksum)
+    path.write_bytes(b"header\n")
+    truncated = read_appended_lines(path, offset, checksum)
+
+    # Then: neither is mistaken for an append
+    assert rewritten is None
+    assert truncated is None
+
+
+def test_load_state_checks_fingerprint(tmp_path):
+    # Given: a saved state
+    state_file = tmp_path / "leanStats.state"
+    save_state(state_file, {"fingerprint": {"windows": [7]}, "offset": 42})
+
+    # When/Then: it is only used with the same fingerprint
+    assert load_state(state_file, {"windows": [7]})["offset"] == 42
+    assert load_state(state_file, {"windows": [7, 14]}) is None
+    assert load_state(tmp_path / "missing.state", {"windows": [7]}) is None
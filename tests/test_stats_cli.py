@@ -0,0 +1,231 @@
+#!/usr/bin/env python
+
+import os
+import subprocess
+import sys
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+
+
+def run_script(script, *args):
+    # Run a script as the command line would, and report which of the
+    # heavy modules it imported
+    code = (
+        "import runpy, sys\n"
+        f"sys.argv = [{script!r}] + {list(args)!r}\n"
+        "try:\n"
+        f"    runpy.run_path({os.path.join(SRC_DIR, script)!r}, run_name='__main__')\n"
+        "finally:\n"
+        "    heavy = sorted({'jira', 'numpy', 'pandas'} & set(sys.modules))\n"
+        "    print('imported:', ','.join(heavy), file=sys.stderr)\n"
+    )
+    return subprocess.run(
+        [sys.executable, "-c", code],
+        capture_output=True,
+        text=True,
+        cwd=SRC_DIR,
+        env=dict(os.environ, PYTHONPATH=SRC_DIR),
+    )
+
+
+def test_help_and_config_errors_do_not_import_pandas(tmp_path):
+    # Given a config with a mistake in it
+    config_file = tmp_path / "bad.config"
+    config_file.write_text("[METRICS]\nWINDOWS = 7, 0\n")
+
+    # When asking for help, or running with a missing or broken config
+    help = run_script("stats_cli.py", "--help")
+    missing = run_script("stats_cli.py", "-c", str(tmp_path / "missing.config"))
+    broken = run_script("stats_cli.py", "-c", str(config_file))
+    jira_help = run_script("jira_link.py", "--help")
+    forecast_help = run_script("forecast.py", "--help")
+    forecast_broken = run_script("forecast.py", "-c", str(config_file), "--items", "9")
+    flow_help = run_script("flow_metrics.py", "--help")
+    flow_broken = run_script("flow_metrics.py", "-c", str(config_file))
+
+    # Then the answer comes without loading pandas, numpy or jira
+    assert help.returncode == 0 and "--config-file" in help.stdout
+    assert missing.returncode == 1 and "does not exist" in missing.stdout
+    assert broken.returncode == 1 and "positive" in broken.stdout
+    assert jira_help.returncode == 0
+    assert forecast_help.returncode == 0 and flow_help.returncode == 0
+    assert forecast_broken.returncode == 1 and "positive" in forecast_broken.stdout
+    assert flow_broken.returncode == 1 and "positive" in flow_broken.stdout
+    for result in [
+        help,
+        missing,
+        broken,
+        jira_help,
+        forecast_help,
+        forecast_broken,
+        flow_help,
+        flow_broken,
+    ]:
+        assert result.stderr.strip().endswith("imported:")
+
+
+def test_mock_jira_run_does_not_import_jira(tmp_path):
+    # Given a config reading mock Jira data
+    mock_data = tmp_path / "mock.csv"
+    mock_data.write_text(
+        "ticket_id,from_status,to_status,changed_at\n"
+        "A-1,To Do,In Progress,2024-01-02 10:00:00\n"
+    )
+    config_file = tmp_path / "mock.config"
+    config_file.write_text(f"[JIRA]\nMOCK_JIRA_DATA = {mock_data}\n")
+
+    # When fetching the tickets
+    result = run_script("jira_link.py", "-c", str(config_file))
+
+    # Then the Jira client is never imported
+    assert result.returncode == 0 and "A-1" in result.stdout
+    assert result.stderr.strip().endswith("imported: numpy,pandas")
+
+
+def test_metrics_are_computed_once_the_config_is_checked(tmp_path):
+    # Given a valid config and input file
+    data = tmp_path / "data.csv"
+    data.write_text(
+        "ticket_id,to_status,changed_at\n"
+        "A-1,In Progress,2024-01-01 10:00:00\n"
+        "A-1,Done,2024-01-03 10:00:00\n"
+    )
+    config_file = tmp_path / "ok.config"
+    config_file.write_text(
+        f"[SYSTEM]\ninput_csv_file = {data}\n\n"
+        "[BOARD]\nTODO = To Do\nWIP = In Progress\nDONE = Done\n"
+    )
+
+    # When running leanStats, the old way too
+    for script in ["stats_cli.py", "leanStats.py"]:
+        result = run_script(script, "-c", str(config_file), "--output-format", "csv")
+
+        # Then the metrics come out as usual
+        assert result.returncode == 0, result.stdout + result.stderr
+        assert "A-1" in result.stdout and "cycletime" in result.stdout
+
+
+def test_date_range_and_projects_need_a_store(tmp_path):
+    # Given a valid config without a transition store
+    data = tmp_path / "data.csv"
+    data.write_text("ticket_id,to_status,changed_at\n")
+    config_file = tmp_path / "ok.config"
+    config_file.write_text(f"[SYSTEM]\ninput_csv_file = {data}\n")
+
+    # When asking for a date range, or for a date that is not one
+    no_store = run_script(
+        "stats_cli.py", "-c", str(config_file), "--since", "2024-01-01"
+    )
+    bad_date = run_script(
+        "stats_cli.py", "-c", str(config_file), "--store", "s.db", "--until", "May"
+    )
+
+    # Then both are refused before pandas is loaded
+    assert no_store.returncode == 1 and "transition store" in no_store.stdout
+    assert bad_date.returncode == 1 and "2024-01-31" in bad_date.stdout
+    for result in [no_store, bad_date]:
+        assert result.stderr.strip().endswith("imported:")
+
+
+def test_metrics_from_a_transition_store(tmp_path):
+    # Given tickets of two projects, finished in January and February
+    data = tmp_path / "data.csv"
+    data.write_text(
+        "ticket_id,to_status,changed_at,project_key\n"
+        "A-1,In Progress,2024-01-01 10:00:00,A\n"
+        "A-1,Done,2024-01-03 10:00:00,A\n"
+        "A-2,In Progress,2024-02-01 10:00:00,A\n"
+        "A-2,Done,2024-02-03 10:00:00,A\n"
+        "B-1,In Progress,2024-02-01 10:00:00,B\n"
+        "B-1,Done,2024-02-05 10:00:00,B\n"
+    )
+    config_file = tmp_path / "ok.config"
+    config_file.write_text(
+        f"[SYSTEM]\ninput_csv_file = {data}\n"
+        f"transition_store = {tmp_path / 'store.sqlite'}\n\n"
+        "[BOARD]\nTODO = To Do\nWIP = In Progress\nDONE = Done\n"
+    )
+
+    # When asking for February, in project A
+    args = ["-c", str(config_file), "--output-format", "csv"]
+    result = run_script(
+        "stats_cli.py", *args, "--since", "2024-02-01", "--project", "A"
+    )
+
+    # Then only its ticket finished in February is reported
+    assert result.returncode == 0, result.stdout + result.stderr
+    assert "A-2" in result.stdout
+    assert "A-1" not in result.stdout and "B-1" not in result.stdout
+
+
+def test_state_file_with_a_directory_of_one_file(tmp_path):
+    # Given an input directory with a single export in it
+    exports = tmp_path / "exports"
+    exports.mkdir()
+    (exports / "data.csv").write_text(
+        "ticket_id,to_status,changed_at\n"
+        "A-1,In Progress,2024-01-01 10:00:00\n"
+        "A-1,Done,2024-01-03 10:00:00\n"
+    )
+    config_file = tmp_path / "ok.config"
+    config_file.write_text(
+        f"[SYSTEM]\ninput_csv_file = {exports}\n"
+        f"state_file = {tmp_path / 'state'}\n\n"
+        "[BOARD]\nTODO = To Do\nWIP = In Progress\nDONE = Done\n"
+    )
+
+    # When keeping state between runs, by directory or by pattern
+    args = ["-c", str(config_file), "--output-format", "csv"]
+    first = run_script("stats_cli.py", *args)
+    second = run_script("stats_cli.py", *args, "--state-file", str(tmp_path / "s2"))
+    config_file.write_text(
+        config_file.read_text().replace(str(exports), str(exports / "*.csv"))
+    )
+    globbed = run_script("stats_cli.py", *args)
+
+    # Then the file in it is the one read
+    for result in [first, second, globbed]:
+        assert result.returncode == 0, result.stdout + result.stderr
+        assert "A-1" in result.stdout
+
+
+def test_date_range_only_reports_whole_periods(tmp_path):
+    # Given tickets finished over three weeks, starting on Monday 1 January
+    rows = [("A-1", "01-02"), ("A-2", "01-04"), ("A-3", "01-08")]
+    rows += [("A-4", "01-10"), ("A-5", "01-16")]
+    data = tmp_path / "data.csv"
+    data.write_text(
+        "ticket_id,to_status,changed_at\n"
+        + "".join(
+            f"{ticket},In Progress,2024-01-01 09:00:00\n"
+            f"{ticket},Done,2024-{day} 10:00:00\n"
+            for ticket, day in rows
+        )
+    )
+    config_file = tmp_path / "ok.config"
+    config_file.write_text(
+        f"[SYSTEM]\ninput_csv_file = {data}\n"
+        f"transition_store = {tmp_path / 'store.sqlite'}\n\n"
+        "[BOARD]\nTODO = To Do\nWIP = In Progress\nDONE = Done\n"
+    )
+
+    # When the date range starts on a Wednesday and ends on a Tuesday
+    result = run_script(
+        "stats_cli.py",
+        *["-c", str(config_file), "--output-format", "csv"],
+        *["--since", "2024-01-03", "--until", "2024-01-16"],
+    )
+    assert result.returncode == 0, result.stdout + result.stderr
+    tickets, periods = result.stdout.split("\n\n")
+
+    # Then the tickets are those finished in the range, but only the
+    # week which lies entirely in it is reported, with all its tickets
+    assert [line.split(",")[0] for line in tickets.splitlines()[1:]] == [
+        "A-2",
+        "A-3",
+        "A-4",
+    ]
+    periods = periods.splitlines()
+    assert len(periods) == 2
+    assert periods[1].startswith("2024-01-08 00:00:00,2024-01-14 00:00:00,")
+    assert periods[1].endswith(",2")
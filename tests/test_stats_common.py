@@ -0,0 +1,30 @@
+#!/usr/bin/env python
+
+import pytest
+from stats_common import input_files
+
+
+def test_input_files(tmp_path):
+    # Given: monthly exports in a directory per project
+    for project in ["A", "B"]:
+        (tmp_path / project).mkdir()
+        for month in ["2024-02", "2024-01"]:
+            (tmp_path / project / f"{month}.csv").write_text("")
+
+    # Then: a directory, a glob or a single file give their files in
+    # name order
+    assert input_files(str(tmp_path / "A")) == [
+        str(tmp_path / "A" / "2024-01.csv"),
+        str(tmp_path / "A" / "2024-02.csv"),
+    ]
+    assert input_files(str(tmp_path / "**" / "2024-01.csv")) == [
+        str(tmp_path / "A" / "2024-01.csv"),
+        str(tmp_path / "B" / "2024-01.csv"),
+    ]
+    assert input_files(str(tmp_path / "B" / "2024-02.csv")) == [
+        str(tmp_path / "B" / "2024-02.csv")
+    ]
+    with pytest.raises(ValueError, match="does not exist"):
+        input_files(str(tmp_path / "C.csv"))
+    with pytest.raises(ValueError, match="No CSV files"):
+        input_files(str(tmp_path / "*" / "2023-*.csv"))
@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+
+import configparser
+
+import pytest
+from stats_config import parse_percentiles, parse_timezone, parse_windows, read_config
+
+
+def test_parse_windows_and_percentiles():
+    assert parse_windows("7, 14,30 ,90") == [7, 14, 30, 90]
+    assert parse_percentiles("50,85, 99.5") == [50, 85, 99.5]
+
+    with pytest.raises(ValueError, match="positive"):
+        parse_windows("7, 0")
+    with pytest.raises(ValueError, match="comma-separated"):
+        parse_windows("7; 14")
+    with pytest.raises(ValueError, match="between 0 and 100"):
+        parse_percentiles("50, 150")
+    with pytest.raises(ValueError, match="repeat"):
+        parse_windows("7, 30, 7")
+    with pytest.raises(ValueError, match="repeat"):
+        parse_percentiles("50, 85, 50.0")
+
+
+def test_parse_timezone():
+    assert parse_timezone("Europe/Stockholm") == "Europe/Stockholm"
+    assert parse_timezone("+02:00") == "+02:00"
+    with pytest.raises(ValueError, match="Unknown timezone"):
+        parse_timezone("Mars/Olympus_Mons")
+
+
+def test_read_config():
+    # Given a config with a few settings, one of them overridden
+    config = configparser.ConfigParser()
+    config.read_string(
+        "[SYSTEM]\nTIMEZONE = Europe/Stockholm\n\n"
+        "[BOARD]\nWIP = In Progress, Review\n\n"
+        "[METRICS]\nWINDOWS = 7, 30\nPERIOD = Month\n"
+    )
+
+    # When reading it
+    cfg = read_config(config, windows="14", percentiles=None)
+
+    # Then overrides win, the rest comes from the config or the defaults
+    assert cfg["wip_names"] == ["In Progress", "Review"]
+    assert cfg["timezone"] == "Europe/Stockholm"
+    assert cfg["windows"] == [14]
+    assert cfg["percentiles"] == [50, 85]
+    assert cfg["period"] == "month"
+    assert cfg["week_start"] == "MON"
+    assert cfg["output_format"] == "table"
+
+    # And mistakes are reported
+    config.set("METRICS", "PERIOD", "fortnight")
+    with pytest.raises(ValueError, match="Period must be one of"):
+        read_config(config)
@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+
+import pandas as pd
+import pytest
+import transition_store
+from generate_transitions import DEFAULT_STATUSES, generate_transitions
+from leanStats import extract_ticket_timestamps, read_transitions
+from transition_store import (
+    load_files,
+    open_store,
+    query_ticket_timestamps,
+    store_ticket_timestamps,
+)
+
+cfg = {
+    "todo_names": ["Backlog", "To Do"],
+    "wip_names": ["In Progress", "Review"],
+    "done_names": ["Done"],
+    "ignore_names": [],
+    "timezone": "UTC",
+}
+
+
+@pytest.fixture
+def export(tmp_path):
+    # Transitions of three projects, with rework and unfinished tickets
+    path = tmp_path / "transitions.csv"
+    generate_transitions(300, seed=1, projects=3, days=120).to_csv(path, index=False)
+    return str(path)
+
+
+def expected(path, since=None, until=None, projects=None):
+    # The ticket timestamps leanStats computes in memory, filtered the
+    # way the store is asked to
+    data = read_transitions(path, cfg, extra_columns=["project_key"])
+    if projects:
+        data = data[data["project_key"].isin(projects)]
+    result = extract_ticket_timestamps(data, cfg)
+    result = result[result["timestamp_start"].notna()]
+    if since is not None:
+        result = result[result["timestamp_end"] >= pd.Timestamp(since)]
+    if until is not None:
+        result = result[result["timestamp_end"] < pd.Timestamp(until)]
+    return normalized(result)
+
+
+def normalized(result):
+    return (
+        result.astype(
+            {
+                "ticket_id": str,
+                "timestamp_start": "datetime64[ns]",
+                "timestamp_end": "datetime64[ns]",
+            }
+        )
+        .sort_values("ticket_id")
+        .reset_index(drop=True)
+    )
+
+
+@pytest.mark.parametrize(
+    "since, until, projects",
+    [
+        (None, None, None),
+        ("2023-03-01", None, None),
+        (None, "2023-03-01", ["P01"]),
+        ("2023-02-01", "2023-04-01", ["P00", "P02"]),
+    ],
+)
+def test_query_matches_in_memory_timestamps(export, tmp_path, since, until, projects):
+    # Given: the export loaded into a store
+    connection = open_store(str(tmp_path / "store.sqlite"), cfg)
+    load_files(connection, [export], cfg)
+
+    # When: asking the store for a date range and projects
+    result = query_ticket_timestamps(connection, cfg, since, until, projects)
+
+    # Then: the tickets and timestamps are those computed in memory
+    pd.testing.assert_frame_equal(
+        normalized(result), expected(export, since, until, projects)
+    )
+    assert result["ticket_id"].dtype == "category"
+
+
+def test_files_are_loaded_a_chunk_at_a_time(export, tmp_path, monkeypatch):
+    # Given: chunks much smaller than the export
+    monkeypatch.setattr(transition_store, "LOAD_CHUNK_ROWS", 7)
+    connection = open_store(str(tmp_path / "store.sqlite"), cfg)
+
+    # When: loading it
+    load_files(connection, [export], cfg)
+
+    # Then: every ticket is there, and so are the indexes
+    pd.testing.assert_frame_equal(
+        normalized(query_ticket_timestamps(connection, cfg)), expected(export)
+    )
+    indexes = connection.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL"
+    ).fetchall()
+    assert sorted(name for (name,) in indexes) == sorted(transition_store.INDEXES)
+
+
+def test_unchanged_files_are_not_loaded_again(export, tmp_path):
+    # Given: a store with the export in it
+    store = str(tmp_path / "store.sqlite")
+    connection = open_store(store, cfg)
+    added = load_files(connection, [export], cfg)
+    connection.close()
+
+    # When: opening the store again and loading the same file
+    connection = open_store(store, cfg)
+    again = load_files(connection, [export], cfg)
+
+    # Then: nothing is added the second time
+    assert added > 0 and again == 0
+
+    # And: transitions appended to the file are added once
+    with open(export, "a") as f:
+        f.write("Story,P00-1000,To Do,In Progress,2023-06-01 10:00:00,P00\n")
+        f.write("Story,P00-1000,In Progress,Done,2023-06-02 10:00:00,P00\n")
+    assert load_files(connection, [export], cfg) == 2
+    connection.close()
+
+
+def test_store_ticket_timestamps_keeps_the_lookback(export, tmp_path):
+    # Given: a date range, with a 30 day window
+    run_cfg = dict(cfg, windows=[7, 30], since="2023-03-01", until="2023-04-01")
+
+    # When: loading and querying in one go
+    result = store_ticket_timestamps(str(tmp_path / "s.sqlite"), [export], run_cfg)
+
+    # Then: tickets finished in the 30 days before the range are there
+    # too, for the windows of the tickets in it
+    pd.testing.assert_frame_equal(
+        normalized(result), expected(export, "2023-01-30", "2023-04-01")
+    )
+
+
+def test_store_is_tied_to_its_timezone(tmp_path):
+    store = str(tmp_path / "store.sqlite")
+    open_store(store, cfg).close()
+
+    with pytest.raises(ValueError, match="timezone UTC"):
+        open_store(store, dict(cfg, timezone="Europe/Stockholm"))
+
+
+def test_query_rejects_unknown_statuses(tmp_path):
+    # Given: a status which is not on the board
+    path = tmp_path / "transitions.csv"
+    statuses = DEFAULT_STATUSES[:-1] + ["Limbo"]
+    generate_transitions(5, statuses=statuses).to_csv(path, index=False)
+    connection = open_store(str(tmp_path / "store.sqlite"), cfg)
+    load_files(connection, [str(path)], cfg)
+
+    # Then: it is reported
+    with pytest.raises(ValueError, match="LIMBO"):
+        query_ticket_timestamps(connection, cfg)